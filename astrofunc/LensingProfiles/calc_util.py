@@ -62,3 +62,27 @@ def d_x_diffr_dy(x, y):
     :return:
     """
     return -x*y / (x**2 + y**2)**(3/2.)
+
+
+def hessian_ellipse(f_xx_prim, f_yy_prim, f_xy_prim, e, phi_G):
+    """
+    Hessian of a profile evaluated on the pseudo-elliptical coordinates
+    x' = (cos(phi_G) x + sin(phi_G) y) * sqrt(1 - e), y' = (-sin(phi_G) x + cos(phi_G) y) * sqrt(1 + e)
+    from the Hessian of the spherical profile at (x', y') by the chain rule
+
+    :param f_xx_prim: d^2f/dx'^2 of the spherical profile
+    :param f_yy_prim: d^2f/dy'^2 of the spherical profile
+    :param f_xy_prim: d^2f/dx'dy' of the spherical profile
+    :param e: ellipticity parameter of the coordinate stretch
+    :param phi_G: position angle
+    :return: f_xx, f_yy, f_xy
+    """
+    cos_phi = np.cos(phi_G)
+    sin_phi = np.sin(phi_G)
+    h_11 = (1 - e) * f_xx_prim
+    h_22 = (1 + e) * f_yy_prim
+    h_12 = np.sqrt(1 - e**2) * f_xy_prim
+    f_xx = cos_phi**2 * h_11 - 2 * cos_phi * sin_phi * h_12 + sin_phi**2 * h_22
+    f_yy = sin_phi**2 * h_11 + 2 * cos_phi * sin_phi * h_12 + cos_phi**2 * h_22
+    f_xy = cos_phi * sin_phi * (h_11 - h_22) + (cos_phi**2 - sin_phi**2) * h_12
+    return f_xx, f_yy, f_xy
@@ -7,8 +7,12 @@ class CompositeSersicNFW(object):
     class for a composite model (Sersic and NFW profile combined)
     with joint center and parameterization of Einstein radius
     """
-    def __init__(self):
-        self.sersic = SersicEllipse()
+    def __init__(self, fast_potential=False):
+        """
+
+        :param fast_potential: bool, see Sersic class
+        """
+        self.sersic = SersicEllipse(fast_potential=fast_potential)
         self.nfw = NFW_ELLIPSE()
 
     def function(self, x, y, theta_E, mass_light, Rs, q, phi_G, n_sersic, r_eff, q_s, phi_G_s, center_x=0, center_y=0):
@@ -3,7 +3,6 @@ __author__ = 'sibirrer'
 
 import numpy as np
 import scipy.special
-import scipy.integrate as integrate
 from astrofunc.LensingProfiles.gaussian import Gaussian
 
 class GaussianKappa(object):
@@ -31,13 +30,21 @@ class GaussianKappa(object):
 
     def _num_integral(self, r, c):
         """
-        numerical integral (1-e^{-c*x^2})/x dx [0..r]
-        :param r: radius
-        :param c: 1/2sigma^2
+        integral (1-e^{-c*x^2})/x dx [0..r] in closed form: Ein(c*r^2)/2 with Ein(u) = E1(u) + ln(u) + euler_gamma.
+        A Taylor series is used for u < 0.01 where the closed form suffers from cancellation.
+
+        :param r: radius (float or numpy array)
+        :param c: 1/2sigma^2 (float or numpy array broadcastable with r)
         :return:
         """
-        out = integrate.quad(lambda x: (1-np.exp(-c*x**2))/x, 0, r)
-        return out[0]
+        u = c * np.asarray(r, dtype=float)**2
+        u_safe = np.maximum(u, 0.01)
+        ein = scipy.special.exp1(u_safe) + np.log(u_safe) + np.euler_gamma
+        ein_series = u * (1 - u * (1. / 4 - u * (1. / 18 - u * (1. / 96 - u * (1. / 600 - u / 4320)))))
+        out = np.where(u < 0.01, ein_series, ein) / 2.
+        if out.ndim == 0:
+            return float(out)
+        return out
 
     def derivatives(self, x, y, amp, sigma_x, sigma_y, center_x=0, center_y=0):
         """
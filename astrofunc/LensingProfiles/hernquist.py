@@ -5,7 +5,6 @@ class Hernquist(object):
     """
     class to compute the Hernquist 1990 model
     """
-    _diff = 0.00001
     _s = 0.001
 
     def density(self, r, rho0, Rs):
@@ -212,18 +211,42 @@ class Hernquist(object):
         :param center_y:
         :return:
         """
-        alpha_ra, alpha_dec = self.derivatives(x, y, sigma0, Rs,  center_x, center_y)
-        diff = self._diff
-        alpha_ra_dx, alpha_dec_dx = self.derivatives(x + diff, y, sigma0, Rs,  center_x, center_y)
-        alpha_ra_dy, alpha_dec_dy = self.derivatives(x, y + diff, sigma0, Rs,  center_x, center_y)
-
-        f_xx = (alpha_ra_dx - alpha_ra)/diff
-        f_xy = (alpha_ra_dy - alpha_ra)/diff
-        #f_yx = (alpha_dec_dx - alpha_dec)/diff
-        f_yy = (alpha_dec_dy - alpha_dec)/diff
-
+        x_ = x - center_x
+        y_ = y - center_y
+        r = np.maximum(np.sqrt(x_**2 + y_**2), self._s)
+        X = r/Rs
+        g_alpha, g_kappa = self._g_series(X)
+        alpha_r = 2*sigma0 * Rs * X * g_alpha
+        kappa = sigma0 * g_kappa
+        # d alpha_r / dr = 2 kappa - alpha_r / r
+        d_alpha_dr = 2 * kappa - alpha_r / r
+        f_xx = d_alpha_dr * x_**2/r**2 + alpha_r * y_**2/r**3
+        f_yy = d_alpha_dr * y_**2/r**2 + alpha_r * x_**2/r**3
+        f_xy = (d_alpha_dr - alpha_r/r) * x_*y_/r**2
         return f_xx, f_yy, f_xy
 
+    def _g_series(self, X):
+        """
+        (1 - F(X))/(X^2 - 1) and (-3 + (2 + X^2) F(X))/(X^2 - 1)^2. Both expressions cancel around X = 1 and are
+        replaced by their series in u = X^2 - 1 for |u| < 0.01
+        :param X: r/rs
+        :return: factor of the deflection, factor of the convergence
+        """
+        shape = np.shape(X)
+        X = np.array(X, dtype=float, ndmin=1).ravel()
+        u = X**2 - 1
+        near = np.abs(u) < 0.01
+        u_far = np.where(near, 1., u)
+        F = self._F(np.where(near, 2., X))
+        g_alpha = (1 - F) / u_far
+        g_kappa = (-3 + (2 + X**2) * F) / u_far**2
+        if np.any(near):
+            j = np.arange(6)[::-1]
+            u_near = u[near]
+            g_alpha[near] = np.polyval((-1.)**j / (2*j + 3), u_near)
+            g_kappa[near] = np.polyval((-1.)**j * 4 * (j + 1) / (4 * (j + 2)**2 - 1.), u_near)
+        return g_alpha.reshape(shape)[()], g_kappa.reshape(shape)[()]
+
     def _f_A20(self, r_a, r_s):
         """
         equation A20 in Eliasdottir (2013)
@@ -1,4 +1,5 @@
 from astrofunc.LensingProfiles.hernquist import Hernquist
+import astrofunc.LensingProfiles.calc_util as calc_util
 import numpy as np
 
 
@@ -10,7 +11,6 @@ class Hernquist_Ellipse(object):
     """
     def __init__(self):
         self.spherical = Hernquist()
-        self._diff = 0.000001
 
     def function(self, x, y, sigma0, Rs, q, phi_G, center_x=0, center_y=0):
         """
@@ -50,14 +50,12 @@ class Hernquist_Ellipse(object):
         """
         returns Hessian matrix of function d^2f/dx^2, d^f/dy^2, d^2/dxdy
         """
-        alpha_ra, alpha_dec = self.derivatives(x, y, sigma0, Rs, q, phi_G, center_x, center_y)
-        diff = self._diff
-        alpha_ra_dx, alpha_dec_dx = self.derivatives(x + diff, y, sigma0, Rs, q, phi_G, center_x, center_y)
-        alpha_ra_dy, alpha_dec_dy = self.derivatives(x, y + diff, sigma0, Rs, q, phi_G, center_x, center_y)
-
-        f_xx = (alpha_ra_dx - alpha_ra)/diff
-        f_xy = (alpha_ra_dy - alpha_ra)/diff
-        #f_yx = (alpha_dec_dx - alpha_dec)/diff
-        f_yy = (alpha_dec_dy - alpha_dec)/diff
-
-        return f_xx, f_yy, f_xy
\ No newline at end of file
+        x_shift = x - center_x
+        y_shift = y - center_y
+        cos_phi = np.cos(phi_G)
+        sin_phi = np.sin(phi_G)
+        e = abs(1 - q)
+        x_ = (cos_phi*x_shift+sin_phi*y_shift)*np.sqrt(1 - e)
+        y_ = (-sin_phi*x_shift+cos_phi*y_shift)*np.sqrt(1 + e)
+        f_xx_prim, f_yy_prim, f_xy_prim = self.spherical.hessian(x_, y_, sigma0, Rs)
+        return calc_util.hessian_ellipse(f_xx_prim, f_yy_prim, f_xy_prim, e, phi_G)
\ No newline at end of file
@@ -1,34 +1,173 @@
 __author__ = 'sibirrer'
 
-import scipy.interpolate
 import numpy as np
 
 import astrofunc.util as util
 
+
+class Interpol_stacked(object):
+    """
+    interpolation of several maps sampled on the same rectangular grid.
+
+    The maps are stored stacked in one contiguous array of shape (n_maps, n_0, n_1). The cell indices and the
+    bilinear (order=1) or bicubic (order=3, Lagrange) weights are computed once per query and shared by all the
+    requested maps. Points outside of the grid take the value at the closest grid boundary.
+    """
+    def __init__(self, grid_0, grid_1, order=1, **maps):
+        """
+
+        :param grid_0: increasing coordinates along the first axis of the maps
+        :param grid_1: increasing coordinates along the second axis of the maps
+        :param order: 1 (bilinear) or 3 (bicubic)
+        :param maps: 2d arrays of shape (len(grid_0), len(grid_1)) by name
+        """
+        if order not in [1, 3]:
+            raise ValueError("order %s not supported, chose 1 or 3." % order)
+        self._order = order
+        self.update_maps(grid_0, grid_1, **maps)
+
+    def update_maps(self, grid_0, grid_1, **maps):
+        """
+        replaces the grid and all the maps
+
+        :param grid_0: increasing coordinates along the first axis of the maps
+        :param grid_1: increasing coordinates along the second axis of the maps
+        :param maps: 2d arrays of shape (len(grid_0), len(grid_1)) by name
+        :return: None
+        """
+        self._grid_0 = np.asarray(grid_0, dtype=float)
+        self._grid_1 = np.asarray(grid_1, dtype=float)
+        if len(self._grid_0) <= self._order or len(self._grid_1) <= self._order:
+            raise ValueError("the grid needs at least %s points along each axis." % (self._order + 1))
+        names = sorted(maps.keys())
+        self._index = dict((name, i) for i, name in enumerate(names))
+        self._maps = np.empty((len(names), len(self._grid_0), len(self._grid_1)))
+        for name in names:
+            self._maps[self._index[name]] = maps[name]
+
+    def add_maps(self, **maps):
+        """
+        adds maps on the current grid. Maps of the same name are overwritten, all other stored maps are kept.
+
+        :param maps: 2d arrays of shape (len(grid_0), len(grid_1)) by name
+        :return: None
+        """
+        new_names = sorted(name for name in maps if name not in self._index)
+        if len(new_names) > 0:
+            stack = np.empty((len(self._index) + len(new_names), len(self._grid_0), len(self._grid_1)))
+            stack[:len(self._index)] = self._maps
+            for name in new_names:
+                self._index[name] = len(self._index)
+            self._maps = stack
+        for name in maps:
+            self._maps[self._index[name]] = maps[name]
+
+    def get_map(self, name):
+        """
+        stored map of the given name
+
+        :param name: name of the map
+        :return: 2d array
+        """
+        return self._maps[self._map_index([name])[0]]
+
+    def same_grid(self, grid_0, grid_1):
+        """
+        whether the maps are stored on the grid (grid_0, grid_1)
+        """
+        return np.array_equal(grid_0, self._grid_0) and np.array_equal(grid_1, self._grid_1)
+
+    @property
+    def names(self):
+        """
+        names of the stored maps
+        """
+        return list(self._index.keys())
+
+    def interpolate(self, u_0, u_1, names):
+        """
+        interpolation at scattered points
+
+        :param u_0: coordinates along the first axis (array of any shape)
+        :param u_1: coordinates along the second axis (same shape as u_0)
+        :param names: list of names of the requested maps
+        :return: list of interpolated values in the shape of u_0, one for each requested map
+        """
+        u_0, u_1 = np.broadcast_arrays(np.asarray(u_0, dtype=float), np.asarray(u_1, dtype=float))
+        maps = self._maps[self._map_index(names)]
+        i, w_0 = self._weights(u_0, self._grid_0)
+        j, w_1 = self._weights(u_1, self._grid_1)
+        values = np.zeros((len(names),) + u_0.shape)
+        for k in range(self._order + 1):
+            for l in range(self._order + 1):
+                values += w_0[k] * w_1[l] * maps[:, i + k, j + l]
+        return list(values)
+
+    def interpolate_grid(self, axes_0, axes_1, names):
+        """
+        interpolation on the rectangular grid spanned by axes_0 and axes_1
+
+        :param axes_0: coordinates along the first axis
+        :param axes_1: coordinates along the second axis
+        :param names: list of names of the requested maps
+        :return: list of 2d arrays of shape (len(axes_0), len(axes_1)), one for each requested map
+        """
+        maps = self._maps[self._map_index(names)]
+        i, w_0 = self._weights(np.asarray(axes_0, dtype=float), self._grid_0)
+        j, w_1 = self._weights(np.asarray(axes_1, dtype=float), self._grid_1)
+        values = np.zeros((len(names), len(i), len(j)))
+        for k in range(self._order + 1):
+            for l in range(self._order + 1):
+                values += np.outer(w_0[k], w_1[l]) * maps[:, i + k][:, :, j + l]
+        return list(values)
+
+    def _map_index(self, names):
+        for name in names:
+            if name not in self._index:
+                raise ValueError("map %s is not provided for the interpolation." % name)
+        return [self._index[name] for name in names]
+
+    def _weights(self, u, grid):
+        """
+        first grid index of the interpolation stencil and the Lagrange weights of its order + 1 points
+
+        :param u: coordinates
+        :param grid: increasing grid coordinates
+        :return: index, list of weights
+        """
+        u = np.clip(u, grid[0], grid[-1])
+        n = self._order + 1
+        i = np.searchsorted(grid, u, side='right') - 1 - (n - 2) // 2
+        i = np.clip(i, 0, len(grid) - n)
+        nodes = [grid[i + k] for k in range(n)]
+        weights = []
+        for k in range(n):
+            w = 1.
+            for m in range(n):
+                if m != k:
+                    w = w * (u - nodes[m]) / (nodes[k] - nodes[m])
+            weights.append(w)
+        return i, weights
+
+
 class Interpol_func(object):
     """
     class which uses an interpolation of a lens model and its first and second order derivatives
     """
-    def __init__(self, grid=True):
+    _map_names = ['f_', 'f_x', 'f_y', 'f_xx', 'f_yy', 'f_xy']
+
+    def __init__(self, grid=True, order=1):
+        """
+
+        :param grid: bool, if True, the coordinates are evaluated as a regular grid
+        :param order: interpolation order, 1 (bilinear) or 3 (bicubic)
+        """
         self._grid = grid
+        self._order = order
 
     def function(self, x, y, grid_interp_x=None, grid_interp_y=None, f_=None, f_x=None, f_y=None, f_xx=None, f_yy=None, f_xy=None):
         self._check_interp(grid_interp_x, grid_interp_y, f_, f_x, f_y, f_xx, f_yy, f_xy)
-        n = len(np.atleast_1d(x))
-        if n <= 1 and np.shape(x) == ():
-        #if type(x) == float or type(x) == int or type(x) == type(np.float64(1)) or len(x) <= 1:
-            f_ = self.f_interp(y, x)
-            return f_[0][0]
-        else:
-            if self._grid:
-                x_axes, y_axes = util.get_axes(x, y)
-                f_ = self.f_interp(y_axes, x_axes)
-                f_ = util.image2array(f_)
-            else:
-                n = len(x)
-                f_ = np.zeros(n)
-                for i in range(n):
-                    f_[i] = self.f_interp(y[i], x[i])
+        f_, = self._interp(x, y, ['f_'])
         return f_
 
     def derivatives(self, x, y, grid_interp_x=None, grid_interp_y=None, f_=None, f_x=None, f_y=None, f_xx=None, f_yy=None, f_xy=None):
@@ -36,25 +175,7 @@ class Interpol_func(object):
         returns df/dx and df/dy of the function
         """
         self._check_interp(grid_interp_x, grid_interp_y, f_, f_x, f_y, f_xx, f_yy, f_xy)
-        n = len(np.atleast_1d(x))
-        if n <= 1 and np.shape(x) == ():
-        #if type(x) == float or type(x) == int or type(x) == type(np.float64(1)) or len(x) <= 1:
-            f_x = self.f_x_interp(y, x)
-            f_y = self.f_y_interp(y, x)
-            return f_x[0][0], f_y[0][0]
-        else:
-            if self._grid:
-                x_, y_ = util.get_axes(x, y)
-                f_x = self.f_x_interp(y_, x_)
-                f_y = self.f_y_interp(y_, x_)
-                f_x = util.image2array(f_x)
-                f_y = util.image2array(f_y)
-            else:
-                n = len(x)
-                f_x, f_y = np.zeros(n), np.zeros(n)
-                for i in range(n):
-                    f_x[i] = self.f_x_interp(y[i], x[i])
-                    f_y[i] = self.f_y_interp(y[i], x[i])
+        f_x, f_y = self._interp(x, y, ['f_x', 'f_y'])
         return f_x, f_y
 
     def hessian(self, x, y, grid_interp_x=None, grid_interp_y=None, f_=None, f_x=None, f_y=None, f_xx=None, f_yy=None, f_xy=None):
@@ -62,43 +183,75 @@ class Interpol_func(object):
         returns Hessian matrix of function d^2f/dx^2, d^f/dy^2, d^2/dxdy
         """
         self._check_interp(grid_interp_x, grid_interp_y, f_, f_x, f_y, f_xx, f_yy, f_xy)
-        n = len(np.atleast_1d(x))
-        if n <= 1 and np.shape(x) == ():
-        #if type(x) == float or type(x) == int or type(x) == type(np.float64(1)) or len(x) <= 1:
-            f_xx = self.f_xx_interp(y, x)
-            f_yy = self.f_yy_interp(y, x)
-            f_xy = self.f_xy_interp(y, x)
-            return f_xx[0][0], f_yy[0][0], f_xy[0][0]
-        else:
-            if self._grid:
-                x_, y_ = util.get_axes(x, y)
-                f_xx = self.f_xx_interp(y_, x_)
-                f_yy = self.f_yy_interp(y_, x_)
-                f_xy = self.f_xy_interp(y_, x_)
-                f_xx = util.image2array(f_xx)
-                f_yy = util.image2array(f_yy)
-                f_xy = util.image2array(f_xy)
-            else:
-                n = len(x)
-                f_xx, f_yy, f_xy = np.zeros(n), np.zeros(n), np.zeros(n)
-                for i in range(n):
-                    f_xx[i] = self.f_xx_interp(y[i], x[i])
-                    f_yy[i] = self.f_yy_interp(y[i], x[i])
-                    f_xy[i] = self.f_xy_interp(y[i], x[i])
+        f_xx, f_yy, f_xy = self._interp(x, y, ['f_xx', 'f_yy', 'f_xy'])
         return f_xx, f_yy, f_xy
 
+    def all_maps(self, x, y, grid_interp_x=None, grid_interp_y=None, f_=None, f_x=None, f_y=None, f_xx=None, f_yy=None, f_xy=None):
+        """
+        returns the potential, its derivatives and the Hessian. The interpolation indices and weights are computed
+        once and shared between the six maps.
+
+        :param x: x-coordinates
+        :param y: y-coordinates
+        :return: f_, f_x, f_y, f_xx, f_yy, f_xy
+        """
+        self._check_interp(grid_interp_x, grid_interp_y, f_, f_x, f_y, f_xx, f_yy, f_xy)
+        return tuple(self._interp(x, y, self._map_names))
+
+    def _interp(self, x, y, names):
+        """
+        evaluates the requested maps at (x, y) as scalar, on the grid spanned by (x, y) or at scattered points.
+        The first axis of the maps is evaluated at y and the second at x.
+
+        :param x: x-coordinates
+        :param y: y-coordinates
+        :param names: list of names of the requested maps
+        :return: list of interpolated values
+        """
+        if np.shape(x) == ():
+            values = self._interpolator.interpolate(np.array([y]), np.array([x]), names)
+            return [value[0] for value in values]
+        if self._grid:
+            x_axes, y_axes = util.get_axes(x, y)
+            values = self._interpolator.interpolate_grid(y_axes, x_axes, names)
+            return [util.image2array(value) for value in values]
+        return self._interpolator.interpolate(y, x, names)
+
     def do_interp(self, x_grid, y_grid, f_, f_x, f_y, f_xx, f_yy, f_xy):
-        self.f_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_, kx=1, ky=1, s=0)
-        self.f_x_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_x, kx=1, ky=1, s=0)
-        self.f_y_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_y, kx=1, ky=1, s=0)
-        self.f_xx_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_xx, kx=1, ky=1, s=0)
-        self.f_xy_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_xy, kx=1, ky=1, s=0)
-        self.f_yy_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_yy, kx=1, ky=1, s=0)
+        self.update_maps(x_grid, y_grid, f_, f_x, f_y, f_xx, f_yy, f_xy)
+
+    def update_maps(self, x_grid, y_grid, f_=None, f_x=None, f_y=None, f_xx=None, f_yy=None, f_xy=None):
+        """
+        sets the maps to be interpolated. On the grid of the previous calls, the maps provided replace the ones of the
+        same name and the other maps are kept. On a different grid, only the maps provided are kept.
+
+        :param x_grid: grid along the first axis of the maps
+        :param y_grid: grid along the second axis of the maps
+        :param f_: potential
+        :param f_x: x-deflection
+        :param f_y: y-deflection
+        :param f_xx: d^2f/dx^2
+        :param f_yy: d^2f/dy^2
+        :param f_xy: d^2f/dxdy
+        :return: None
+        """
+        maps = self._maps_provided(f_, f_x, f_y, f_xx, f_yy, f_xy)
+        if hasattr(self, '_interpolator') and self._interpolator.same_grid(x_grid, y_grid):
+            self._interpolator.add_maps(**maps)
+        else:
+            self._interpolator = Interpol_stacked(x_grid, y_grid, order=self._order, **maps)
+
+    def _maps_provided(self, f_, f_x, f_y, f_xx, f_yy, f_xy):
+        """
+        dictionary of the maps which are not None
+        """
+        inputs = [f_, f_x, f_y, f_xx, f_yy, f_xy]
+        return dict((name, value) for name, value in zip(self._map_names, inputs) if value is not None)
 
     def _check_interp(self, x_grid, y_grid, f_, f_x, f_y, f_xx, f_yy, f_xy, force=False):
         """
-        checks whether interpolation is already performed
-        if not, does the interpolation with the values provided
+        checks whether the interpolation is performed on the maps provided.
+        Maps provided that differ in content from the ones interpolated are updated, all other maps are kept.
         :param f_:
         :param f_x:
         :param f_y:
@@ -107,18 +260,20 @@ class Interpol_func(object):
         :param f_xy:
         :return:
         """
-        if f_ is not None and not hasattr(self, 'f_interp') or force is True:
-            self.f_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_, kx=1, ky=1, s=0)
-        if f_x is not None and not hasattr(self, 'f_x_interp') or force is True:
-            self.f_x_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_x, kx=1, ky=1, s=0)
-        if f_y is not None and not hasattr(self, 'f_y_interp') or force is True:
-            self.f_y_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_y, kx=1, ky=1, s=0)
-        if f_xx is not None and not hasattr(self, 'f_xx_interp') or force is True:
-            self.f_xx_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_xx, kx=1, ky=1, s=0)
-        if f_yy is not None and not hasattr(self, 'f_yy_interp') or force is True:
-            self.f_yy_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_yy, kx=1, ky=1, s=0)
-        if f_xy is not None and not hasattr(self, 'f_xy_interp') or force is True:
-            self.f_xy_interp = scipy.interpolate.RectBivariateSpline(x_grid, y_grid, f_xy, kx=1, ky=1, s=0)
+        maps = self._maps_provided(f_, f_x, f_y, f_xx, f_yy, f_xy)
+        if len(maps) == 0 and force is False:
+            return
+        if force is True or not hasattr(self, '_interpolator'):
+            self.update_maps(x_grid, y_grid, **maps)
+            return
+        interpolator = self._interpolator
+        if not interpolator.same_grid(x_grid, y_grid):
+            self.update_maps(x_grid, y_grid, **maps)
+            return
+        changed = dict((name, value) for name, value in maps.items() if name not in interpolator.names or
+                       not np.array_equal(value, interpolator.get_map(name)))
+        if len(changed) > 0:
+            interpolator.add_maps(**changed)
 
 
 class Interpol_func_scaled(object):
@@ -126,8 +281,8 @@ class Interpol_func_scaled(object):
     class for handling an interpolated lensing map and has the freedom to scale its lensing effect.
     Applications are e.g. mass to light ratio.
     """
-    def __init__(self, grid=True):
-        self.interp_func = Interpol_func(grid)
+    def __init__(self, grid=True, order=1):
+        self.interp_func = Interpol_func(grid, order=order)
 
     def function(self, x, y, scale_factor=1 ,grid_interp_x=None, grid_interp_y=None, f_=None, f_x=None, f_y=None, f_xx=None, f_yy=None, f_xy=None):
         f_out = self.interp_func.function(x, y, grid_interp_x, grid_interp_y, f_, f_x, f_y, f_xx, f_yy, f_xy)
@@ -145,4 +300,13 @@ class Interpol_func_scaled(object):
         f_xx_out *= scale_factor
         f_yy_out *= scale_factor
         f_xy_out *= scale_factor
-        return f_xx_out, f_yy_out, f_xy_out
\ No newline at end of file
+        return f_xx_out, f_yy_out, f_xy_out
+
+    def do_interp(self, x_grid, y_grid, f_, f_x, f_y, f_xx, f_yy, f_xy):
+        self.interp_func.do_interp(x_grid, y_grid, f_, f_x, f_y, f_xx, f_yy, f_xy)
+
+    def update_maps(self, x_grid, y_grid, f_=None, f_x=None, f_y=None, f_xx=None, f_yy=None, f_xy=None):
+        """
+        replaces the interpolated maps, see Interpol_func.update_maps()
+        """
+        self.interp_func.update_maps(x_grid, y_grid, f_, f_x, f_y, f_xx, f_yy, f_xy)
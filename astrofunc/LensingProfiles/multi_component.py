@@ -0,0 +1,81 @@
+__author__ = 'sibirrer'
+
+import numpy as np
+
+
+class MultiComponentLens(object):
+    """
+    class to evaluate the sum of several lens profiles with the interface of a single profile.
+
+    Each component is given as a (profile, kwargs) pair, where profile is an instance of any of the LensingProfiles
+    classes and kwargs are its keyword arguments. The components are evaluated one after the other and added up, so
+    the cost is the same as summing the profiles by hand.
+    """
+
+    def function(self, x, y, component_list):
+        """
+        lensing potential of the sum of all components
+
+        :param x: x-coordinates
+        :param y: y-coordinates
+        :param component_list: list of (profile, kwargs) pairs
+        :return: f
+        """
+        f_ = self._zeros(x)
+        for profile, kwargs in component_list:
+            f_ += profile.function(x, y, **kwargs)
+        return self._output(f_)
+
+    def derivatives(self, x, y, component_list):
+        """
+        deflection of the sum of all components
+
+        :param x: x-coordinates
+        :param y: y-coordinates
+        :param component_list: list of (profile, kwargs) pairs
+        :return: f_x, f_y
+        """
+        f_x, f_y = self._zeros(x), self._zeros(x)
+        for profile, kwargs in component_list:
+            f_x_i, f_y_i = profile.derivatives(x, y, **kwargs)
+            f_x += f_x_i
+            f_y += f_y_i
+        return self._output(f_x), self._output(f_y)
+
+    def hessian(self, x, y, component_list):
+        """
+        Hessian matrix of the sum of all components
+
+        :param x: x-coordinates
+        :param y: y-coordinates
+        :param component_list: list of (profile, kwargs) pairs
+        :return: f_xx, f_yy, f_xy
+        """
+        f_xx, f_yy, f_xy = self._zeros(x), self._zeros(x), self._zeros(x)
+        for profile, kwargs in component_list:
+            f_xx_i, f_yy_i, f_xy_i = profile.hessian(x, y, **kwargs)
+            f_xx += f_xx_i
+            f_yy += f_yy_i
+            f_xy += f_xy_i
+        return self._output(f_xx), self._output(f_yy), self._output(f_xy)
+
+    @staticmethod
+    def _zeros(x):
+        """
+
+        :param x: coordinates
+        :return: float array of zeros in the shape of x
+        """
+        return np.zeros(np.shape(x))
+
+    @staticmethod
+    def _output(values):
+        """
+        returns a float for scalar input coordinates and the array otherwise
+
+        :param values: accumulated array
+        :return:
+        """
+        if values.ndim == 0:
+            return float(values)
+        return values
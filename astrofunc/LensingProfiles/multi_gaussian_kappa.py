@@ -21,11 +21,10 @@ class MultiGaussian_kappa(object):
         :param center_y:
         :return:
         """
-        f_ = np.zeros_like(x)
-        for i in range(len(amp)):
-            f_ += self.gaussian_kappa.function(x, y, amp=amp[i], sigma_x=sigma[i], sigma_y=sigma[i],
-                                               center_x=center_x, center_y=center_y)
-        return f_
+        amp_, sigma_ = self._broadcast_components(x, amp, sigma)
+        f_ = self.gaussian_kappa.function(x, y, amp=amp_, sigma_x=sigma_, sigma_y=sigma_, center_x=center_x,
+                                          center_y=center_y)
+        return np.sum(f_, axis=0)
 
     def derivatives(self, x, y, amp, sigma, center_x=0, center_y=0):
         """
@@ -38,13 +37,10 @@ class MultiGaussian_kappa(object):
         :param center_y:
         :return:
         """
-        f_x, f_y = np.zeros_like(x), np.zeros_like(x)
-        for i in range(len(amp)):
-            f_x_i, f_y_i = self.gaussian_kappa.derivatives(x, y, amp=amp[i], sigma_x=sigma[i], sigma_y=sigma[i],
-                                                           center_x=center_x, center_y=center_y)
-            f_x += f_x_i
-            f_y += f_y_i
-        return f_x, f_y
+        amp_, sigma_ = self._broadcast_components(x, amp, sigma)
+        f_x, f_y = self.gaussian_kappa.derivatives(x, y, amp=amp_, sigma_x=sigma_, sigma_y=sigma_, center_x=center_x,
+                                                   center_y=center_y)
+        return np.sum(f_x, axis=0), np.sum(f_y, axis=0)
 
     def hessian(self, x, y, amp, sigma, center_x=0, center_y=0):
         """
@@ -57,15 +53,23 @@ class MultiGaussian_kappa(object):
         :param center_y:
         :return:
         """
-        f_xx, f_yy, f_xy = np.zeros_like(x), np.zeros_like(x), np.zeros_like(x)
-        for i in range(len(amp)):
-            f_xx_i, f_yy_i, f_xy_i = self.gaussian_kappa.hessian(x, y, amp=amp[i], sigma_x=sigma[i],
-                                                                 sigma_y=sigma[i], center_x=center_x,
-                                                                 center_y=center_y)
-            f_xx += f_xx_i
-            f_yy += f_yy_i
-            f_xy += f_xy_i
-        return f_xx, f_yy, f_xy
+        amp_, sigma_ = self._broadcast_components(x, amp, sigma)
+        f_xx, f_yy, f_xy = self.gaussian_kappa.hessian(x, y, amp=amp_, sigma_x=sigma_, sigma_y=sigma_,
+                                                       center_x=center_x, center_y=center_y)
+        return np.sum(f_xx, axis=0), np.sum(f_yy, axis=0), np.sum(f_xy, axis=0)
+
+    def _broadcast_components(self, x, amp, sigma):
+        """
+        reshapes the amplitudes and widths to (N, 1, ..) such that all N Gaussians are evaluated in a single
+        broadcast with the coordinates of shape np.shape(x)
+
+        :param x: coordinates
+        :param amp: list of N amplitudes
+        :param sigma: list of N widths
+        :return: reshaped amp and sigma arrays
+        """
+        shape = (len(amp),) + (1,) * np.ndim(x)
+        return np.reshape(np.array(amp, dtype=float), shape), np.reshape(np.array(sigma, dtype=float), shape)
 
     def density(self, r, amp, sigma):
         """
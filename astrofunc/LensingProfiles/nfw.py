@@ -195,13 +195,10 @@ class NFW(object):
         :type axis: same as R
         :return: Epsilon(R) projected density at radius R
         """
-        if isinstance(R, int) or isinstance(R, float):
-            R = max(R, 0.00001)
-        else:
-            R[R <= 0.00001] = 0.00001
+        R = np.maximum(R, 0.00001)
         x = R/Rs
         gx = self._g(x)
-        a = 4*rho0*Rs*R*gx/x**2/R
+        a = 4*rho0*Rs*gx/x**2
         return a*ax_x, a*ax_y
 
     def nfwGamma(self, R, Rs, rho0, ax_x, ax_y):
@@ -221,104 +218,109 @@ class NFW(object):
         :return: Epsilon(R) projected density at radius R
         """
         c = 0.001
-        if isinstance(R, int) or isinstance(R, float):
-            R = max(R, c)
-        else:
-            R[R <= c] = c
+        R = np.maximum(R, c)
         x = R/Rs
-        gx = self._g(x)
-        Fx = self._F(x)
-        a = 2*rho0*Rs*(2*gx/x**2 - Fx)#/x #2*rho0*Rs*(2*gx/x**2 - Fx)*axis/x
-        return a*(ax_y**2-ax_x**2)/R**2, -a*2*(ax_x*ax_y)/R**2
+        shape = np.shape(x)
+        x = np.array(x, dtype=float, ndmin=1).ravel()
+        arc_term, one_minus_x2 = self._arc_term(x)
+        gx = np.log(x / 2.) + arc_term
+        Fx = self._F_arc(x, arc_term, one_minus_x2)
+        a = (2*gx/x**2 - Fx).reshape(shape)[()]*2*rho0*Rs/R**2
+        return a*(ax_y**2-ax_x**2), -a*2*(ax_x*ax_y)
 
-    def _F(self, X):
+    @staticmethod
+    def _arc(x):
         """
-        analytic solution of the projection integral
+        arccosh(1/x) for x < 1 and arccos(1/x) for x >= 1, computed in place in a single array
 
-        :param x: R/Rs
-        :type x: float >0
-        """
-        if isinstance(X, int) or isinstance(X, float):
-            if X < 1 and X > 0:
-                a = 1/(X**2-1)*(1-2/np.sqrt(1-X**2)*np.arctanh(np.sqrt((1-X)/(1+X))))
-            elif X == 1:
-                a = 1./3
-            elif X > 1:
-                a = 1/(X**2-1)*(1-2/np.sqrt(X**2-1)*np.arctan(np.sqrt((X-1)/(1+X))))
-            else:  # X == 0:
-                c = 0.0001
-                a = 1/(-1)*(1-2/np.sqrt(1)*np.arctanh(np.sqrt((1-c)/(1+c))))
-
-        else:
-            a = np.empty_like(X)
-            x = X[X < 1]
-            a[X<1] = 1/(x**2-1)*(1-2/np.sqrt(1-x**2)*np.arctanh(np.sqrt((1-x)/(1+x))))
-
-            x = X[X == 1]
-            a[X==1] = 1./3.
-
-            x = X[X > 1]
-            a[X>1] = 1/(x**2-1)*(1-2/np.sqrt(x**2-1)*np.arctan(np.sqrt((x-1)/(1+x))))
-            # a[X>y] = 0
-
-            c = 0.001
-            x = X[X == 0]
-            a[X==0] = 1/(-1)*(1-2/np.sqrt(1)*np.arctanh(np.sqrt((1-c)/(1+c))))
-        return a
-
-    def _g(self, X):
+        :param x: 1d array of R/Rs > 0
+        :return: arc, boolean array x < 1
         """
-        analytic solution of integral for NFW profile to compute deflection angel and gamma
+        below = x < 1
+        arc = np.divide(1., x)
+        np.arccosh(arc, out=arc, where=below)
+        np.arccos(arc, out=arc, where=~below)
+        return arc, below
 
-        :param x: R/Rs
-        :type x: float >0
+    def _arc_term(self, x):
         """
-        c = 0.001
-        if isinstance(X, int) or isinstance(X, float):
-            if X < 1:
-                x = max(c, X)
-                a = np.log(x/2.) + 1/np.sqrt(1-x**2)*np.arccosh(1./x)
-            elif X == 1:
-                a = 1 + np.log(1./2.)
-            else:  # X > 1:
-                a = np.log(X/2) + 1/np.sqrt(X**2-1)*np.arccos(1./X)
+        arccosh(1/x)/sqrt(1-x^2) for x < 1 and arccos(1/x)/sqrt(x^2-1) for x > 1 (=1 at x = 1)
 
-        else:
-            a = np.empty_like(X)
-            X[X <= c] = c
-            x = X[X < 1]
+        :param x: 1d array of R/Rs > 0
+        :return: arc term, 1 - x^2
+        """
+        arc, below = self._arc(x)
+        one_minus_x2 = np.multiply(x, x)
+        np.subtract(1., one_minus_x2, out=one_minus_x2)
+        root = np.abs(one_minus_x2)
+        np.sqrt(root, out=root)
+        np.divide(arc, root, out=arc, where=root > 0)
+        np.copyto(arc, 1., where=root == 0)
+        return arc, one_minus_x2
 
-            a[X < 1] = np.log(x/2.) + 1/np.sqrt(1-x**2)*np.arccosh(1./x)
+    def _F(self, X):
+        """
+        analytic solution of the projection integral
 
-            a[X == 1] = 1 + np.log(1./2.)
+        :param X: R/Rs
+        :type X: float >0
+        """
+        shape = np.shape(X)
+        x = np.array(X, dtype=float, ndmin=1).ravel()
+        x[x <= 0] = 0.001
+        a, one_minus_x2 = self._arc_term(x)
+        return self._F_arc(x, a, one_minus_x2).reshape(shape)[()]
 
-            x = X[X > 1]
-            a[X > 1] = np.log(x/2) + 1/np.sqrt(x**2-1)*np.arccos(1./x)
+    @staticmethod
+    def _F_arc(x, arc_term, one_minus_x2):
+        """
+        F(x) = (1 - arc_term)/(x^2 - 1) from the output of _arc_term(), overwriting arc_term
 
+        :return: F(x)
+        """
+        a = arc_term
+        np.subtract(1., a, out=a)
+        np.divide(a, one_minus_x2, out=a, where=one_minus_x2 != 0)
+        np.negative(a, out=a)
+        # second order series around x = 1, where the expression above cancels
+        near = np.abs(x - 1.) < 1e-4
+        if np.any(near):
+            dx = x[near] - 1.
+            a[near] = 1. / 3 - 0.4 * dx + 13. / 35 * dx**2
         return a
 
+    def _g(self, X):
+        """
+        analytic solution of integral for NFW profile to compute deflection angel and gamma
+
+        :param X: R/Rs
+        :type X: float >0
+        """
+        shape = np.shape(X)
+        x = np.maximum(np.array(X, dtype=float, ndmin=1).ravel(), 0.001)
+        a, _ = self._arc_term(x)
+        np.multiply(x, 0.5, out=x)
+        np.log(x, out=x)
+        a += x
+        return a.reshape(shape)[()]
+
     def _h(self, X):
         """
         analytic solution of integral for NFW profile to compute the potential
 
-        :param x: R/Rs
-        :type x: float >0
-        """
-        c = 0.001
-        if isinstance(X, int) or isinstance(X, float):
-            if X < 1:
-                x = max(0.001, X)
-                a = np.log(x/2.)**2 - np.arccosh(1./x)**2
-            else:  # X >= 1:
-                a = np.log(X/2.)**2 + np.arccos(1./X)**2
-        else:
-            a = np.empty_like(X)
-            X[X <= c] = 0.001
-            x = X[X < 1]
-            a[X < 1] = np.log(x/2.)**2 - np.arccosh(1./x)**2
-            x = X[X >= 1]
-            a[X >= 1] = np.log(x/2.)**2 + np.arccos(1./x)**2
-        return a
+        :param X: R/Rs
+        :type X: float >0
+        """
+        shape = np.shape(X)
+        x = np.maximum(np.array(X, dtype=float, ndmin=1).ravel(), 0.001)
+        a, below = self._arc(x)
+        np.square(a, out=a)
+        np.negative(a, out=a, where=below)
+        np.multiply(x, 0.5, out=x)
+        np.log(x, out=x)
+        np.square(x, out=x)
+        a += x
+        return a.reshape(shape)[()]
 
     def _alpha2rho0(self, theta_Rs, Rs):
         """
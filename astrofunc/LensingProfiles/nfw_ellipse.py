@@ -5,6 +5,7 @@ __author__ = 'sibirrer'
 
 import numpy as np
 from astrofunc.LensingProfiles.nfw import NFW
+import astrofunc.LensingProfiles.calc_util as calc_util
 
 class NFW_ELLIPSE(object):
     """
@@ -14,7 +15,6 @@ class NFW_ELLIPSE(object):
     """
     def __init__(self):
         self.nfw = NFW()
-        self._diff = 0.000001
 
     def function(self, x, y, Rs, theta_Rs, q, phi_G, center_x=0, center_y=0):
         """
@@ -61,17 +61,15 @@ class NFW_ELLIPSE(object):
         """
         returns Hessian matrix of function d^2f/dx^2, d^f/dy^2, d^2/dxdy
         """
-        alpha_ra, alpha_dec = self.derivatives(x, y, Rs, theta_Rs, q, phi_G, center_x, center_y)
-        diff = self._diff
-        alpha_ra_dx, alpha_dec_dx = self.derivatives(x + diff, y, Rs, theta_Rs, q, phi_G, center_x, center_y)
-        alpha_ra_dy, alpha_dec_dy = self.derivatives(x, y + diff, Rs, theta_Rs, q, phi_G, center_x, center_y)
-
-        f_xx = (alpha_ra_dx - alpha_ra)/diff
-        f_xy = (alpha_ra_dy - alpha_ra)/diff
-        f_yx = (alpha_dec_dx - alpha_dec)/diff
-        f_yy = (alpha_dec_dy - alpha_dec)/diff
-
-        return f_xx, f_yy, f_xy
+        x_shift = x - center_x
+        y_shift = y - center_y
+        cos_phi = np.cos(phi_G)
+        sin_phi = np.sin(phi_G)
+        e = min(abs(1. - q), 0.99)
+        xt1 = (cos_phi*x_shift+sin_phi*y_shift)*np.sqrt(1 - e)
+        xt2 = (-sin_phi*x_shift+cos_phi*y_shift)*np.sqrt(1 + e)
+        f_xx_prim, f_yy_prim, f_xy_prim = self.nfw.hessian(xt1, xt2, Rs, theta_Rs)
+        return calc_util.hessian_ellipse(f_xx_prim, f_yy_prim, f_xy_prim, e, phi_G)
 
     def mass_3d_lens(self, R, Rs, theta_Rs, q=1, phi_G=0):
         """
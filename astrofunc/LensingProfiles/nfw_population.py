@@ -0,0 +1,215 @@
+__author__ = 'sibirrer'
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from astrofunc.LensingProfiles.nfw import NFW
+
+
+class NFWPopulation(object):
+    """
+    deflections and Hessian of the sum of a population of spherical NFW halos (e.g. dark matter subhalos), each
+    specified by the parameters of the NFW class (Rs, theta_Rs, center_x, center_y).
+
+    The halos are evaluated in blocks of (n_halo, n_pix) whose size is bound by max_memory. Optionally, the
+    contribution of each halo is truncated at truncation * Rs: inside this radius the NFW profile is evaluated
+    exactly on the pixels found with a kd-tree, outside the halo acts as a point mass of the projected mass enclosed
+    within the truncation radius. The point masses are grouped in the cells of a regular grid and the point masses of
+    a cell are replaced by their multipole expansion about the cell center on the pixels far from the cell, such that
+    the far field costs O(n_cell * n_pix) instead of O(n_halo * n_pix).
+    """
+    _cell_factor = 3.  # number of cells of the multipole expansion in units of sqrt(n_halo)
+    _multipole_order = 20  # highest order of the multipole expansion of a cell
+    _opening = 0.4  # the expansion is used on pixels further away than cell radius / opening from the cell center
+
+    def __init__(self, max_memory=1e8, truncation=None):
+        """
+
+        :param max_memory: approximate upper limit (in bytes) of the temporary arrays of one block of halos
+        :param truncation: None (no truncation) or the truncation radius in units of Rs of each halo
+        """
+        self.nfw = NFW()
+        self._max_memory = max_memory
+        self._truncation = truncation
+
+    def derivatives(self, x, y, Rs, theta_Rs, center_x, center_y):
+        """
+        deflection angles of the population
+
+        :param x: x-coordinates
+        :param y: y-coordinates
+        :param Rs: array of scale radii
+        :param theta_Rs: array of deflections at Rs
+        :param center_x: array of x-positions of the halos
+        :param center_y: array of y-positions of the halos
+        :return: f_x, f_y in the shape of x
+        """
+        return self._evaluate(x, y, Rs, theta_Rs, center_x, center_y, hessian=False)
+
+    def hessian(self, x, y, Rs, theta_Rs, center_x, center_y):
+        """
+        Hessian matrix of the population
+
+        :param x: x-coordinates
+        :param y: y-coordinates
+        :param Rs: array of scale radii
+        :param theta_Rs: array of deflections at Rs
+        :param center_x: array of x-positions of the halos
+        :param center_y: array of y-positions of the halos
+        :return: f_xx, f_yy, f_xy in the shape of x
+        """
+        return self._evaluate(x, y, Rs, theta_Rs, center_x, center_y, hessian=True)
+
+    def _evaluate(self, x, y, Rs, theta_Rs, center_x, center_y, hessian):
+        shape = np.shape(x)
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        Rs = np.atleast_1d(np.asarray(Rs, dtype=float))
+        theta_Rs = np.atleast_1d(np.asarray(theta_Rs, dtype=float))
+        center_x = np.atleast_1d(np.asarray(center_x, dtype=float))
+        center_y = np.atleast_1d(np.asarray(center_y, dtype=float))
+        rho0 = self.nfw._alpha2rho0(theta_Rs=theta_Rs, Rs=Rs)
+        Rs = np.maximum(Rs, 0.0001)
+        num_maps = 3 if hessian else 2
+        maps = np.zeros((num_maps, len(x)))
+        if self._truncation is None:
+            for block in self._blocks(len(Rs), len(x)):
+                x_ = x - center_x[block, np.newaxis]
+                y_ = y - center_y[block, np.newaxis]
+                values = self._nfw(x_, y_, Rs[block, np.newaxis], rho0[block, np.newaxis], hessian)
+                for i in range(num_maps):
+                    maps[i] += np.sum(values[i], axis=0)
+        else:
+            r_trunc = self._truncation * Rs
+            theta_E2 = 4 * rho0 * Rs**3 * self.nfw._g(self._truncation * np.ones_like(Rs))
+            maps += self._point_masses(x, y, center_x, center_y, theta_E2, hessian)
+            halo, pix = self._pairs_within(x, y, center_x, center_y, r_trunc)
+            for pairs in self._blocks(len(halo), 1):
+                h, p = halo[pairs], pix[pairs]
+                x_ = x[p] - center_x[h]
+                y_ = y[p] - center_y[h]
+                values_nfw = self._nfw(x_, y_, Rs[h], rho0[h], hessian)
+                values_point = self._point_mass(x_, y_, theta_E2[h], hessian)
+                for i in range(num_maps):
+                    maps[i] += np.bincount(p, weights=values_nfw[i] - values_point[i], minlength=len(x))
+        return tuple([m.reshape(shape) for m in maps])
+
+    def _nfw(self, x_, y_, Rs, rho0, hessian):
+        """
+        NFW deflection (or Hessian) of centered coordinates, with Rs and rho0 broadcastable to x_
+        """
+        R = np.sqrt(x_**2 + y_**2)
+        if hessian is False:
+            return self.nfw.nfwAlpha(R, Rs, rho0, x_, y_)
+        kappa = 2 * rho0 * Rs * self.nfw._F(R / Rs)
+        gamma1, gamma2 = self.nfw.nfwGamma(R, Rs, rho0, x_, y_)
+        return kappa + gamma1, kappa - gamma1, gamma2
+
+    @staticmethod
+    def _point_mass(x_, y_, theta_E2, hessian):
+        """
+        point mass deflection (or Hessian) of centered coordinates with theta_E2 the squared Einstein radius
+        """
+        r2 = np.maximum(x_**2 + y_**2, 10**(-16))
+        if hessian is False:
+            a = theta_E2 / r2
+            return a * x_, a * y_
+        a = theta_E2 / r2**2
+        gamma1 = a * (y_**2 - x_**2)
+        return gamma1, -gamma1, -2 * a * x_ * y_
+
+    def _point_masses(self, x, y, center_x, center_y, theta_E2, hessian):
+        """
+        deflection (or Hessian) of the point masses with squared Einstein radii theta_E2. With zeta = x - i y, the
+        deflection is alpha_x + i alpha_y = sum theta_E2 / (zeta - zeta_h) and f_xx + i f_xy = -f_yy + i f_xy =
+        -sum theta_E2 / (zeta - zeta_h)^2. On the pixels far from a cell, the sum over its point masses is evaluated
+        with the moments a_k = sum theta_E2 (zeta_h - zeta_c)^k of the cell as sum_k a_k / (zeta - zeta_c)^(k+1), on
+        the other pixels it is evaluated exactly.
+
+        :return: array of shape (2, n_pix) of the deflections or (3, n_pix) of the Hessian
+        """
+        order = self._multipole_order
+        num_side = max(1, int(np.sqrt(self._cell_factor * np.sqrt(len(center_x)))))
+        x_min, y_min = np.min(center_x), np.min(center_y)
+        width = max(np.max(center_x) - x_min, np.max(center_y) - y_min, 10**(-10)) / num_side
+        i_x = np.minimum(((center_x - x_min) / width).astype(int), num_side - 1)
+        i_y = np.minimum(((center_y - y_min) / width).astype(int), num_side - 1)
+        cells, cell_index = np.unique(i_x * num_side + i_y, return_inverse=True)
+        cell_index = cell_index.ravel()
+        zeta_cell = x_min + (cells // num_side + 0.5) * width - 1j * (y_min + (cells % num_side + 0.5) * width)
+        dist = center_x - 1j * center_y - zeta_cell[cell_index]
+        r_near = np.zeros(len(cells))
+        np.maximum.at(r_near, cell_index, np.abs(dist))
+        r_near /= self._opening
+        moments = np.zeros((len(cells), order + 1), dtype=complex)
+        np.add.at(moments, cell_index, theta_E2[:, np.newaxis] * dist[:, np.newaxis]**np.arange(order + 1))
+        if hessian:
+            moments *= -np.arange(1, order + 2)
+
+        zeta = x - 1j * y
+        field = np.zeros(len(x), dtype=complex)
+        near_cell, near_pix = [], []
+        for block in self._blocks(len(cells), len(x)):
+            w = zeta - zeta_cell[block, np.newaxis]
+            near = np.abs(w) <= r_near[block, np.newaxis]
+            u = np.zeros_like(w)
+            np.divide(1., w, out=u, where=~near)
+            # Horner scheme of sum_k moments_k u^(k+1)
+            values = moments[block, order, np.newaxis] * u
+            for k in range(order - 1, -1, -1):
+                values += moments[block, k, np.newaxis]
+                values *= u
+            if hessian:
+                values *= u
+            field += np.sum(values, axis=0)
+            c, p = np.nonzero(near)
+            near_cell.append(c + block.start)
+            near_pix.append(p)
+        if hessian:
+            maps = [field.real, -field.real, field.imag]
+        else:
+            maps = [field.real, field.imag]
+
+        # exact point masses of all the (halo, pixel) pairs of the cells and their near pixels
+        near_cell, near_pix = np.concatenate(near_cell), np.concatenate(near_pix)
+        halo_order = np.argsort(cell_index, kind='mergesort')
+        num_halo = np.bincount(cell_index, minlength=len(cells))
+        first_halo = np.cumsum(num_halo) - num_halo
+        num_pairs = num_halo[near_cell]
+        pix = np.repeat(near_pix, num_pairs)
+        offset = np.arange(len(pix)) - np.repeat(np.cumsum(num_pairs) - num_pairs, num_pairs)
+        halo = halo_order[np.repeat(first_halo[near_cell], num_pairs) + offset]
+        for pairs in self._blocks(len(halo), 1):
+            h, p = halo[pairs], pix[pairs]
+            values = self._point_mass(x[p] - center_x[h], y[p] - center_y[h], theta_E2[h], hessian)
+            for i in range(len(maps)):
+                maps[i] += np.bincount(p, weights=values[i], minlength=len(x))
+        return np.array(maps)
+
+    @staticmethod
+    def _pairs_within(x, y, center_x, center_y, r_trunc):
+        """
+        all (halo, pixel) index pairs with the pixel inside the truncation radius of the halo
+
+        :return: halo indices, pixel indices
+        """
+        tree = cKDTree(np.column_stack((x, y)))
+        neighbors = tree.query_ball_point(np.column_stack((center_x, center_y)), r=r_trunc)
+        num = np.array([len(n) for n in neighbors], dtype=int)
+        halo = np.repeat(np.arange(len(center_x)), num)
+        if np.sum(num) == 0:
+            return halo, np.zeros(0, dtype=int)
+        pix = np.concatenate([np.asarray(n, dtype=int) for n in neighbors if len(n) > 0])
+        return halo, pix
+
+    def _blocks(self, num, num_pix):
+        """
+        slices over num elements such that each block of (block size, num_pix) stays below the memory limit
+
+        :param num: number of elements (halos or halo-pixel pairs)
+        :param num_pix: number of pixels per element
+        :return: list of slices
+        """
+        # about 16 temporary float64 arrays are alive during the evaluation of a block
+        block_size = int(max(1, self._max_memory // (16 * 8 * max(num_pix, 1))))
+        return [slice(i, i + block_size) for i in range(0, num, block_size)]
@@ -2,6 +2,7 @@ __author__ = 'sibirrer'
 #this file contains a class to make a gaussian
 
 import numpy as np
+import scipy.special as special
 import astrofunc.util as util
 from astrofunc.LensingProfiles.sersic_utils import SersicUtil
 import astrofunc.LensingProfiles.calc_util as calc_util
@@ -13,7 +14,15 @@ class Sersic(SersicUtil):
     """
     this class contains functions to evaluate a Sersic mass profile: https://arxiv.org/pdf/astro-ph/0311559.pdf
     """
+    def __init__(self, smoothing=SersicUtil._s, fast_potential=False):
+        """
 
+        :param smoothing: smoothing scale of the innermost part of the profile
+        :param fast_potential: bool, if True, evaluates the lensing potential with the vectorized incomplete gamma
+        function series (relative precision ~1e-13) instead of the hypergeometric function of mpmath pixel by pixel
+        """
+        SersicUtil.__init__(self, smoothing=smoothing)
+        self._fast_potential = fast_potential
 
     def function(self, x, y, n_sersic, r_eff, k_eff, center_x=0, center_y=0):
         """
@@ -22,12 +31,56 @@ class Sersic(SersicUtil):
         n = n_sersic
         x_red = self._x_reduced(x, y, n, r_eff, center_x, center_y)
         b = self.b_n(n)
+        f_eff = np.exp(b)*r_eff**2/2.*k_eff
+        if self._fast_potential:
+            # x^(2n) * 2F2(2n, 2n; 1+2n, 1+2n; -b*x) = (2n)^2 * b^(-2n) * int_0^(b*x) gamma(2n, t)/t dt
+            gamma_int = self._gamma_integral(2*n, b*np.atleast_1d(x_red))
+            f_ = f_eff * (2*n)**2 * b**(-2*n) * gamma_int
+            if np.ndim(x_red) == 0:
+                return f_[0]
+            return f_
         #hyper2f2_b = util.hyper2F2_array(2*n, 2*n, 1+2*n, 1+2*n, -b)
         hyper2f2_bx = util.hyper2F2_array(2*n, 2*n, 1+2*n, 1+2*n, -b*x_red)
-        f_eff = np.exp(b)*r_eff**2/2.*k_eff# * hyper2f2_b
         f_ = f_eff * x_red**(2*n) * hyper2f2_bx# / hyper2f2_b
         return f_
 
+    def _gamma_integral(self, a, z, n_laguerre=30):
+        """
+        integral of the lower incomplete gamma function int_0^z gamma(a, t)/t dt for an array of z > 0
+
+        For z < max(2a, a+10) the sum Gamma(a) * sum_k P(a+k, z)/(a+k) of positive terms is evaluated with the
+        regularized incomplete gamma functions P computed by downward recursion. For larger z the asymptotic form
+        Gamma(a) * (ln(z) - digamma(a)) + int_z^inf Gamma(a, t)/t dt is used, where the remaining integral is computed
+        with a Gauss-Laguerre quadrature.
+
+        :param a: shape parameter (2*n_sersic)
+        :param z: numpy array of upper integration limits
+        :param n_laguerre: number of Gauss-Laguerre nodes
+        :return: numpy array of the integral
+        """
+        out = np.empty_like(z, dtype=float)
+        z_switch = max(2. * a, a + 10.)
+        low = z < z_switch
+        z_low = z[low]
+        if len(z_low) > 0:
+            num_k = int(np.ceil(z_switch + 10 * np.sqrt(z_switch) + 20 - a))
+            p = special.gammainc(a + num_k, z_low)
+            log_z = np.log(z_low)
+            total = p / (a + num_k)
+            for k in range(num_k - 1, -1, -1):
+                s = a + k
+                # P(s, z) = P(s+1, z) + z^s e^(-z) / Gamma(s+1)
+                p += np.exp(s * log_z - z_low - special.gammaln(s + 1))
+                total += p / s
+            out[low] = special.gamma(a) * total
+        z_high = z[~low]
+        if len(z_high) > 0:
+            t, w = np.polynomial.laguerre.laggauss(n_laguerre)
+            z_t = z_high[:, np.newaxis] + t
+            tail = np.dot(special.gammaincc(a, z_t) * np.exp(t) / z_t, w)
+            out[~low] = special.gamma(a) * (np.log(z_high) - special.digamma(a) + tail)
+        return out
+
     def derivatives(self, x, y, n_sersic, r_eff, k_eff, center_x=0, center_y=0):
         """
         returns df/dx and df/dy of the function
@@ -9,8 +9,12 @@ class SersicDouble(object):
     """
     this class contains functions to evaluate a Sersic mass profile: https://arxiv.org/pdf/astro-ph/0311559.pdf
     """
-    def __init__(self):
-        self.sersic = SersicEllipse()
+    def __init__(self, fast_potential=False):
+        """
+
+        :param fast_potential: bool, see Sersic class
+        """
+        self.sersic = SersicEllipse(fast_potential=fast_potential)
         self._diff = 0.000001
 
     def function(self, x, y, k_eff, flux_ratio, r_eff, n_sersic, phi_G, q, R_2, n_2, center_x=0, center_y=0):
@@ -3,15 +3,19 @@ __author__ = 'sibirrer'
 
 import numpy as np
 from astrofunc.LensingProfiles.sersic import Sersic
+import astrofunc.LensingProfiles.calc_util as calc_util
 
 
 class SersicEllipse(object):
     """
     this class contains functions to evaluate a Sersic mass profile: https://arxiv.org/pdf/astro-ph/0311559.pdf
     """
-    def __init__(self):
-        self.sersic = Sersic()
-        self._diff = 0.000001
+    def __init__(self, fast_potential=False):
+        """
+
+        :param fast_potential: bool, see Sersic class
+        """
+        self.sersic = Sersic(fast_potential=fast_potential)
 
     def function(self, x, y, n_sersic, r_eff, k_eff, q, phi_G, center_x=0, center_y=0):
         """
@@ -40,17 +44,10 @@ class SersicEllipse(object):
         """
         returns Hessian matrix of function d^2f/dx^2, d^f/dy^2, d^2/dxdy
         """
-        alpha_ra, alpha_dec = self.derivatives(x, y, n_sersic, r_eff, k_eff, q, phi_G, center_x, center_y)
-        diff = self._diff
-        alpha_ra_dx, alpha_dec_dx = self.derivatives(x + diff, y, n_sersic, r_eff, k_eff, q, phi_G, center_x, center_y)
-        alpha_ra_dy, alpha_dec_dy = self.derivatives(x, y + diff, n_sersic, r_eff, k_eff, q, phi_G, center_x, center_y)
-
-        f_xx = (alpha_ra_dx - alpha_ra)/diff
-        f_xy = (alpha_ra_dy - alpha_ra)/diff
-        f_yx = (alpha_dec_dx - alpha_dec)/diff
-        f_yy = (alpha_dec_dy - alpha_dec)/diff
-
-        return f_xx, f_yy, f_xy
+        e = abs(1. - q)
+        x_, y_ = self._coord_transf(x, y, q, phi_G, center_x, center_y)
+        f_xx_prim, f_yy_prim, f_xy_prim = self.sersic.hessian(x_, y_, n_sersic, r_eff, k_eff)
+        return calc_util.hessian_ellipse(f_xx_prim, f_yy_prim, f_xy_prim, e, phi_G)
 
     def _coord_transf(self, x, y, q, phi_G, center_x, center_y):
         """
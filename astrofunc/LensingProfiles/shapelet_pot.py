@@ -4,53 +4,67 @@ __author__ = 'sibirrer'
 
 import numpy as np
 import scipy.special
+import scipy.sparse
 import math
 
 import astrofunc.util as util
 
+
 class PolarShapelets(object):
     """
-    this class contains the function and the derivatives of the Singular Isothermal Sphere
+    this class contains the function and the derivatives of the polar shapelets in potential space
+
+    All basis functions chi_lr of a set of coordinates are evaluated at once with the three-term recurrence of the
+    generalized Laguerre polynomials. Only the radial functions of p + |m| < n are stored. The tables are cached and
+    reused as long as the coordinates, the center and beta do not change and they are smaller than max_memory. The
+    transformations of the potential coefficients into the coefficients of the
+    deflection, convergence and shear are sparse matrices acting on the flattened coefficient array.
     """
-    def __init__(self):
-        n = 10
-        self.poly = [[[] for i in range(n)] for i in range(n)]
-        for i in range(0,n):
-            for j in range(0,n):
-                self.poly[i][j] = scipy.special.genlaguerre(i, j)
+    def __init__(self, max_memory=1e8):
+        """
+
+        :param max_memory: approximate upper limit (in bytes) of the cached basis tables
+        """
+        self._max_memory = max_memory
+        self._cache_key = None
+        self._cache_x, self._cache_y = None, None
+        self._radial, self._phase = None, None
+        self._num_cached = 0
+        self._transforms = {}
 
     def function(self, x, y, coeffs, beta, center_x=0, center_y=0):
         shapelets = self._createShapelet(coeffs)
-        r, phi = util.cart2polar(x, y, center=np.array([center_x, center_y]))
-        f_ = self._shapeletOutput(r, phi, beta, shapelets)
-        return f_
+        radial, phase = self._basis(x, y, beta, center_x, center_y, len(shapelets))
+        f_ = self._output(radial, phase, shapelets)
+        return f_.reshape(np.shape(x))[()]
 
     def derivatives(self, x, y, coeffs, beta, center_x=0, center_y=0):
         """
         returns df/dx and df/dy of the function
         """
         shapelets = self._createShapelet(coeffs)
-        r, phi = util.cart2polar(x, y, center=np.array([center_x, center_y]))
+        radial, phase = self._basis(x, y, beta, center_x, center_y, len(shapelets) + 1)
         alpha1_shapelets, alpha2_shapelets = self._alphaShapelets(shapelets, beta)
-        f_x = self._shapeletOutput(r, phi, beta, alpha1_shapelets)
-        f_y = self._shapeletOutput(r, phi, beta, alpha2_shapelets)
-        return f_x, f_y
+        f_x = self._output(radial, phase, alpha1_shapelets)
+        f_y = self._output(radial, phase, alpha2_shapelets)
+        return f_x.reshape(np.shape(x))[()], f_y.reshape(np.shape(x))[()]
 
     def hessian(self, x, y, coeffs, beta, center_x=0, center_y=0):
         """
         returns Hessian matrix of function d^2f/dx^2, d^f/dy^2, d^2/dxdy
         """
         shapelets = self._createShapelet(coeffs)
-        r, phi = util.cart2polar(x, y, center=np.array([center_x, center_y]))
+        radial, phase = self._basis(x, y, beta, center_x, center_y, len(shapelets) + 2)
         kappa_shapelets=self._kappaShapelets(shapelets, beta)
         gamma1_shapelets, gamma2_shapelets=self._gammaShapelets(shapelets, beta)
-        kappa_value=self._shapeletOutput(r, phi, beta, kappa_shapelets)
-        gamma1_value=self._shapeletOutput(r, phi, beta, gamma1_shapelets)
-        gamma2_value=self._shapeletOutput(r, phi, beta, gamma2_shapelets)
+        kappa_value=self._output(radial, phase, kappa_shapelets)
+        gamma1_value=self._output(radial, phase, gamma1_shapelets)
+        gamma2_value=self._output(radial, phase, gamma2_shapelets)
         f_xx = kappa_value + gamma1_value
         f_xy = gamma2_value
         f_yy = kappa_value - gamma1_value
-        return f_xx, f_yy, f_xy
+        shape = np.shape(x)
+        return f_xx.reshape(shape)[()], f_yy.reshape(shape)[()], f_xy.reshape(shape)[()]
 
     def _createShapelet(self,coeff):
         """
@@ -129,14 +143,91 @@ class PolarShapelets(object):
         :returns:  array of same size with coords [r,phi]
         :raises: AttributeError, KeyError
         """
-        if type(r) == float or type(r) == int or type(r) == type(np.float64(1)) or len(r) <= 1:
-            values = 0.
+        radial, phase = self._basis_polar(np.ravel(r), np.ravel(phi), beta, len(shapelets))
+        values = self._output(radial, phase, shapelets)
+        if np.shape(r) == ():
+            return values[0]
+        return values
+
+    def _basis(self, x, y, beta, center_x, center_y, num):
+        """
+        radial and angular tables of all basis functions with nl + nr < num at the coordinates (x, y). The tables of
+        the last call are reused if the coordinates, center and beta are unchanged and of sufficient order. Tables
+        larger than max_memory are not kept after the call.
+
+        :return: see _basis_polar()
+        """
+        key = (beta, center_x, center_y)
+        if self._cache_key == key and self._num_cached >= num and np.array_equal(x, self._cache_x) and \
+                np.array_equal(y, self._cache_y):
+            return self._radial, self._phase
+        r, phi = util.cart2polar(np.ravel(x), np.ravel(y), center=np.array([center_x, center_y]))
+        radial, phase = self._basis_polar(r, phi, beta, num)
+        if radial.nbytes + phase.nbytes <= self._max_memory:
+            self._radial, self._phase = radial, phase
+            self._num_cached = num
+            self._cache_key = key
+            self._cache_x, self._cache_y = np.array(x, copy=True), np.array(y, copy=True)
         else:
-            values=np.zeros(len(r))
-        for nl in range(0,len(shapelets)): #sum over different shapelets
-            for nr in range(0,len(shapelets)):
-                values+=shapelets[nl][nr]*self._chi_lr(r, phi, nl, nr, beta)
-        return values.real
+            self._radial, self._phase = None, None
+            self._cache_key = None
+            self._cache_x, self._cache_y = None, None
+        return radial, phase
+
+    @staticmethod
+    def _basis_polar(r, phi, beta, num):
+        """
+        radial and angular part of all basis functions chi_lr with nl + nr < num (Massey&Refregier eqn 8), such that
+        chi_lr = radial[i] * phase[|m|] for m = nr - nl >= 0 and chi_lr = radial[i] * conj(phase[|m|]) otherwise, with
+        p = min(nl, nr) and i = (p + |m|) * (p + |m| + 1) / 2 + |m|. The tables of a lower order are the first rows of
+        the tables.
+
+        :param r: 1d array of radial coordinates
+        :param phi: 1d array of angles
+        :param beta: shapelet scale
+        :param num: number of orders nl and nr
+        :return: radial table of shape (num * (num + 1) / 2, len(r)), phase table of shape (num, len(r))
+        """
+        u = (r/beta)**2
+        gauss = np.exp(-u/2) / (np.sqrt(np.pi) * beta)
+        radial = np.empty((num * (num + 1) // 2, len(r)))
+        p = np.arange(num)
+        for q in range(num):
+            # generalized Laguerre polynomials L_p^q(u) of p < num - q with the three-term recurrence in p
+            rows = (p[:num - q] + q) * (p[:num - q] + q + 1) // 2 + q
+            radial[rows[0]] = 1.
+            if num - q > 1:
+                radial[rows[1]] = 1 + q - u
+            for p_ in range(1, num - q - 1):
+                radial[rows[p_+1]] = ((2*p_ + 1 + q - u) * radial[rows[p_]] - (p_ + q) * radial[rows[p_-1]]) / (p_ + 1)
+            norm = (-1)**p[:num - q] * np.sqrt(np.exp(scipy.special.gammaln(p[:num - q] + 1) -
+                                                      scipy.special.gammaln(p[:num - q] + q + 1)))
+            radial[rows] *= norm[:, np.newaxis] * gauss
+            gauss = gauss * r / beta
+        phase = np.exp(-1j * p[:, np.newaxis] * phi)
+        return radial, phase
+
+    @staticmethod
+    def _output(radial, phase, shapelets):
+        """
+        sum over the basis functions weighted with the (complex) shapelet coefficients
+
+        :param radial: radial table of _basis_polar() of at least the order of shapelets
+        :param phase: phase table of _basis_polar()
+        :param shapelets: complex coefficients a_lr
+        :return: real part of sum a_lr chi_lr
+        """
+        num = len(shapelets)
+        n, q = np.tril_indices(num)
+        p = n - q
+        # Re(a_lr chi_lr + a_rl chi_rl) = Re((a_lr + conj(a_rl)) radial * phase) for nr = nl + q, q > 0
+        coeff = shapelets[p, p + q] + np.where(q > 0, np.conj(shapelets[p + q, p]), 0)
+        rows = np.arange(len(n))
+        weights = scipy.sparse.csr_matrix((np.concatenate([coeff.real, coeff.imag]),
+                                           (np.concatenate([q, q + num]), np.concatenate([rows, rows]))),
+                                          shape=(2 * num, len(n)))
+        values = weights.dot(radial[:len(n)])
+        return np.sum(phase[:num].real * values[:num] - phase[:num].imag * values[num:], axis=0)
 
     def _chi_lr(self,r, phi, nl,nr,beta):
         """
@@ -163,8 +254,8 @@ class PolarShapelets(object):
         else:
             prefac=-1
         prefactor=prefac/beta**(abs(m)+1)*np.sqrt(math.factorial(p)/(np.pi*math.factorial(p2)))
-        poly=self.poly[p][q]
-        return prefactor*r**q*poly((r/beta)**2)*np.exp(-(r/beta)**2/2)*np.exp(-1j*m*phi)
+        poly = scipy.special.eval_genlaguerre(p, q, (r/beta)**2)
+        return prefactor*r**q*poly*np.exp(-(r/beta)**2/2)*np.exp(-1j*m*phi)
 
     def _kappaShapelets(self, shapelets, beta):
         """
@@ -174,19 +265,7 @@ class PolarShapelets(object):
         :returns:  set of kappa shapelets.
         :raises: AttributeError, KeyError
         """
-        output=np.zeros((len(shapelets)+1,len(shapelets)+1),'complex')
-        for nl in range(0,len(shapelets)):
-            for nr in range(0,len(shapelets)):
-                a_lr=shapelets[nl][nr]
-                if nl>0:
-                    output[nl-1][nr+1]+=a_lr*np.sqrt(nl*(nr+1))/2
-                    if nr>0:
-                        output[nl-1][nr-1]+=a_lr*np.sqrt(nl*nr)/2
-                output[nl+1][nr+1]+=a_lr*np.sqrt((nl+1)*(nr+1))/2
-                if nr>0:
-                    output[nl+1][nr-1]+=a_lr*np.sqrt((nl+1)*nr)/2
-        return output/beta**2
-
+        return self._transform('kappa', shapelets)/beta**2
 
     def _alphaShapelets(self,shapelets, beta):
         """
@@ -196,22 +275,7 @@ class PolarShapelets(object):
         :returns:  set of alpha shapelets.
         :raises: AttributeError, KeyError
         """
-        output_x=np.zeros((len(shapelets)+1,len(shapelets)+1),'complex')
-        output_y=np.zeros((len(shapelets)+1,len(shapelets)+1),'complex')
-        for nl in range(0,len(shapelets)):
-            for nr in range(0,len(shapelets)):
-                a_lr=shapelets[nl][nr]
-                output_x[nl][nr+1]-=a_lr*np.sqrt(nr+1)/2
-                output_y[nl][nr+1]-=a_lr*np.sqrt(nr+1)/2*1j
-                output_x[nl+1][nr]-=a_lr*np.sqrt(nl+1)/2
-                output_y[nl+1][nr]+=a_lr*np.sqrt(nl+1)/2*1j
-                if nl>0:
-                    output_x[nl-1][nr]+=a_lr*np.sqrt(nl)/2
-                    output_y[nl-1][nr]-=a_lr*np.sqrt(nl)/2*1j
-                if nr>0:
-                    output_x[nl][nr-1]+=a_lr*np.sqrt(nr)/2
-                    output_y[nl][nr-1]+=a_lr*np.sqrt(nr)/2*1j
-        return output_x/beta,output_y/beta  #attention complex numbers!!!!
+        return self._transform('alpha_x', shapelets)/beta, self._transform('alpha_y', shapelets)/beta  #attention complex numbers!!!!
 
     def _gammaShapelets(self,shapelets, beta):
         """
@@ -221,30 +285,62 @@ class PolarShapelets(object):
         :returns:  set of alpha shapelets.
         :raises: AttributeError, KeyError
         """
-        output_x=np.zeros((len(shapelets)+2,len(shapelets)+2),'complex')
-        output_y=np.zeros((len(shapelets)+2,len(shapelets)+2),'complex')
-        for nl in range(0,len(shapelets)):
-            for nr in range(0,len(shapelets)):
-                a_lr=shapelets[nl][nr]
-                output_x[nl+2][nr]+=a_lr*np.sqrt((nl+1)*(nl+2))/2
-                output_x[nl][nr+2]+=a_lr*np.sqrt((nr+1)*(nr+2))/2
-                output_x[nl][nr]+=a_lr*(1-(nr+1)-(nl+1))
-                if nl>1:
-                    output_x[nl-2][nr]+=a_lr*np.sqrt((nl)*(nl-1))/2
-                if nr>1:
-                    output_x[nl][nr-2]+=a_lr*np.sqrt((nr)*(nr-1))/2
-
-                output_y[nl+2][nr]+=a_lr*np.sqrt((nl+1)*(nl+2))*1j/4
-                output_y[nl][nr+2]-=a_lr*np.sqrt((nr+1)*(nr+2))*1j/4
-                if nl>0:
-                    output_y[nl-1][nr+1]+=a_lr*np.sqrt((nl)*(nr+1))*1j/2
-                if nr>0:
-                    output_y[nl+1][nr-1]-=a_lr*np.sqrt((nr)*(nl+1))*1j/2
-                if nl>1:
-                    output_y[nl-2][nr]-=a_lr*np.sqrt((nl)*(nl-1))*1j/4
-                if nr>1:
-                    output_y[nl][nr-2]+=a_lr*np.sqrt((nr)*(nr-1))*1j/4
-        return output_x/beta**2,output_y/beta**2  #attention complex numbers!!!!
+        return self._transform('gamma1', shapelets)/beta**2, self._transform('gamma2', shapelets)/beta**2  #attention complex numbers!!!!
+
+    def _transform(self, kind, shapelets):
+        """
+        applies the (cached) sparse transformation matrix of kind to the coefficients
+
+        :param kind: 'kappa', 'alpha_x', 'alpha_y', 'gamma1' or 'gamma2'
+        :param shapelets: complex coefficients of shape (n, n)
+        :return: transformed coefficients of shape (n+1, n+1) or (n+2, n+2) for the shear
+        """
+        num = len(shapelets)
+        if (kind, num) not in self._transforms:
+            self._transforms[(kind, num)] = self._transform_matrix(kind, num)
+        matrix, num_out = self._transforms[(kind, num)]
+        return (matrix.dot(np.ravel(shapelets))).reshape(num_out, num_out)
+
+    @staticmethod
+    def _transform_matrix(kind, num):
+        """
+        sparse matrix mapping the flattened (num, num) potential coefficients to the flattened coefficients of kind.
+        Each term maps a_lr to the coefficient (nl + dl, nr + dr) with a weight depending on (nl, nr).
+
+        :param kind: 'kappa', 'alpha_x', 'alpha_y', 'gamma1' or 'gamma2'
+        :param num: number of orders nl and nr of the potential coefficients
+        :return: sparse matrix, number of orders of the output
+        """
+        nl, nr = np.meshgrid(np.arange(num), np.arange(num), indexing='ij')
+        nl, nr = nl.ravel(), nr.ravel()
+        if kind == 'kappa':
+            terms = [(-1, 1, np.sqrt(nl*(nr+1))/2), (-1, -1, np.sqrt(nl*nr)/2), (1, 1, np.sqrt((nl+1)*(nr+1))/2),
+                     (1, -1, np.sqrt((nl+1)*nr)/2)]
+        elif kind == 'alpha_x':
+            terms = [(0, 1, -np.sqrt(nr+1)/2), (1, 0, -np.sqrt(nl+1)/2), (-1, 0, np.sqrt(nl)/2),
+                     (0, -1, np.sqrt(nr)/2)]
+        elif kind == 'alpha_y':
+            terms = [(0, 1, -np.sqrt(nr+1)/2*1j), (1, 0, np.sqrt(nl+1)/2*1j), (-1, 0, -np.sqrt(nl)/2*1j),
+                     (0, -1, np.sqrt(nr)/2*1j)]
+        elif kind == 'gamma1':
+            terms = [(2, 0, np.sqrt((nl+1)*(nl+2))/2), (0, 2, np.sqrt((nr+1)*(nr+2))/2), (0, 0, -(nl+nr+1.)),
+                     (-2, 0, np.sqrt(nl*(nl-1))/2), (0, -2, np.sqrt(nr*(nr-1))/2)]
+        elif kind == 'gamma2':
+            terms = [(2, 0, np.sqrt((nl+1)*(nl+2))*1j/4), (0, 2, -np.sqrt((nr+1)*(nr+2))*1j/4),
+                     (-1, 1, np.sqrt(nl*(nr+1))*1j/2), (1, -1, -np.sqrt(nr*(nl+1))*1j/2),
+                     (-2, 0, -np.sqrt(nl*(nl-1))*1j/4), (0, -2, np.sqrt(nr*(nr-1))*1j/4)]
+        else:
+            raise ValueError("transformation %s not supported." % kind)
+        num_out = num + 2 if kind in ['gamma1', 'gamma2'] else num + 1
+        rows, cols, data = [], [], []
+        for dl, dr, weight in terms:
+            valid = (nl + dl >= 0) & (nr + dr >= 0)
+            rows.append(((nl + dl) * num_out + nr + dr)[valid])
+            cols.append((nl * num + nr)[valid])
+            data.append(np.broadcast_to(weight, nl.shape)[valid].astype(complex))
+        matrix = scipy.sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                                         shape=(num_out**2, num**2))
+        return matrix, num_out
 
     def _get_num_l(self, n_coeffs):
         """
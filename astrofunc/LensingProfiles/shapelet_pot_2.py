@@ -6,6 +6,8 @@ import numpy as np
 import math
 import numpy.polynomial.hermite as hermite
 
+from astrofunc.LightProfiles.shapelets import hermite_functions
+
 
 class CartShapelets(object):
     """
@@ -100,7 +102,7 @@ class CartShapelets(object):
         if n <= 1:
             values = 0.
         else:
-            values = np.zeros(len(x[0]))
+            values = np.zeros(np.shape(x[0]))
         n = 0
         k = 0
         i = 0
@@ -194,7 +196,8 @@ class CartShapelets(object):
 
     def phi_n(self,n,x):
         """
-        constructs the 1-dim basis function (formula (1) in Refregier et al. 2001)
+        constructs the 1-dim basis function (formula (1) in Refregier et al. 2001). The recurrence of
+        hermite_functions() evaluates all the orders up to n, use pre_calc() when several orders are needed.
 
         :param n: The n'the basis function.
         :type name: int.
@@ -203,8 +206,7 @@ class CartShapelets(object):
         :returns:  array-- phi_n(x).
         :raises: AttributeError, KeyError
         """
-        prefactor = 1./np.sqrt(2**n*np.sqrt(np.pi)*math.factorial(n))
-        return prefactor*self.H_n(n,x)*np.exp(-x**2/2.)
+        return hermite_functions(x, n)[n][()]
 
     def pre_calc(self, x, y, beta, n_order, center_x, center_y):
         """
@@ -219,17 +221,10 @@ class CartShapelets(object):
         :return: list of H_n(x) and H_n(y)
         """
 
-        n = len(np.atleast_1d(x))
         x_ = x - center_x
         y_ = y - center_y
-        H_x = np.empty((n_order+1, n))
-        H_y = np.empty((n_order+1, n))
-        for n in range(0,n_order+1):
-            prefactor = 1./np.sqrt(2**n*np.sqrt(np.pi)*math.factorial(n))
-            n_array = np.zeros(n+1)
-            n_array[n] = 1
-            H_x[n] = hermite.hermval(x_/beta, n_array) * prefactor * np.exp(-(x_/beta)**2/2.)
-            H_y[n] = hermite.hermval(y_/beta, n_array) * prefactor * np.exp(-(y_/beta)**2/2.)
+        H_x = hermite_functions(x_/beta, n_order)
+        H_y = hermite_functions(y_/beta, n_order)
         return H_x, H_y
 
     def _get_num_n(self, n_coeffs):
@@ -2,7 +2,7 @@ __author__ = 'sibirrer'
 
 import numpy as np
 
-from lenstronomy.FunctionSet.barkana_integrals import BarkanaIntegrals
+from astrofunc.LensingProfiles.barkana_integrals import BarkanaIntegrals
 
 class SPEMD(BarkanaIntegrals):
     """
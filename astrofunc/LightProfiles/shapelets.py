@@ -6,6 +6,28 @@ import math
 
 import astrofunc.util as util
 
+
+def hermite_functions(x, n_order):
+    """
+    normalized 1-dim shapelet basis functions phi_n(x) (formula (1) in Refregier et al. 2001) of all orders
+    n <= n_order from the three-term recurrence
+    phi_n+1 = sqrt(2/(n+1)) x phi_n - sqrt(n/(n+1)) phi_n-1, with phi_0 = pi^(-1/4) exp(-x^2/2)
+
+    :param x: 1-dim positions (dimensionless), float or array of any shape
+    :param n_order: maximal order
+    :return: array of shape (n_order+1,) + np.shape(x)
+    """
+    shape = np.shape(x)
+    x = np.ravel(x)
+    phi = np.empty((n_order+1, len(x)))
+    phi[0] = 1./np.sqrt(np.sqrt(np.pi)) * np.exp(-x**2/2.)
+    if n_order > 0:
+        phi[1] = np.sqrt(2.) * x * phi[0]
+    for n in range(1, n_order):
+        phi[n+1] = np.sqrt(2./(n+1)) * x * phi[n] - np.sqrt(float(n)/(n+1)) * phi[n-1]
+    return phi.reshape((n_order+1,) + shape)
+
+
 class Shapelets(object):
     """
 
@@ -26,7 +48,7 @@ class Shapelets(object):
                 n_array[k] = 1
                 values = hermite.hermval(self.x_grid, n_array)
                 self.H_interp[k] = values
-            print 'H interpolated'
+            print('H interpolated')
 
     def function(self, x, y, amp, beta, n1, n2, center_x, center_y):
         """
@@ -92,17 +114,8 @@ class Shapelets(object):
         """
         x_ = x - center_x
         y_ = y - center_y
-        H_x = np.empty((n_order+1, len(x)))
-        H_y = np.empty((n_order+1, len(x)))
-        if n_order > 170:
-            raise ValueError('polynomial order to large', n_order)
-        for n in range(0, n_order+1):
-
-            prefactor = 1./np.sqrt(2**n*np.sqrt(np.pi)*math.factorial(n))
-            n_array = np.zeros(n+1)
-            n_array[n] = 1
-            H_x[n] = hermite.hermval(x_/beta, n_array) * prefactor * np.exp(-(x_/beta)**2/2.)
-            H_y[n] = hermite.hermval(y_/beta, n_array) * prefactor * np.exp(-(y_/beta)**2/2.)
+        H_x = hermite_functions(x_/beta, n_order)
+        H_y = hermite_functions(y_/beta, n_order)
         return H_x, H_y
 
     def get_shapelet_set(self, num_order, beta, numPix):
@@ -113,32 +126,60 @@ class Shapelets(object):
         :param numPix: number of pixel of the grid
         :return: list of shapelets drawn on pixel grid, centered.
         """
-        num_param = (num_order+2)*(num_order+1)/2
-        kernel_list = []
         x_grid, y_grid = util.make_grid(numPix, deltapix=1, subgrid_res=1)
-        n1 = 0
-        n2 = 0
-        H_x, H_y = self.pre_calc(x_grid, y_grid, beta, num_order, center_x=0, center_y=0)
-        for i in range(num_param):
-            if True: # n1 % 2 == 0 and n2 % 2 == 0:
-                kwargs_source_shapelet = {'center_x': 0, 'center_y': 0, 'n1': n1, 'n2': n2, 'beta': beta, 'amp': 1}
-                kernel = self.function(H_x, H_y, **kwargs_source_shapelet)
-                kernel = util.array2image(kernel)
-                kernel_list.append(kernel)
-            if n1 == 0:
-                n1 = n2 + 1
-                n2 = 0
-            else:
-                n1 -= 1
-                n2 += 1
-        return kernel_list
+        x_axes, y_axes = util.get_axes(x_grid, y_grid)
+        H_x, H_y = self.pre_calc(x_axes, y_axes, beta, num_order, center_x=0, center_y=0)
+        n1, n2 = shapelet_indices(num_order)
+        return [np.outer(H_y[n2[i]], H_x[n1[i]]) for i in range(len(n1))]
+
+
+def shapelet_indices(n_max):
+    """
+    orders (n1, n2) of the shapelet coefficients in the order used by ShapeletSet and Shapelets.get_shapelet_set
+
+    :param n_max: maximal order n1 + n2 <= n_max
+    :return: integer arrays n1, n2 of length (n_max+1)*(n_max+2)/2
+    """
+    n1 = np.concatenate([np.arange(n, -1, -1) for n in range(n_max+1)]).astype(int)
+    n2 = np.concatenate([np.arange(0, n+1) for n in range(n_max+1)]).astype(int)
+    return n1, n2
+
 
 class ShapeletSet(object):
     """
     class to operate on entire shapelet set
+
+    The basis functions form the design matrix B of shape (num_param, npix) with B[i] = phi_n1(x) * phi_n2(y), such
+    that the surface brightness is amp.dot(B) and the decomposition B.dot(image). Since B is an outer product of the
+    1d basis functions H_x and H_y, both products are evaluated in factorized form as matrix products of the
+    (n_max+1, npix) arrays without building B: f = sum_n2 H_y[n2] * (A^T H_x)[n2] with A[n1, n2] = amp and
+    coefficients[n1, n2] = (H_x * image) H_y^T. For large grids, the pixels are processed in chunks.
     """
-    def __init__(self):
+    def __init__(self, dtype=np.float64, max_memory=1e6):
+        """
+
+        :param dtype: floating point type of the basis functions (e.g. np.float32 for faster products)
+        :param max_memory: approximate upper limit (in bytes) of the temporary arrays of one chunk of pixels
+        """
         self.shapelets = Shapelets()
+        self._dtype = dtype
+        self._max_memory = max_memory
+
+    def design_matrix(self, x, y, n_max, beta, center_x=0, center_y=0):
+        """
+        shapelet basis functions up to order n_max evaluated at (x, y)
+
+        :param x: 1d array of x-coordinates
+        :param y: 1d array of y-coordinates
+        :param n_max: maximal shapelet order
+        :param beta: shapelet scale
+        :param center_x: center in x
+        :param center_y: center in y
+        :return: array of shape (num_param, len(x))
+        """
+        n1, n2 = shapelet_indices(n_max)
+        H_x, H_y = self._pre_calc(x, y, n_max, beta, center_x, center_y)
+        return H_x[n1] * H_y[n2]
 
     def function(self, x, y, amp, n_max, beta, center_x=0, center_y=0):
         """
@@ -151,38 +192,20 @@ class ShapeletSet(object):
         :param center_y:
         :return:
         """
-        num_param = (n_max+1)*(n_max+2)/2
-        f_ = np.zeros_like(x)
-        n1 = 0
-        n2 = 0
-        H_x, H_y = self.shapelets.pre_calc(x, y, beta, n_max, center_x, center_y)
-        for i in range(num_param):
-            kwargs_source_shapelet = {'center_x': center_x, 'center_y': center_y, 'n1': n1, 'n2': n2, 'beta': beta, 'amp': amp[i]}
-            f_ += self.shapelets.function(H_x, H_y, **kwargs_source_shapelet)
-            if n1 == 0:
-                n1 = n2 + 1
-                n2 = 0
-            else:
-                n1 -= 1
-                n2 += 1
-        return f_
+        n1, n2 = shapelet_indices(n_max)
+        amp_matrix = np.zeros((n_max+1, n_max+1), dtype=self._dtype)
+        amp_matrix[n1, n2] = amp
+        x_, y_ = np.ravel(x), np.ravel(y)
+        f_ = np.empty(len(x_), dtype=self._dtype)
+        for chunk in self._chunks(len(x_), n_max):
+            H_x, H_y = self._pre_calc(x_[chunk], y_[chunk], n_max, beta, center_x, center_y)
+            f_[chunk] = np.einsum('ij,ij->j', amp_matrix.T.dot(H_x), H_y)
+        return f_.reshape(np.shape(x))
 
     def function_split(self, x, y, amp, n_max, beta, center_x=0, center_y=0):
-        num_param = (n_max+1)*(n_max+2)/2
-        A = []
-        n1 = 0
-        n2 = 0
-        H_x, H_y = self.shapelets.pre_calc(x, y, beta, n_max, center_x, center_y)
-        for i in range(num_param):
-            kwargs_source_shapelet = {'center_x': center_x, 'center_y': center_y, 'n1': n1, 'n2': n2, 'beta': beta, 'amp': amp[i]}
-            A.append(self.shapelets.function(H_x, H_y, **kwargs_source_shapelet))
-            if n1 == 0:
-                n1 = n2 + 1
-                n2 = 0
-            else:
-                n1 -= 1
-                n2 += 1
-        return A
+        B = self.design_matrix(np.ravel(x), np.ravel(y), n_max, beta, center_x, center_y)
+        B *= np.asarray(amp, dtype=self._dtype)[:, np.newaxis]
+        return [base.reshape(np.shape(x)) for base in B]
 
     def decomposition(self, image, x, y, n_max, beta, deltaPix, center_x=0, center_y=0):
         """
@@ -196,24 +219,75 @@ class ShapeletSet(object):
         :param center_y:
         :return:
         """
-        num_param = (n_max+1)*(n_max+2)/2
-        param_list = np.zeros(num_param)
         amp_norm = 1./beta**2*deltaPix**2
-        n1 = 0
-        n2 = 0
+        image = np.asarray(image, dtype=self._dtype).ravel()
+        x_, y_ = np.ravel(x), np.ravel(y)
+        param_matrix = np.zeros((n_max+1, n_max+1))
+        for chunk in self._chunks(len(x_), n_max):
+            H_x, H_y = self._pre_calc(x_[chunk], y_[chunk], n_max, beta, center_x, center_y)
+            param_matrix += (H_x * image[chunk]).dot(H_y.T)
+        n1, n2 = shapelet_indices(n_max)
+        return param_matrix[n1, n2] * amp_norm
+
+    def function_grid(self, x_axes, y_axes, amp, n_max, beta, center_x=0, center_y=0):
+        """
+        shapelet set on the regular grid spanned by x_axes and y_axes. The basis is separable, such that the 1d basis
+        functions are evaluated on len(x_axes) + len(y_axes) points only.
+
+        :param x_axes: x-coordinates of the grid (e.g. from util.get_axes())
+        :param y_axes: y-coordinates of the grid
+        :param amp: shapelet coefficients
+        :param n_max: maximal shapelet order
+        :param beta: shapelet scale
+        :param center_x: center in x
+        :param center_y: center in y
+        :return: 2d image of shape (len(y_axes), len(x_axes))
+        """
+        n1, n2 = shapelet_indices(n_max)
+        amp_matrix = np.zeros((n_max+1, n_max+1), dtype=self._dtype)
+        amp_matrix[n1, n2] = amp
+        H_x, H_y = self._pre_calc(x_axes, y_axes, n_max, beta, center_x, center_y)
+        return H_y.T.dot(amp_matrix.T).dot(H_x)
+
+    def decomposition_grid(self, image, x_axes, y_axes, n_max, beta, deltaPix, center_x=0, center_y=0):
+        """
+        decomposes a 2d image on the regular grid spanned by x_axes and y_axes into the shapelet coefficients (in same
+        order as for the function call) with the two matrix products H_x * image^T * H_y^T
+
+        :param image: 2d image of shape (len(y_axes), len(x_axes))
+        :param x_axes: x-coordinates of the grid (e.g. from util.get_axes())
+        :param y_axes: y-coordinates of the grid
+        :param n_max: maximal shapelet order
+        :param beta: shapelet scale
+        :param deltaPix: pixel size
+        :param center_x: center in x
+        :param center_y: center in y
+        :return: shapelet coefficients
+        """
+        amp_norm = 1./beta**2*deltaPix**2
+        H_x, H_y = self._pre_calc(x_axes, y_axes, n_max, beta, center_x, center_y)
+        image = np.asarray(image, dtype=self._dtype)
+        param_matrix = H_x.dot(image.T).dot(H_y.T)
+        n1, n2 = shapelet_indices(n_max)
+        return param_matrix[n1, n2] * amp_norm
+
+    def _pre_calc(self, x, y, n_max, beta, center_x, center_y):
         H_x, H_y = self.shapelets.pre_calc(x, y, beta, n_max, center_x, center_y)
-        for i in range(num_param):
-            kwargs_source_shapelet = {'center_x': center_x, 'center_y': center_y, 'n1': n1, 'n2': n2, 'beta': beta, 'amp': amp_norm}
-            base = self.shapelets.function(H_x, H_y, **kwargs_source_shapelet)
-            param = np.sum(image*base)
-            param_list[i] = param
-            if n1 == 0:
-                n1 = n2 + 1
-                n2 = 0
-            else:
-                n1 -= 1
-                n2 += 1
-        return param_list
+        return H_x.astype(self._dtype, copy=False), H_y.astype(self._dtype, copy=False)
+
+    def _chunks(self, num_pix, n_max):
+        """
+        slices over the pixels such that the temporary arrays of one chunk stay below the memory limit
+
+        :param num_pix: number of pixels
+        :param n_max: maximal shapelet order
+        :return: list of slices
+        """
+        # the two arrays of 1d basis functions and their matrix product
+        num_values = 3 * (n_max + 1)
+        chunk_size = int(max(1, self._max_memory // (num_values * np.dtype(self._dtype).itemsize)))
+        return [slice(i, i + chunk_size) for i in range(0, max(num_pix, 1), chunk_size)]
+
 
 class Decompose(object):
     """
@@ -234,7 +308,7 @@ class Decompose(object):
         :param center_y:
         :return:
         """
-        num_param = (n_max + 1) * (n_max + 2) / 2
+        num_param = int((n_max + 1) * (n_max + 2) / 2)
         param_list = np.zeros(num_param)
         amp_norm = 1. / beta ** 2 * deltaPix ** 2
         n1 = 0
@@ -2,13 +2,16 @@ __author__ = 'sibirrer'
 
 from scipy import fftpack
 import numpy as np
-import util
+import astrofunc.util as util
 
 
 class Correlation(object):
     """
     class to analyse correlations in an image or in the residuals
     """
+    def __init__(self):
+        self._binner = None
+
     def correlation_2D(self, image):
         """
 
@@ -25,8 +28,10 @@ class Correlation(object):
         # Calculate a 2D power spectrum
         psd2D = np.abs(F2)
 
-        # Calculate the azimuthally averaged 1D power spectrum
-        psd1D = util.azimuthalAverage(psd2D)
+        # Calculate the azimuthally averaged 1D power spectrum with the binner of the last image shape
+        if self._binner is None or self._binner.shape != np.shape(psd2D):
+            self._binner = util.AzimuthalBinner(np.shape(psd2D))
+        psd1D = self._binner.average(psd2D)
         return psd1D, psd2D
 
     def random_1D(self, numPix):
@@ -1,163 +1,546 @@
-import scipy
-import scipy.signal.signaltools as signaltools
+import time
 import numpy as np
+import scipy.signal
 
 
-class FFTConvolve(object):
+_auto_backends = {}  # backend names chosen by benchmark per (fft shape, workers)
+
+
+def next_fast_len(n):
     """
-    fft convolution routines optimized for different scipy versions
+    smallest 5-smooth number (2^a 3^b 5^c) >= n, a fast length for all FFT backends.
+    The padded shapes are computed with this function independent of the backend such that a kernel spectrum computed
+    with one backend can be used with any other.
+
+    :param n: minimal length
+    :return: fast length
     """
+    n = int(n)
+    if n <= 6:
+        return max(n, 1)
+    best = 2 * n
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p235 = p35
+            while p235 < n:
+                p235 *= 2
+            best = min(best, p235)
+            p35 *= 3
+        p5 *= 5
+    return best
 
-    def fftconvolve(self, in1, in2, int2_fft, mode="same"):
+
+class FFTBackend(object):
+    """
+    real-to-complex n-dimensional FFT routines of one of the FFT libraries 'numpy' (numpy.fft), 'scipy' (scipy.fft,
+    multi-threaded with workers) or 'pyfftw' (pyfftw.interfaces, multi-threaded with workers)
+    """
+    def __init__(self, name, workers=None):
         """
 
-        :param in1:
-        :param in2:
-        :param int2_fft:
-        :param mode:
-        :return:
+        :param name: 'numpy', 'scipy' or 'pyfftw'
+        :param workers: number of threads (not used by numpy)
         """
-        if scipy.__version__ == '0.14.0':
-            return self._fftconvolve_14(in1, in2, int2_fft, mode)
+        if name == 'numpy':
+            self._module = np.fft
+            self._kwargs = {}
+        elif name == 'scipy':
+            import scipy.fft
+            self._module = scipy.fft
+            self._kwargs = {'workers': workers}
+        elif name == 'pyfftw':
+            import pyfftw.interfaces.cache
+            import pyfftw.interfaces.numpy_fft
+            pyfftw.interfaces.cache.enable()
+            self._module = pyfftw.interfaces.numpy_fft
+            self._kwargs = {'threads': workers or 1}
         else:
-            return self._fftconvolve_18(in1, in2, int2_fft, mode)
+            raise ValueError("FFT backend %s not supported, chose 'numpy', 'scipy' or 'pyfftw'." % name)
+        self.name = name
+        self.workers = workers
 
-    # scipy-0.18.0 compatible
-    def _fftconvolve_18(self, in1, in2, int2_fft, mode="same"):
-        """
-        scipy routine scipy.signal.fftconvolve with kernel already fourier transformed
-        """
-        in1 = signaltools.asarray(in1)
-        in2 = signaltools.asarray(in2)
+    def rfftn(self, a, s, axes=None):
+        return self._module.rfftn(a, s, axes=axes, **self._kwargs)
 
-        if in1.ndim == in2.ndim == 0:  # scalar inputs
-            return in1 * in2
-        elif not in1.ndim == in2.ndim:
-            raise ValueError("in1 and in2 should have the same dimensionality")
-        elif in1.size == 0 or in2.size == 0:  # empty arrays
-            return signaltools.array([])
+    def irfftn(self, a, s, axes=None):
+        return self._module.irfftn(a, s, axes=axes, **self._kwargs)
+
+
+def available_backends():
+    """
+    names of the FFT backends which can be imported
+    """
+    backends = ['numpy']
+    for name in ['scipy', 'pyfftw']:
+        try:
+            FFTBackend(name)
+        except ImportError:
+            continue
+        backends.append(name)
+    return backends
 
-        s1 = signaltools.array(in1.shape)
-        s2 = signaltools.array(in2.shape)
 
-        shape = s1 + s2 - 1
+def benchmark_backends(shape, workers=None, num_repeat=3):
+    """
+    times a forward and backward real FFT of the given shape for all available backends
 
-        # Check that input sizes are compatible with 'valid' mode
-        if signaltools._inputs_swap_needed(mode, s1, s2):
-            # Convolution is commutative; order doesn't have any effect on output
-            in1, s1, in2, s2 = in2, s2, in1, s1
+    :param shape: shape of the FFT
+    :param workers: number of threads
+    :param num_repeat: number of repetitions, the fastest is kept
+    :return: dictionary of backend name: time in seconds
+    """
+    a = np.random.RandomState(seed=42).rand(*shape)
+    times = {}
+    for name in available_backends():
+        backend = FFTBackend(name, workers)
+        backend.irfftn(backend.rfftn(a, shape), shape)  # warm-up, e.g. planning
+        best = np.inf
+        for i in range(num_repeat):
+            start = time.time()
+            backend.irfftn(backend.rfftn(a, shape), shape)
+            best = min(best, time.time() - start)
+        times[name] = best
+    return times
 
-        # Speed up FFT by padding to optimal size for FFTPACK
-        fshape = [signaltools.fftpack.helper.next_fast_len(int(d)) for d in shape]
-        fslice = tuple([slice(0, int(sz)) for sz in shape])
-        # Pre-1.9 NumPy FFT routines are not threadsafe.  For older NumPys, make
-        # sure we only call rfftn/irfftn from one thread at a time.
 
-        ret = np.fft.irfftn(np.fft.rfftn(in1, fshape) *
-                    int2_fft, fshape)[fslice].copy()
-        #np.fft.rfftn(in2, fshape)
+def default_backend():
+    """
+    name of the FFT backend used when none is specified: 'scipy' if it can be imported, else 'numpy'
+    """
+    try:
+        FFTBackend('scipy')
+    except ImportError:
+        return 'numpy'
+    return 'scipy'
+
+
+def get_backend(backend=None, workers=None, shape=(256, 256)):
+    """
+    returns an FFT backend
+
+    :param backend: 'numpy', 'scipy', 'pyfftw', None for default_backend() or 'auto' for the fastest available backend
+     in a benchmark of the given shape (opt-in, the result of the benchmark is kept per shape and workers)
+    :param workers: number of threads
+    :param shape: FFT shape for the benchmark of backend='auto'
+    :return: FFTBackend instance
+    """
+    if isinstance(backend, FFTBackend):
+        return backend
+    if backend is None:
+        backend = default_backend()
+    elif backend == 'auto':
+        key = (tuple(shape), workers)
+        if key not in _auto_backends:
+            times = benchmark_backends(shape, workers)
+            _auto_backends[key] = min(times, key=times.get)
+        backend = _auto_backends[key]
+    return FFTBackend(backend, workers)
 
 
-        if mode == "full":
-            return ret
-        elif mode == "same":
-            return signaltools._centered(ret, s1)
-        elif mode == "valid":
-            return signaltools._centered(ret, s1 - s2 + 1)
+# constants of the cost model of convolution_costs() in seconds per operation
+_cost_fft = 0.9e-9  # per point and log2(points) of a real FFT
+_cost_fft_call = 3.e-5  # overhead of a forward and backward FFT call
+_cost_direct = 2.5e-9  # per multiply-add of a direct convolution
+_cost_add = 1.2e-8  # per point of the overlap-add tiling and accumulation
+
+
+def _output_slice(s1, s2, mode):
+    """
+    slice of the full convolution of arrays of shape s1 and s2 returned for mode 'full', 'same' or 'valid'
+
+    :param s1: shape of the image
+    :param s2: shape of the kernel
+    :param mode: 'full', 'same' or 'valid'
+    :return: tuple of slices
+    """
+    s1 = np.array(s1, dtype=int)
+    s2 = np.array(s2, dtype=int)
+    shape = s1 + s2 - 1
+    if mode == "full":
+        out_shape = shape
+    elif mode == "same":
+        out_shape = s1
+    elif mode == "valid":
+        if np.all(s1 >= s2):
+            out_shape = s1 - s2 + 1
+        elif np.all(s2 >= s1):
+            # convolution is commutative, as in scipy.signal.fftconvolve
+            out_shape = s2 - s1 + 1
         else:
-            raise ValueError("Acceptable mode flags are 'valid',"
-                             " 'same', or 'full'.")
+            raise ValueError("For 'valid' mode, one must be at least "
+                             "as large as the other in every dimension")
+    else:
+        raise ValueError("Acceptable mode flags are 'valid',"
+                         " 'same', or 'full'.")
+    start = (shape - out_shape) // 2
+    return tuple([slice(int(st), int(st + n)) for st, n in zip(start, out_shape)])
+
+
+def _convolve_stack(stack, kernel_fft, fshape, out_slice, backend, chunk_size=None):
+    """
+    convolves a stack of images with a kernel spectrum with one multi-dimensional FFT along the image axes per chunk
+
+    :param stack: array of shape (N,) + image shape
+    :param kernel_fft: Fourier transform of the kernel in the padded shape fshape
+    :param fshape: padded shape of the FFT
+    :param out_slice: output slice of the full convolution
+    :param backend: FFTBackend instance
+    :param chunk_size: maximal number of images transformed at once (None for all)
+    :return: array of shape (N,) + output shape
+    """
+    stack = np.asarray(stack, dtype=float)
+    num = len(stack)
+    if chunk_size is None:
+        chunk_size = max(num, 1)
+    axes = tuple(range(-len(fshape), 0))
+    out_shape = tuple([sl.stop - sl.start for sl in out_slice])
+    out = np.empty((num,) + out_shape)
+    for i in range(0, num, chunk_size):
+        stack_fft = backend.rfftn(stack[i:i + chunk_size], fshape, axes=axes)
+        stack_fft *= kernel_fft
+        out[i:i + chunk_size] = backend.irfftn(stack_fft, fshape, axes=axes)[(Ellipsis,) + out_slice]
+    return out
+
+
+def separable_kernel(kernel, rtol=1e-10):
+    """
+    decomposes a 2d kernel into an outer product of two 1d kernels if its rank is one (SVD)
+
+    :param kernel: 2d kernel
+    :param rtol: tolerance of the second singular value relative to the first one
+    :return: (kernel_y, kernel_x) such that kernel = outer(kernel_y, kernel_x) or None if the kernel is not separable
+    """
+    kernel = np.asarray(kernel, dtype=float)
+    if not kernel.ndim == 2 or min(kernel.shape) < 2:
+        return None
+    u, sigma, v = np.linalg.svd(kernel)
+    if sigma[0] == 0 or sigma[1] > rtol * sigma[0]:
+        return None
+    return u[:, 0] * np.sqrt(sigma[0]), v[0] * np.sqrt(sigma[0])
 
 
-    # scipy-0.14.0 compatible
-    def _fftconvolve_14(self, in1, in2, int2_fft, mode="same"):
+def overlap_add_block(kernel_shape):
+    """
+    block shape of the overlap-add tiling such that block + kernel - 1 is a fast FFT length of about 4 times the kernel
+
+    :param kernel_shape: shape of the kernel
+    :return: block shape
+    """
+    return tuple([next_fast_len(max(4 * k, 32)) - k + 1 for k in kernel_shape])
+
+
+def convolution_costs(image_shape, kernel_shape, separable=False):
+    """
+    cost model (in units of seconds on a single core) of the convolution methods 'direct', 'separable',
+    'overlap_add' and 'fft'. Methods which do not apply to the shapes are not listed.
+
+    :param image_shape: shape of the image
+    :param kernel_shape: shape of the kernel
+    :param separable: bool, whether the kernel is separable
+    :return: dictionary of method: cost
+    """
+    image_shape = np.array(image_shape, dtype=int)
+    kernel_shape = np.array(kernel_shape, dtype=int)
+    num_pix = np.prod(image_shape)
+    fshape = np.array([next_fast_len(d) for d in image_shape + kernel_shape - 1])
+    num_fft = np.prod(fshape)
+    costs = {'fft': _cost_fft * 2 * num_fft * np.log2(num_fft) + _cost_fft_call,
+             'direct': _cost_direct * num_pix * np.prod(kernel_shape)}
+    if len(image_shape) == 2:
+        if separable:
+            costs['separable'] = _cost_direct * num_pix * np.sum(kernel_shape)
+        block = np.array(overlap_add_block(kernel_shape))
+        if np.all(image_shape > 2 * block):
+            num_blocks = np.prod(-(-image_shape // block))
+            num_block_fft = np.prod(block + kernel_shape - 1)
+            costs['overlap_add'] = num_blocks * (_cost_fft * 2 * num_block_fft * np.log2(num_block_fft) +
+                                                 _cost_add * num_block_fft) + _cost_fft_call
+    return costs
+
+
+def select_method(image_shape, kernel, mode="same"):
+    """
+    selects the fastest convolution method according to convolution_costs()
+
+    :param image_shape: shape of the image
+    :param kernel: kernel
+    :param mode: 'same', 'full' or 'valid'
+    :return: 'direct', 'separable', 'overlap_add' or 'fft'
+    """
+    kernel_shape = np.shape(kernel)
+    separable = len(kernel_shape) == 2 and separable_kernel(kernel) is not None
+    costs = convolution_costs(image_shape, kernel_shape, separable)
+    return min(costs, key=costs.get)
+
+
+def _convolve_direct(image, kernel, out_slice):
+    """
+    full 2d convolution by shift-and-add of the image for every kernel pixel
+
+    :return: convolved image in out_slice
+    """
+    ny, nx = np.shape(image)
+    ky, kx = np.shape(kernel)
+    ret = np.zeros((ny + ky - 1, nx + kx - 1))
+    for i in range(ky):
+        for j in range(kx):
+            ret[i:i + ny, j:j + nx] += kernel[i, j] * image
+    return ret[out_slice]
+
+
+def _convolve_separable(image, kernel_y, kernel_x, out_slice):
+    """
+    full convolution with a separable kernel outer(kernel_y, kernel_x) as two 1d shift-and-add convolutions
+
+    :return: convolved image in out_slice
+    """
+    ny, nx = np.shape(image)
+    ky, kx = len(kernel_y), len(kernel_x)
+    tmp = np.zeros((ny + ky - 1, nx))
+    for i in range(ky):
+        tmp[i:i + ny] += kernel_y[i] * image
+    ret = np.zeros((ny + ky - 1, nx + kx - 1))
+    for j in range(kx):
+        ret[:, j:j + nx] += kernel_x[j] * tmp
+    return ret[out_slice]
+
+
+def _convolve_overlap_add(image, kernel_fft, kernel_shape, block, fshape, out_slice, backend):
+    """
+    full convolution by overlap-add: the image is cut into blocks which are convolved with a batched FFT of the
+    shape block + kernel - 1 and the overlapping results are added. Requires block >= kernel - 1.
+
+    :param image: 2d image
+    :param kernel_fft: Fourier transform of the kernel in the shape fshape
+    :param kernel_shape: shape of the kernel
+    :param block: block shape
+    :param fshape: FFT shape of a block
+    :param out_slice: output slice of the full convolution
+    :param backend: FFTBackend instance
+    :return: convolved image in out_slice
+    """
+    ny, nx = np.shape(image)
+    ky, kx = kernel_shape
+    by, bx = block
+    ny_b, nx_b = -(-ny // by), -(-nx // bx)
+    padded = np.zeros((ny_b * by, nx_b * bx))
+    padded[:ny, :nx] = image
+    blocks = padded.reshape(ny_b, by, nx_b, bx).transpose(0, 2, 1, 3)
+    blocks_fft = backend.rfftn(blocks, fshape, axes=(-2, -1))
+    blocks_fft *= kernel_fft
+    conv = backend.irfftn(blocks_fft, fshape, axes=(-2, -1))
+    ey, ex = ky - 1, kx - 1
+    out = np.zeros(((ny_b + 1) * by, (nx_b + 1) * bx))
+    out_blocks = out.reshape(ny_b + 1, by, nx_b + 1, bx)
+    out_blocks[:ny_b, :, :nx_b, :] += conv[:, :, :by, :bx].transpose(0, 2, 1, 3)
+    out_blocks[:ny_b, :, 1:, :ex] += conv[:, :, :by, bx:bx + ex].transpose(0, 2, 1, 3)
+    out_blocks[1:, :ey, :nx_b, :] += conv[:, :, by:by + ey, :bx].transpose(0, 2, 1, 3)
+    out_blocks[1:, :ey, 1:, :ex] += conv[:, :, by:by + ey, bx:bx + ex].transpose(0, 2, 1, 3)
+    return out[:ny + ey, :nx + ex][out_slice]
+
+
+class FFTConvolve(object):
+    """
+    fft convolution routines with the Fourier transform of the kernel computed only once (see fftn())
+    """
+    def __init__(self, backend=None, workers=None):
+        """
+
+        :param backend: FFT backend 'numpy', 'scipy', 'pyfftw', None (default) or 'auto' (see get_backend())
+        :param workers: number of threads of the FFT backend
+        """
+        self._backend_name = backend
+        self._workers = workers
+        self._backends = {}
+
+    def _backend(self, fshape):
+        key = tuple(fshape)
+        if key not in self._backends:
+            self._backends[key] = get_backend(self._backend_name, self._workers, fshape)
+        return self._backends[key]
+
+    def fftconvolve(self, in1, in2, int2_fft, mode="same"):
         """
         scipy routine scipy.signal.fftconvolve with kernel already fourier transformed
+
+        :param in1: image
+        :param in2: kernel
+        :param int2_fft: Fourier transform of the kernel as returned by fftn()
+        :param mode: 'same', 'full' or 'valid'
+        :return: convolved image
         """
-        in1 = signaltools.asarray(in1)
-        in2 = signaltools.asarray(in2)
+        in1 = np.asarray(in1)
+        in2 = np.asarray(in2)
 
         if in1.ndim == in2.ndim == 0:  # scalar inputs
             return in1 * in2
         elif not in1.ndim == in2.ndim:
             raise ValueError("in1 and in2 should have the same dimensionality")
         elif in1.size == 0 or in2.size == 0:  # empty arrays
-            return signaltools.array([])
-
-        s1 = signaltools.array(in1.shape)
-        s2 = signaltools.array(in2.shape)
-
-        shape = s1 + s2 - 1
-
-        # Speed up FFT by padding to optimal size for FFTPACK
-        fshape = [signaltools._next_regular(int(d)) for d in shape]
-        fslice = tuple([slice(0, int(sz)) for sz in shape])
-        # Pre-1.9 NumPy FFT routines are not threadsafe.  For older NumPys, make
-        # sure we only call rfftn/irfftn from one thread at a time.
+            return np.array([])
 
-        ret = signaltools.irfftn(signaltools.rfftn(in1, fshape) *
-                    int2_fft, fshape)[fslice].copy()
-        #np.fft.rfftn(in2, fshape)
+        fshape = self._fshape(in1.shape, in2.shape)
+        out_slice = _output_slice(in1.shape, in2.shape, mode)
+        backend = self._backend(fshape)
+        ret = backend.irfftn(backend.rfftn(in1, fshape) * int2_fft, fshape)
+        return ret[out_slice].copy()
 
+    def fftconvolve_stack(self, stack, in2, int2_fft, mode="same", chunk_size=None):
+        """
+        convolves a stack of images with the same kernel in a batched FFT along the image axes
 
-        if mode == "full":
-            return ret
-        elif mode == "same":
-            return signaltools._centered(ret, s1)
-        elif mode == "valid":
-            return signaltools._centered(ret, s1 - s2 + 1)
-        else:
-            raise ValueError("Acceptable mode flags are 'valid',"
-                             " 'same', or 'full'.")
+        :param stack: array of shape (N, ny, nx)
+        :param in2: kernel
+        :param int2_fft: Fourier transform of the kernel as returned by fftn()
+        :param mode: 'same', 'full' or 'valid'
+        :param chunk_size: maximal number of images transformed at once to bound the memory (None for all)
+        :return: array of the N convolved images
+        """
+        stack = np.asarray(stack, dtype=float)
+        s1 = stack.shape[1:]
+        s2 = np.shape(in2)
+        if not len(s1) == len(s2):
+            raise ValueError("images and kernel should have the same dimensionality")
+        fshape = self._fshape(s1, s2)
+        out_slice = _output_slice(s1, s2, mode)
+        return _convolve_stack(stack, int2_fft, fshape, out_slice, self._backend(fshape), chunk_size)
 
-    # scipy-0.18.0 compatible
-    def _fftn_18(self, image, kernel):
+    def fftn(self, image, kernel):
         """
         return the fourier transpose of the kernel in same modes as image
         :param image:
         :param kernel:
         :return:
         """
-        in1 = signaltools.asarray(image)
-        in2 = signaltools.asarray(kernel)
+        in2 = np.asarray(kernel)
+        fshape = self._fshape(np.shape(image), in2.shape)
+        return self._backend(fshape).rfftn(in2, fshape)
 
-        s1 = signaltools.array(in1.shape)
-        s2 = signaltools.array(in2.shape)
+    @staticmethod
+    def _fshape(s1, s2):
+        """
+        padded FFT shape of the convolution of arrays of shapes s1 and s2
+        """
+        return [next_fast_len(d) for d in np.array(s1) + np.array(s2) - 1]
 
-        shape = s1 + s2 - 1
 
-        fshape = [signaltools.fftpack.helper.next_fast_len(int(d)) for d in shape]
-        kernel_fft = np.fft.rfftn(in2, fshape)
-        return kernel_fft
+class PSFConvolver(object):
+    """
+    convolution of images of a fixed shape with a fixed kernel.
+    The method ('fft', 'overlap_add', 'direct' or 'separable'), the padded FFT shape, the kernel spectrum, the output
+    slice and the padded work buffer are computed once when the object is created. The work buffer is re-used between
+    calls, an instance must therefore not be shared between threads.
+    """
+    def __init__(self, image_shape, kernel, mode="same", workers=None, backend=None, method='auto'):
+        """
 
-    # scipy-0.14.0 compatible
-    def _fftn_14(self, image, kernel):
+        :param image_shape: shape of the images to be convolved
+        :param kernel: convolution kernel (same dimensionality as the images)
+        :param mode: 'same', 'full' or 'valid', as in scipy.signal.fftconvolve
+        :param workers: number of threads of the FFT backend
+        :param backend: FFT backend 'numpy', 'scipy', 'pyfftw', None (default) or 'auto' (see get_backend())
+        :param method: 'fft', 'overlap_add', 'direct', 'separable' or 'auto' (see select_method())
         """
-        return the fourier transpose of the kernel in same modes as image
-        :param image:
-        :param kernel:
-        :return:
+        kernel = np.asarray(kernel, dtype=float)
+        s1 = np.array(image_shape, dtype=int)
+        s2 = np.array(kernel.shape, dtype=int)
+        if not len(s1) == len(s2):
+            raise ValueError("image and kernel should have the same dimensionality")
+        self._out_slice = _output_slice(s1, s2, mode)
+        self._full_slice = _output_slice(s1, s2, "full")
+        if method == 'auto':
+            method = select_method(s1, kernel, mode)
+        if method in ['separable', 'overlap_add'] and not len(s1) == 2:
+            raise ValueError("method %s is only supported for 2d images." % method)
+        if method == 'separable':
+            kernels_1d = separable_kernel(kernel)
+            if kernels_1d is None:
+                raise ValueError("the kernel is not separable.")
+            self._kernel_y, self._kernel_x = kernels_1d
+        elif method == 'overlap_add':
+            self._block = overlap_add_block(s2)
+            fshape_block = [b + k - 1 for b, k in zip(self._block, s2)]
+            self._backend = get_backend(backend, workers, fshape_block)
+            self._fshape_block = fshape_block
+            self._kernel_fft_block = self._backend.rfftn(kernel, fshape_block)
+        elif not method in ['fft', 'direct']:
+            raise ValueError("method %s not supported, chose 'fft', 'overlap_add', 'direct', 'separable' or "
+                             "'auto'." % method)
+        self._method = method
+        self._kernel = kernel
+        self._mode = mode
+        self._workers = workers
+        self._backend_name = backend
+        self._fshape = FFTConvolve._fshape(s1, s2)
+        self._axes = tuple(range(-len(s1), 0))
+        self._image_shape = tuple(s1)
+        self._in_slice = tuple([slice(0, int(n)) for n in s1])
+        if method == 'fft':
+            self._init_fft()
+
+    def _init_fft(self):
+        """
+        kernel spectrum and work buffer of the full FFT method
         """
-        in1 = signaltools.asarray(image)
-        in2 = signaltools.asarray(kernel)
+        if not hasattr(self, '_kernel_fft'):
+            self._backend_fft = get_backend(self._backend_name, self._workers, self._fshape)
+            self._kernel_fft = self._backend_fft.rfftn(self._kernel, self._fshape, axes=self._axes)
+            self._buffer = np.zeros(self._fshape)
 
-        s1 = signaltools.array(in1.shape)
-        s2 = signaltools.array(in2.shape)
+    @property
+    def method(self):
+        """
+        convolution method
+        """
+        return self._method
 
-        shape = s1 + s2 - 1
+    @property
+    def kernel_fft(self):
+        """
+        Fourier transform of the kernel in the padded shape of the full FFT
+        """
+        self._init_fft()
+        return self._kernel_fft
 
-        fshape = [signaltools._next_regular(int(d)) for d in shape]
-        kernel_fft = signaltools.rfftn(in2, fshape)
-        return kernel_fft
+    def convolve(self, image):
+        """
+        convolves an image with the kernel
 
-    def fftn(self, image, kernel):
+        :param image: image of shape image_shape
+        :return: convolved image
         """
-        return the fourier transpose of the kernel in same modes as image
-        :param image:
-        :param kernel:
-        :return:
+        if not np.shape(image) == self._image_shape:
+            raise ValueError("image of shape %s does not match the shape %s of the convolver."
+                             % (np.shape(image), self._image_shape))
+        if self._method == 'direct':
+            if len(self._image_shape) == 2:
+                return _convolve_direct(image, self._kernel, self._out_slice)
+            return scipy.signal.convolve(image, self._kernel, mode=self._mode, method='direct')
+        if self._method == 'separable':
+            return _convolve_separable(image, self._kernel_y, self._kernel_x, self._out_slice)
+        if self._method == 'overlap_add':
+            return _convolve_overlap_add(image, self._kernel_fft_block, self._kernel.shape, self._block,
+                                         self._fshape_block, self._out_slice, self._backend)
+        self._buffer[self._in_slice] = image
+        image_fft = self._backend_fft.rfftn(self._buffer, self._fshape, axes=self._axes)
+        image_fft *= self._kernel_fft
+        ret = self._backend_fft.irfftn(image_fft, self._fshape, axes=self._axes)
+        return ret[self._out_slice].copy()
+
+    def convolve_many(self, stack, chunk_size=None):
         """
-        if scipy.__version__ == '0.14.0':
-            return self._fftn_14(image, kernel)
-        else:
-            return self._fftn_18(image, kernel)
\ No newline at end of file
+        convolves a stack of images with the kernel. With the 'fft' method, one batched FFT along the image axes is
+        performed per chunk.
+
+        :param stack: array of shape (N,) + image_shape
+        :param chunk_size: maximal number of images transformed at once to bound the memory (None for all)
+        :return: array of the N convolved images
+        """
+        if not np.shape(stack)[1:] == self._image_shape:
+            raise ValueError("images of shape %s do not match the shape %s of the convolver."
+                             % (np.shape(stack)[1:], self._image_shape))
+        if not self._method == 'fft':
+            return np.array([self.convolve(image) for image in stack])
+        return _convolve_stack(stack, self._kernel_fft, self._fshape, self._out_slice, self._backend_fft, chunk_size)
@@ -0,0 +1,157 @@
+__author__ = 'sibirrer'
+
+import numpy as np
+
+import astrofunc.util as util
+
+
+class LensEquationSolver(object):
+    """
+    solves the lens equation for the image positions of a point source.
+
+    The source-plane displacement is evaluated on a coarse grid and its local minima (util.neighborSelect()) are the
+    candidate images. All the candidates are then refined together, either with Newton steps using the analytic Hessian
+    of the lens model or with successively zoomed subgrids around each candidate. Candidates that do not solve the lens
+    equation to precision_limit in the source plane are discarded and candidates converging to the same image are
+    merged.
+    """
+    def __init__(self, lensModel):
+        """
+
+        :param lensModel: lens model instance with derivatives(x, y, **kwargs) and hessian(x, y, **kwargs)
+        """
+        self.lensModel = lensModel
+
+    def image_position(self, sourcePos_x, sourcePos_y, kwargs, numPix=100, deltapix=0.05, center_x=0, center_y=0,
+                       precision_limit=1e-7, num_iter_max=100, method='newton', min_distance=None):
+        """
+        image positions of a point source
+
+        :param sourcePos_x: x-position of the source
+        :param sourcePos_y: y-position of the source
+        :param kwargs: keyword arguments of the lens model
+        :param numPix: number of pixels per axis of the coarse grid
+        :param deltapix: pixel size of the coarse grid
+        :param center_x: center of the coarse grid in x
+        :param center_y: center of the coarse grid in y
+        :param precision_limit: required precision of the lens equation in the source plane
+        :param num_iter_max: maximal number of refinement steps
+        :param method: 'newton' or 'subgrid'
+        :param min_distance: images closer than min_distance are merged (default: deltapix)
+        :return: x-positions, y-positions of the images
+        """
+        if method not in ['newton', 'subgrid']:
+            raise ValueError("method %s not supported, chose 'newton' or 'subgrid'." % method)
+        x_grid, y_grid = util.make_grid(numPix, deltapix)
+        x_grid += center_x
+        y_grid += center_y
+        f_x, f_y = self.lensModel.derivatives(x_grid, y_grid, **kwargs)
+        absmapped = util.displaceAbs(x_grid - f_x, y_grid - f_y, sourcePos_x, sourcePos_y)
+        x_mins, y_mins, _ = util.neighborSelect(absmapped, x_grid, y_grid)
+        if method == 'newton':
+            x_mins, y_mins = self._newton(x_mins, y_mins, sourcePos_x, sourcePos_y, kwargs, deltapix, precision_limit,
+                                          num_iter_max)
+        else:
+            x_mins, y_mins = self._subgrid(x_mins, y_mins, sourcePos_x, sourcePos_y, kwargs, deltapix,
+                                           precision_limit, num_iter_max)
+        delta = self._residual(x_mins, y_mins, sourcePos_x, sourcePos_y, kwargs)
+        converged = delta < precision_limit
+        if min_distance is None:
+            min_distance = deltapix
+        return self._unique(x_mins[converged], y_mins[converged], delta[converged], min_distance)
+
+    def _newton(self, x, y, sourcePos_x, sourcePos_y, kwargs, deltapix, precision_limit, num_iter_max):
+        """
+        Newton iterations of all the candidates. The steps are limited to deltapix and only the candidates that did not
+        converge yet are evaluated.
+
+        :return: refined x, y
+        """
+        x, y = np.array(x, dtype=float), np.array(y, dtype=float)
+        active = np.arange(len(x))
+        for i in range(num_iter_max):
+            step_x, step_y, delta = self._newton_step(x[active], y[active], sourcePos_x, sourcePos_y, kwargs)
+            not_converged = delta >= precision_limit
+            active, step_x, step_y = active[not_converged], step_x[not_converged], step_y[not_converged]
+            if len(active) == 0:
+                break
+            step = np.sqrt(step_x**2 + step_y**2)
+            scale = np.minimum(1., deltapix / np.maximum(step, 10**(-15)))
+            x[active] += scale * step_x
+            y[active] += scale * step_y
+        return x, y
+
+    def _subgrid(self, x, y, sourcePos_x, sourcePos_y, kwargs, deltapix, precision_limit, num_iter_max, num_sub=9):
+        """
+        moves each candidate to the pixel with the minimal source-plane displacement of a subgrid of num_sub x num_sub
+        pixels spanning the current pixel size around it. The pixel size is reduced by a factor (num_sub - 1) / 2
+        whenever the minimum is inside the subgrid. The subgrids of all the candidates that did not converge yet are
+        evaluated together.
+
+        :return: refined x, y
+        """
+        x, y = np.array(x, dtype=float), np.array(y, dtype=float)
+        x_sub, y_sub = util.make_grid(num_sub, deltapix=2. / (num_sub - 1))
+        inside = (np.abs(x_sub) < 1) & (np.abs(y_sub) < 1)
+        pix = np.ones(len(x)) * deltapix
+        active = np.arange(len(x))
+        for i in range(num_iter_max):
+            if len(active) == 0:
+                break
+            x_ = (x[active, np.newaxis] + x_sub * pix[active, np.newaxis]).ravel()
+            y_ = (y[active, np.newaxis] + y_sub * pix[active, np.newaxis]).ravel()
+            f_x, f_y = self.lensModel.derivatives(x_, y_, **kwargs)
+            absmapped = util.displaceAbs(x_ - f_x, y_ - f_y, sourcePos_x, sourcePos_y).reshape(len(active), -1)
+            index = np.argmin(absmapped, axis=1)
+            x[active] += x_sub[index] * pix[active]
+            y[active] += y_sub[index] * pix[active]
+            pix[active] *= np.where(inside[index], 2. / (num_sub - 1), 1.)
+            delta = absmapped[np.arange(len(active)), index]
+            active = active[(delta >= precision_limit) & (pix[active] >= precision_limit * 10**(-3))]
+        return x, y
+
+    def _newton_step(self, x, y, sourcePos_x, sourcePos_y, kwargs):
+        """
+        Newton step (x, y) -> (x, y) + A^-1 (beta_source - beta(x, y)) with A the Jacobian of the lens equation
+
+        :return: step in x, step in y, source-plane displacement before the step
+        """
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        if len(x) == 0:
+            return np.zeros(0), np.zeros(0), np.zeros(0)
+        f_x, f_y = self.lensModel.derivatives(x, y, **kwargs)
+        f_xx, f_yy, f_xy = self.lensModel.hessian(x, y, **kwargs)
+        delta_x = sourcePos_x - (x - f_x)
+        delta_y = sourcePos_y - (y - f_y)
+        a_11, a_22, a_12 = 1 - f_xx, 1 - f_yy, -f_xy
+        det_A = a_11 * a_22 - a_12**2
+        det_A = np.where(det_A == 0, 10**(-15), det_A)
+        step_x = (a_22 * delta_x - a_12 * delta_y) / det_A
+        step_y = (a_11 * delta_y - a_12 * delta_x) / det_A
+        return step_x, step_y, np.sqrt(delta_x**2 + delta_y**2)
+
+    def _residual(self, x, y, sourcePos_x, sourcePos_y, kwargs):
+        """
+        source-plane displacement of the image positions from the source
+
+        :return: displacement
+        """
+        if len(x) == 0:
+            return np.zeros(0)
+        f_x, f_y = self.lensModel.derivatives(x, y, **kwargs)
+        return util.displaceAbs(x - f_x, y - f_y, sourcePos_x, sourcePos_y)
+
+    @staticmethod
+    def _unique(x, y, precision, min_distance):
+        """
+        merges images closer than min_distance, keeping the most precise one
+
+        :return: x, y of the distinct images
+        """
+        order = np.argsort(precision)
+        x_unique, y_unique = [], []
+        for i in order:
+            if all((x[i] - x_j)**2 + (y[i] - y_j)**2 >= min_distance**2 for x_j, y_j in zip(x_unique, y_unique)):
+                x_unique.append(x[i])
+                y_unique.append(y[i])
+        return np.array(x_unique), np.array(y_unique)
@@ -1,19 +1,27 @@
 from __future__ import print_function, division, absolute_import, unicode_literals
 __author__ = 'sibirrer'
 
+import numpy as np
+
 
 class NumericLens(object):
     """
-    this class computes numerical differentials of lens model quantities
+    this class computes numerical differentials of lens model quantities.
+    All the stencil points of a differential are concatenated, such that the lens model is evaluated only once per
+    call.
     """
-    def __init__(self, lensModel, diff):
+    def __init__(self, lensModel, diff, method='forward'):
         """
 
-        :param lensModel:
-        :param diff:
+        :param lensModel: lens model class instance with function() and derivatives()
+        :param diff: step size of the finite differences
+        :param method: 'forward' (first order) or 'central' (second order) finite differences
         """
+        if method not in ['forward', 'central']:
+            raise ValueError("method %s not supported, chose 'forward' or 'central'." % method)
         self.lensModel = lensModel
         self._diff = diff
+        self._method = method
 
     def kappa(self, x, y, kwargs):
         """
@@ -43,6 +51,19 @@ class NumericLens(object):
         det_A = (1 - f_xx) * (1 - f_yy) - f_xy**2
         return 1/det_A
 
+    def lens_quantities(self, x, y, kwargs):
+        """
+        convergence, shear and magnification from a single numerical Hessian
+
+        :return: kappa, gamma1, gamma2, magnification
+        """
+        f_xx, f_yy, f_xy = self.hessian(x, y, kwargs)
+        kappa = 1./2 * (f_xx + f_yy)
+        gamma1 = 1./2 * (f_yy - f_xx)
+        gamma2 = f_xy
+        det_A = (1 - f_xx) * (1 - f_yy) - f_xy**2
+        return kappa, gamma1, gamma2, 1/det_A
+
     def derivatives(self, x, y, kwargs):
         """
 
@@ -51,31 +72,54 @@ class NumericLens(object):
         :param kwargs:
         :return:
         """
-        f_ = self.lensModel.function(x, y, **kwargs)
-        diff = self._diff
-        f_dx = self.lensModel.function(x + diff, y, **kwargs)
-        f_dy = self.lensModel.function(x, y + diff, **kwargs)
-        f_x = (f_dx - f_)/diff
-        f_y = (f_dy - f_)/diff
-        return f_x, f_y
+        shape = np.shape(x)
+        x_stencil, y_stencil, num = self._stencil(x, y)
+        f_ = self.lensModel.function(x_stencil, y_stencil, **kwargs)
+        f_x, f_y = self._differences(f_, num)
+        return f_x.reshape(shape)[()], f_y.reshape(shape)[()]
 
     def hessian(self, x, y, kwargs):
         """
         computes the differentials f_xx, f_yy, f_xy from f_x and f_y
-        :return: f_xx, f_xy, f_yx, f_yy
+        :return: f_xx, f_yy, f_xy
+        """
+        shape = np.shape(x)
+        x_stencil, y_stencil, num = self._stencil(x, y)
+        alpha_ra, alpha_dec = self.lensModel.derivatives(x_stencil, y_stencil, **kwargs)
+        f_xx, f_xy = self._differences(alpha_ra, num)
+        f_yx, f_yy = self._differences(alpha_dec, num)
+        return f_xx.reshape(shape)[()], f_yy.reshape(shape)[()], f_xy.reshape(shape)[()]
+
+    def _stencil(self, x, y):
+        """
+        concatenates the stencil points of all the coordinates into one array.
+        forward: (x, x + diff, x), (y, y, y + diff)
+        central: (x + diff, x - diff, x, x), (y, y, y + diff, y - diff)
+
+        :return: x_stencil, y_stencil, number of coordinates
+        """
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        diff = self._diff
+        if self._method == 'forward':
+            x_stencil = np.concatenate((x, x + diff, x))
+            y_stencil = np.concatenate((y, y, y + diff))
+        else:
+            x_stencil = np.concatenate((x + diff, x - diff, x, x))
+            y_stencil = np.concatenate((y, y, y + diff, y - diff))
+        return x_stencil, y_stencil, len(x)
+
+    def _differences(self, f_stencil, num):
+        """
+        finite differences of a quantity evaluated at the stencil points
+
+        :param f_stencil: quantity at the points of _stencil()
+        :param num: number of coordinates
+        :return: df/dx, df/dy
         """
-        alpha_ra, alpha_dec = self.lensModel.derivatives(x, y, **kwargs)
         diff = self._diff
-        alpha_ra_dx, alpha_dec_dx = self.lensModel.derivatives(x + diff, y, **kwargs)
-        alpha_ra_dy, alpha_dec_dy = self.lensModel.derivatives(x, y + diff, **kwargs)
-
-        dalpha_rara = (alpha_ra_dx - alpha_ra)/diff
-        dalpha_radec = (alpha_ra_dy - alpha_ra)/diff
-        dalpha_decra = (alpha_dec_dx - alpha_dec)/diff
-        dalpha_decdec = (alpha_dec_dy - alpha_dec)/diff
-
-        f_xx = dalpha_rara
-        f_yy = dalpha_decdec
-        f_xy = dalpha_radec
-        f_yx = dalpha_decra
-        return f_xx, f_yy, f_xy
\ No newline at end of file
+        f_stencil = np.asarray(f_stencil, dtype=float)
+        if self._method == 'forward':
+            f_ = f_stencil[:num]
+            return (f_stencil[num:2*num] - f_)/diff, (f_stencil[2*num:] - f_)/diff
+        return (f_stencil[:num] - f_stencil[num:2*num])/(2*diff), (f_stencil[2*num:3*num] - f_stencil[3*num:])/(2*diff)
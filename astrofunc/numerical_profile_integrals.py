@@ -1,8 +1,9 @@
 import copy
 import scipy.integrate as integrate
 import numpy as np
-import scipy.signal as scp
-import util
+
+import astrofunc.util as util
+from astrofunc.fft_convolve import get_backend, next_fast_len
 
 
 class ProfileIntegrals(object):
@@ -67,6 +68,207 @@ class ProfileIntegrals(object):
         return out[0]
 
 
+def _corner_sum(func, offsets, deltaPix):
+    """
+    integrals of a kernel over the pixels at the given offsets from the corner values of its primitive func,
+    with d^2 func / dx dy = kernel
+
+    :param func: primitive of the kernel func(x, y)
+    :param offsets: pixel offsets (in units of pixels)
+    :param deltaPix: pixel size
+    :return: 2d array of the pixel integrals with offsets[i] along y and offsets[j] along x
+    """
+    edges_0 = (offsets - 0.5) * deltaPix
+    edges_1 = (offsets + 0.5) * deltaPix
+    x_0, y_0 = np.meshgrid(edges_0, edges_0)
+    x_1, y_1 = np.meshgrid(edges_1, edges_1)
+    return func(x_1, y_1) - func(x_0, y_1) - func(x_1, y_0) + func(x_0, y_0)
+
+
+def _primitive_potential(x, y):
+    """
+    primitive of the potential kernel ln(r)
+    """
+    r2 = x**2 + y**2
+    return x * y * np.log(r2) / 2. - 1.5 * x * y + x**2 / 2. * np.arctan(y / x) + y**2 / 2. * np.arctan(x / y)
+
+
+def _primitive_deflection_x(x, y):
+    """
+    primitive of the deflection kernel x/r^2
+    """
+    r2 = x**2 + y**2
+    return y * np.log(r2) / 2. - y + x * np.arctan(y / x)
+
+
+def _primitive_deflection_y(x, y):
+    """
+    primitive of the deflection kernel y/r^2
+    """
+    return _primitive_deflection_x(y, x)
+
+
+def _primitive_shear_1(x, y):
+    """
+    primitive of the shear kernel (y^2 - x^2)/r^4, valid for pixels whose edges do not lie on x = 0
+    """
+    return np.arctan(y / x)
+
+
+def _primitive_shear_2(x, y):
+    """
+    primitive of the shear kernel -2xy/r^4
+    """
+    return np.log(x**2 + y**2) / 2.
+
+
+_kernel_primitives = {'f_': _primitive_potential, 'f_x': _primitive_deflection_x, 'f_y': _primitive_deflection_y,
+                      'gamma1': _primitive_shear_1, 'gamma2': _primitive_shear_2}
+
+# kernel spectra of KappaSolver by (numPix, deltaPix, backend name), cleared when _kernel_spectra_max grids are stored
+_kernel_spectra = {}
+_kernel_spectra_max = 8
+
+
+class KappaSolver(object):
+    """
+    lensing potential, deflection angles and Hessian of a convergence map on a regular grid of numPix x numPix pixels.
+
+    The Green's functions (1/pi ln(r) for the potential, 1/pi x/r^2, 1/pi y/r^2 for the deflections and the
+    Kaiser-Squires shear kernels 1/pi (y^2 - x^2)/r^4, -1/pi 2xy/r^4) are integrated analytically over the pixels, such
+    that the maps are exact for a convergence which is constant within each pixel. The Hessian follows from
+    f_xx = kappa + gamma1, f_yy = kappa - gamma1 and f_xy = gamma2.
+    The convolutions are performed on a domain zero-padded to at least twice the size of the map and are therefore
+    free of periodic wrap-around. The spectra of the kernels are computed once per (numPix, deltaPix) and kept for
+    all instances (for up to 8 grids); each call only requires one forward FFT of the convergence map.
+    """
+    def __init__(self, numPix, deltaPix, workers=None, backend=None):
+        """
+
+        :param numPix: number of pixels per axis of the convergence maps
+        :param deltaPix: pixel size
+        :param workers: number of threads of the FFT backend
+        :param backend: FFT backend, see astrofunc.fft_convolve.get_backend()
+        """
+        self._numPix = int(numPix)
+        self._deltaPix = float(deltaPix)
+        num_pad = next_fast_len(2 * self._numPix - 1)
+        self._fshape = (num_pad, num_pad)
+        self._backend = get_backend(backend, workers, self._fshape)
+
+    def solve(self, kappa, hessian=False):
+        """
+        computes the lensing potential and the deflection angles (and the Hessian) of a convergence map
+
+        :param kappa: convergence map (1d array of the grid or 2d image), or a stack of N images of shape
+         (N, numPix, numPix)
+        :param hessian: bool, if True, also returns f_xx, f_yy and f_xy
+        :return: f_, f_x, f_y (, f_xx, f_yy, f_xy) as 2d images (or stacks of images)
+        """
+        kappa = self._kappa_image(kappa)
+        if hessian is False:
+            return tuple(self._convolve(kappa, ['f_', 'f_x', 'f_y']))
+        f_, f_x, f_y, gamma1, gamma2 = self._convolve(kappa, ['f_', 'f_x', 'f_y', 'gamma1', 'gamma2'])
+        return f_, f_x, f_y, kappa + gamma1, kappa - gamma1, gamma2
+
+    def potential(self, kappa):
+        """
+        lensing potential of a convergence map (up to a constant)
+
+        :param kappa: convergence map
+        :return: potential as 2d image
+        """
+        f_, = self._convolve(self._kappa_image(kappa), ['f_'])
+        return f_
+
+    def deflection(self, kappa):
+        """
+        deflection angles of a convergence map
+
+        :param kappa: convergence map
+        :return: f_x, f_y as 2d images
+        """
+        f_x, f_y = self._convolve(self._kappa_image(kappa), ['f_x', 'f_y'])
+        return f_x, f_y
+
+    def hessian(self, kappa):
+        """
+        Hessian of the lensing potential of a convergence map
+
+        :param kappa: convergence map
+        :return: f_xx, f_yy, f_xy as 2d images
+        """
+        kappa = self._kappa_image(kappa)
+        gamma1, gamma2 = self._convolve(kappa, ['gamma1', 'gamma2'])
+        return kappa + gamma1, kappa - gamma1, gamma2
+
+    def _kappa_image(self, kappa):
+        kappa = np.asarray(kappa, dtype=float)
+        if kappa.ndim == 1:
+            kappa = util.array2image(kappa)
+        if not kappa.shape[-2:] == (self._numPix, self._numPix):
+            raise ValueError("convergence map of shape %s does not match numPix = %s."
+                             % (kappa.shape, self._numPix))
+        return kappa
+
+    def _convolve(self, kappa, names):
+        """
+        convolves the convergence map with the kernels of the requested maps with a single forward FFT of kappa
+
+        :param kappa: 2d image or stack of images
+        :param names: list of 'f_', 'f_x', 'f_y', 'gamma1', 'gamma2'
+        :return: list of maps
+        """
+        axes = (-2, -1)
+        kappa_fft = self._backend.rfftn(kappa, self._fshape, axes=axes)
+        out = []
+        for name in names:
+            f = self._backend.irfftn(kappa_fft * self._kernel_fft(name), self._fshape, axes=axes)
+            out.append(f[..., :self._numPix, :self._numPix] / np.pi)
+        return out
+
+    def _kernel_fft(self, name):
+        """
+        spectrum of the pixel integrated kernel in wrap-around order on the padded domain
+
+        :param name: 'f_', 'f_x', 'f_y', 'gamma1' or 'gamma2'
+        :return: complex array
+        """
+        key = (self._numPix, self._deltaPix, self._backend.name)
+        if key not in _kernel_spectra:
+            if len(_kernel_spectra) >= _kernel_spectra_max:
+                _kernel_spectra.clear()
+            _kernel_spectra[key] = {}
+        spectra = _kernel_spectra[key]
+        if name not in spectra:
+            spectra[name] = self._backend.rfftn(self._kernel(name), self._fshape)
+        return spectra[name]
+
+    def _kernel(self, name):
+        """
+        kernel integrated over the pixels at offsets -(numPix-1)...(numPix-1) stored in wrap-around order on the
+        padded domain
+
+        :param name: 'f_', 'f_x', 'f_y', 'gamma1' or 'gamma2'
+        :return: 2d array of the padded shape
+        """
+        num_pad = self._fshape[0]
+        index = np.arange(num_pad)
+        offsets = np.where(index < self._numPix, index, index - num_pad)
+        used = np.abs(offsets) < self._numPix
+        with np.errstate(divide='ignore', invalid='ignore'):
+            kernel_used = _corner_sum(_kernel_primitives[name], offsets[used], self._deltaPix)
+        kernel = np.zeros(self._fshape)
+        kernel[np.ix_(used, used)] = kernel_used
+        if name == 'f_':
+            # the primitive is continuous through the origin, the central pixel is evaluated on its four quadrants
+            kernel[0, 0] = 4 * _primitive_potential(self._deltaPix / 2., self._deltaPix / 2.)
+        else:
+            # the (principal value) integral of the kernel over the central pixel vanishes by symmetry
+            kernel[0, 0] = 0
+        return kernel
+
+
 class ConvergenceIntegrals(object):
     """
     class to compute lensing potentials and deflection angles provided a convergence map
@@ -74,59 +276,63 @@ class ConvergenceIntegrals(object):
     def potential_from_kappa(self, kappa, x_grid, y_grid, deltaPix):
         """
 
-        :param kappa:
-        :param x_coords:
-        :param y_coords:
-        :return:
+        :param kappa: convergence on the grid
+        :param x_grid: x-coordinates of the regular grid
+        :param y_grid: y-coordinates of the regular grid
+        :param deltaPix: pixel size
+        :return: potential as 2d image (up to a constant)
         """
-        kernel = self._potential_kernel(x_grid, y_grid)
-        f_ = scp.fftconvolve(kernel, util.array2image(kappa), mode='same') / np.pi * deltaPix**2
-        return f_
+        return self._solver(x_grid, deltaPix).potential(kappa)
 
     def deflection_from_kappa(self, kappa, x_grid, y_grid, deltaPix):
         """
 
-        :param kappa:
-        :param x_grid:
-        :param y_grid:
-        :param deltaPix:
-        :return:
+        :param kappa: convergence on the grid
+        :param x_grid: x-coordinates of the regular grid
+        :param y_grid: y-coordinates of the regular grid
+        :param deltaPix: pixel size
+        :return: f_x, f_y as 2d images
         """
-        kernel_x, kernel_y = self._deflection_kernel(x_grid, y_grid)
-        f_x = scp.fftconvolve(kernel_x, util.array2image(kappa), mode='same') / np.pi * deltaPix**2
-        f_y = scp.fftconvolve(kernel_y, util.array2image(kappa), mode='same') / np.pi * deltaPix ** 2
-        return f_x, f_y
+        return self._solver(x_grid, deltaPix).deflection(kappa)
 
-    def _potential_kernel(self, x_grid, y_grid):
+    def hessian_from_kappa(self, kappa, x_grid, y_grid, deltaPix):
         """
 
-        :param numPix:
-        :param deltaPix:
-        :return:
+        :param kappa: convergence on the grid
+        :param x_grid: x-coordinates of the regular grid
+        :param y_grid: y-coordinates of the regular grid
+        :param deltaPix: pixel size
+        :return: f_xx, f_yy, f_xy as 2d images
         """
-        x_mean = np.mean(x_grid)
-        y_mean = np.mean(y_grid)
-        r2 = (x_grid - x_mean)**2 + (y_grid - y_mean)**2
-        r2_max = np.max(r2)
-        lnr = np.log(r2/r2_max) / 2.
-        lnr[r2 == 0] = 0
-        kernel = util.array2image(lnr)
-        return kernel
+        return self._solver(x_grid, deltaPix).hessian(kappa)
 
-    def _deflection_kernel(self, x_grid, y_grid):
+    def interpolation_maps(self, kappa, x_grid, y_grid, deltaPix):
         """
+        all the maps required by Interpol_func.do_interp() from a single FFT of the convergence map, such that
+        interp_func.do_interp(*maps) sets up the interpolation of the numerical lens model
 
-        :param numPix:
-        :param deltaPix:
-        :return:
+        :param kappa: convergence on the grid
+        :param x_grid: x-coordinates of the regular grid
+        :param y_grid: y-coordinates of the regular grid
+        :param deltaPix: pixel size
+        :return: x_axes, y_axes, f_, f_x, f_y, f_xx, f_yy, f_xy
+        """
+        x_axes, y_axes = util.get_axes(x_grid, y_grid)
+        maps = self._solver(x_grid, deltaPix).solve(kappa, hessian=True)
+        return (x_axes, y_axes) + tuple(maps)
+
+    def _solver(self, x_grid, deltaPix):
         """
-        x_mean = np.mean(x_grid)
-        y_mean = np.mean(y_grid)
-        r2 = (x_grid - x_mean)**2 + (y_grid - y_mean)**2
-        l0 = np.where(r2 == 0)
+        KappaSolver of the grid, the kernel spectra are cached per (numPix, deltaPix)
 
-        kernel_x = util.array2image(x_grid / r2)
-        kernel_y = util.array2image(y_grid / r2)
-        kernel_x[l0] = 0
-        kernel_y[l0] = 0
-        return kernel_x, kernel_y
+        :param x_grid: x-coordinates of a regular square grid of numPix x numPix pixels
+        :param deltaPix: pixel size
+        :return: KappaSolver
+        """
+        numPix = int(round(np.sqrt(np.size(x_grid))))
+        if numPix**2 != np.size(x_grid):
+            raise ValueError("grid of %s pixels is not a square grid of numPix x numPix pixels." % np.size(x_grid))
+        if not hasattr(self, '_kappa_solver') or not self._kappa_solver_key == (numPix, deltaPix):
+            self._kappa_solver = KappaSolver(numPix, deltaPix)
+            self._kappa_solver_key = (numPix, deltaPix)
+        return self._kappa_solver
@@ -7,6 +7,7 @@ this file contains standard routines
 from collections import namedtuple
 import numpy as np
 import scipy.ndimage.interpolation as interp
+import scipy.ndimage
 import scipy
 from numpy import linspace, meshgrid
 import copy
@@ -194,7 +195,7 @@ def averaging(grid, numGrid, numPix):
 
     Nbig = numGrid
     Nsmall = numPix
-    small = grid.reshape([Nsmall, Nbig/Nsmall, Nsmall, Nbig/Nsmall]).mean(3).mean(1)
+    small = grid.reshape([Nsmall, Nbig//Nsmall, Nsmall, Nbig//Nsmall]).mean(3).mean(1)
     return small
 
 
@@ -677,34 +678,55 @@ def azimuthalAverage(image, center=None):
              fracitonal pixels).
 
     """
-    # Calculate the indices from the image
-    y, x = np.indices(image.shape)
+    return AzimuthalBinner(np.shape(image), center).average(image)
 
-    if not center:
-        center = np.array([(x.max()-x.min())/2.0, (x.max()-x.min())/2.0])
 
-    r = np.hypot(x - center[0], y - center[1])
-
-    # Get sorted radii
-    ind = np.argsort(r.flat)
-    r_sorted = r.flat[ind]
-    i_sorted = image.flat[ind]
-
-    # Get the integer part of the radii (bin size = 1)
-    r_int = r_sorted.astype(int)
-
-    # Find all pixels that fall within each radial bin.
-    deltar = r_int[1:] - r_int[:-1]  # Assumes all radii represented
-    rind = np.where(deltar)[0]       # location of changed radius
-    nr = rind[1:] - rind[:-1]        # number of radius bin
-
-    # Cumulative sum to figure out sums for each radius bin
-    csim = np.cumsum(i_sorted, dtype=float)
-    tbin = csim[rind[1:]] - csim[rind[:-1]]
+class AzimuthalBinner(object):
+    """
+    azimuthal averages of images of a given shape in radial bins of one pixel.
+    The integer radial index of each pixel and the number of pixels per bin are computed once, such that each average
+    (also of a stack of images) is a single np.bincount.
+    """
+    def __init__(self, shape, center=None):
+        """
 
-    radial_prof = tbin / nr
+        :param shape: shape (ny, nx) of the images
+        :param center: the [x,y] pixel coordinates used as the center. The default is None, which then uses the center
+        [(nx-1)/2., (ny-1)/2.] of the image (including fractional pixels).
+        """
+        self._shape = tuple(shape)
+        ny, nx = self._shape
+        y, x = np.indices(self._shape)
+        if center is None:
+            center = np.array([(nx-1)/2., (ny-1)/2.])
+        r = np.hypot(x - center[0], y - center[1])
+        self._r_int = r.astype(int).ravel()
+        self._counts = np.bincount(self._r_int)
+        self._num_bins = len(self._counts)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    def average(self, image):
+        """
+        azimuthally averaged radial profile. As for the former sorting-based implementation, the innermost and the
+        outermost radial bins are not returned.
 
-    return radial_prof
+        :param image: 2d image of the shape of the binner or a stack of images of shape (..., ny, nx)
+        :return: radial profile of the bins 1, ..., r_max - 1 (with the leading dimensions of a stack)
+        """
+        image = np.asarray(image, dtype=float)
+        if image.shape[-2:] != self._shape:
+            raise ValueError("image shape %s does not match the shape %s of the binner." % (image.shape, self._shape))
+        stack_shape = image.shape[:-2]
+        images = image.reshape(-1, len(self._r_int))
+        num_images = len(images)
+        # one bincount over all images, with the bins of image k offset by k * num_bins
+        r_int = self._r_int + self._num_bins * np.arange(num_images)[:, np.newaxis]
+        tbin = np.bincount(r_int.ravel(), weights=images.ravel(), minlength=num_images * self._num_bins)
+        radial_prof = tbin.reshape(num_images, self._num_bins) / np.maximum(self._counts, 1)
+        return radial_prof[:, 1:-1].reshape(stack_shape + (self._num_bins - 2,))
 
 
 def selectBest(array, criteria, numSelect, highest=True):
@@ -840,71 +862,97 @@ def points_on_circle(radius, points):
     return x_coord, y_coord
 
 
-def neighborSelect(a, x, y):
+def neighbor_footprint():
     """
-    finds (local) minima in a 2d grid
+    footprint of the 24 neighboring pixels compared in neighborSelect(): the 8 adjacent pixels and the pixels at
+    offsets (+-1, +-2), (+-2, +-1), (+-1, +-3) and (+-3, +-1)
+
+    :return: boolean 2d array of shape (7, 7) (the central pixel is excluded)
+    """
+    footprint = np.zeros((7, 7), dtype=bool)
+    footprint[2:5, 2:5] = True
+    for i, j in [(1, 2), (2, 1), (1, 3), (3, 1)]:
+        for sign_i in [-1, 1]:
+            for sign_j in [-1, 1]:
+                footprint[3 + sign_i * i, 3 + sign_j * j] = True
+    footprint[3, 3] = False
+    return footprint
+
+
+def neighborSelect(a, x, y, nx=0, ny=0, footprint=None):
+    """
+    finds (local) minima in a 2d grid. A pixel is a local minimum if its value is strictly smaller than all the values
+    in the footprint around it. Pixels on the boundary of the grid are not selected and neighbors outside the grid are
+    ignored.
 
     :param a: 1d array of displacements from the source positions
     :type a: numpy array with length numPix**2 in float
+    :param x: x-coordinates of a
+    :param y: y-coordinates of a
+    :param nx: number of pixels along the first axis of the 2d grid (default: square grid)
+    :param ny: number of pixels along the second axis of the 2d grid
+    :param footprint: boolean 2d array of the compared neighbors (default: neighbor_footprint())
     :returns:  array of indices of local minima, values of those minima
     :raises: AttributeError, KeyError
     """
-    dim = int(np.sqrt(len(a)))
-    values = []
-    x_mins = []
-    y_mins = []
-    for i in range(dim+1,len(a)-dim-1):
-        if (a[i] < a[i-1]
-            and a[i] < a[i+1]
-            and a[i] < a[i-dim]
-            and a[i] < a[i+dim]
-            and a[i] < a[i-(dim-1)]
-            and a[i] < a[i-(dim+1)]
-            and a[i] < a[i+(dim-1)]
-            and a[i] < a[i+(dim+1)]):
-                if(a[i] < a[(i-2*dim-1)%dim**2]
-                    and a[i] < a[(i-2*dim+1)%dim**2]
-                    and a[i] < a[(i-dim-2)%dim**2]
-                    and a[i] < a[(i-dim+2)%dim**2]
-                    and a[i] < a[(i+dim-2)%dim**2]
-                    and a[i] < a[(i+dim+2)%dim**2]
-                    and a[i] < a[(i+2*dim-1)%dim**2]
-                    and a[i] < a[(i+2*dim+1)%dim**2]):
-                    if(a[i] < a[(i-3*dim-1)%dim**2]
-                        and a[i] < a[(i-3*dim+1)%dim**2]
-                        and a[i] < a[(i-dim-3)%dim**2]
-                        and a[i] < a[(i-dim+3)%dim**2]
-                        and a[i] < a[(i+dim-3)%dim**2]
-                        and a[i] < a[(i+dim+3)%dim**2]
-                        and a[i] < a[(i+3*dim-1)%dim**2]
-                        and a[i] < a[(i+3*dim+1)%dim**2]):
-                        x_mins.append(x[i])
-                        y_mins.append(y[i])
-                        values.append(a[i])
-    return np.array(x_mins), np.array(y_mins), np.array(values)
+    if footprint is None:
+        footprint = neighbor_footprint()
+    footprint = np.array(footprint, dtype=bool)
+    footprint[tuple(np.array(footprint.shape) // 2)] = False
+    image = array2image(np.asarray(a, dtype=float), nx, ny)
+    neighbor_min = scipy.ndimage.minimum_filter(image, footprint=footprint, mode='constant', cval=np.inf)
+    is_min = image < neighbor_min
+    is_min[[0, -1], :] = False
+    is_min[:, [0, -1]] = False
+    index = np.flatnonzero(is_min)
+    return np.asarray(x)[index], np.asarray(y)[index], np.asarray(a)[index]
 
 
 def half_light_radius(lens_light, x_grid, y_grid, center_x=0, center_y=0):
     """
+    radius enclosing half of the (positive) flux. The enclosed flux is evaluated at the radii i/500 * r_max
+    (i < 1000) from a single radial histogram of the pixels and the half-light radius is linearly interpolated between
+    these radii.
 
     :param lens_light: array of surface brightness
     :param x_grid: x-axis coordinates
     :param y_gird: y-axis coordinates
     :param center_x: center of light
     :param center_y: center of light
-    :return:
+    :return: half-light radius, -1 if not enclosed within 2 * r_max
     """
-    lens_light[lens_light < 0] = 0
+    lens_light = np.maximum(lens_light, 0)
     total_flux_2 = np.sum(lens_light)/2.
-    lens_light_img = array2image(lens_light)
     r_max = np.max(np.sqrt(x_grid**2 + y_grid**2))
-    for i in range(1000):
-        r = i/500. * r_max
-        mask = 1. - get_mask(center_x, center_y, r, x_grid, y_grid)
-        flux_enclosed = np.sum(np.array(lens_light_img)*mask)
-        if flux_enclosed > total_flux_2:
-            return r
-    return -1
+    r = np.arange(1000)/500. * r_max
+    flux_enclosed = np.cumsum(_radial_histogram(lens_light, x_grid, y_grid, center_x, center_y, r))
+    i = np.searchsorted(flux_enclosed, total_flux_2, side='right')
+    if i >= len(flux_enclosed):
+        return -1
+    if i == 0:
+        return 0.
+    return r[i-1] + (total_flux_2 - flux_enclosed[i-1])/(flux_enclosed[i] - flux_enclosed[i-1]) * (r[i] - r[i-1])
+
+
+def _radial_histogram(light, x_grid, y_grid, center_x, center_y, r_edges):
+    """
+    flux in radial bins around the center: bin 0 contains the pixels with R <= r_edges[0] and bin i the pixels with
+    r_edges[i-1] < R <= r_edges[i], as the masks of get_mask(). Pixels with R > r_edges[-1] are ignored.
+
+    :param light: array of surface brightness
+    :param x_grid: x-axis coordinates
+    :param y_grid: y-axis coordinates
+    :param center_x: center of light
+    :param center_y: center of light
+    :param r_edges: increasing outer radii of the bins
+    :return: array of len(r_edges) fluxes
+    """
+    x_shift = x_grid - center_x
+    y_shift = y_grid - center_y
+    R = np.sqrt(x_shift*x_shift + y_shift*y_shift)
+    index = np.searchsorted(r_edges, R, side='left')
+    inside = index < len(r_edges)
+    return np.bincount(index[inside], weights=np.asarray(light, dtype=float)[inside], minlength=len(r_edges))
 
 
 def fwhm_kernel(kernel):
@@ -929,6 +977,8 @@ def fwhm_kernel(kernel):
 
 def radial_profile(light_grid, x_grid, y_grid, center_x=0, center_y=0, n=None):
     """
+    flux in the n annuli between the radii r = [1, ..., n]/n * r_max (the first one includes the center), computed
+    from a single radial histogram of the pixels
 
     :param light_grid: array of surface brightness
     :param x_grid: x-axis coordinates
@@ -936,20 +986,13 @@ def radial_profile(light_grid, x_grid, y_grid, center_x=0, center_y=0, n=None):
     :param center_x: center of light
     :param center_y: center of light
     :param n: number of discrete steps
-    :return:
+    :return: flux in annuli, outer radii of the annuli
     """
-    light_img = array2image(light_grid)
     r_max = np.max(np.sqrt(x_grid**2 + y_grid**2))
     if n is None:
         n = int(np.sqrt(len(x_grid)))
-    I_r = np.zeros(n)
-    I_enclosed = 0
     r = np.linspace(1./n*r_max, r_max, n)
-    for i, r_i in enumerate(r):
-        mask = 1. - get_mask(center_x, center_y, r_i, x_grid, y_grid)
-        flux_enclosed = np.sum(np.array(light_img)*mask)
-        I_r[i] = flux_enclosed - I_enclosed
-        I_enclosed = flux_enclosed
+    I_r = _radial_histogram(light_grid, x_grid, y_grid, center_x, center_y, r)
     return I_r, r
 
 
@@ -1020,21 +1063,113 @@ def make_subgrid(ra_coord, dec_coord, subgrid_res=2):
     ra_array = array2image(ra_coord)
     dec_array = array2image(dec_coord)
     n = len(ra_array)
+    d_ra_x, d_ra_y, d_dec_x, d_dec_y = _pixel_steps(ra_array, dec_array)
+    offset = _subpixel_offsets(subgrid_res)
+    # axes (pixel row, subpixel row, pixel column, subpixel column)
+    ra_array_new = ra_array[:, np.newaxis, :, np.newaxis] + d_ra_x * offset[np.newaxis, np.newaxis, np.newaxis, :] + \
+        d_ra_y * offset[np.newaxis, :, np.newaxis, np.newaxis]
+    dec_array_new = dec_array[:, np.newaxis, :, np.newaxis] + d_dec_x * offset[np.newaxis, np.newaxis, np.newaxis, :] + \
+        d_dec_y * offset[np.newaxis, :, np.newaxis, np.newaxis]
+    ra_coords_sub = ra_array_new.reshape(n*subgrid_res * n*subgrid_res)
+    dec_coords_sub = dec_array_new.reshape(n*subgrid_res * n*subgrid_res)
+    return ra_coords_sub, dec_coords_sub
+
+
+def _pixel_steps(ra_array, dec_array):
+    """
+    coordinate steps along the columns (x) and rows (y) of 2d coordinate arrays
+
+    :return: d_ra_x, d_ra_y, d_dec_x, d_dec_y
+    """
     d_ra_x = ra_array[0][1] - ra_array[0][0]
     d_ra_y = ra_array[1][0] - ra_array[0][0]
     d_dec_x = dec_array[0][1] - dec_array[0][0]
     d_dec_y = dec_array[1][0] - dec_array[0][0]
+    return d_ra_x, d_ra_y, d_dec_x, d_dec_y
 
-    ra_array_new = np.zeros((n*subgrid_res, n*subgrid_res))
-    dec_array_new = np.zeros((n*subgrid_res, n*subgrid_res))
-    for i in range(0, subgrid_res):
-        for j in range(0, subgrid_res):
-            ra_array_new[i::subgrid_res, j::subgrid_res] = ra_array + d_ra_x * (-1/2. + 1/(2.*subgrid_res) + j/float(subgrid_res)) + d_ra_y * (-1/2. + 1/(2.*subgrid_res) + i/float(subgrid_res))
-            dec_array_new[i::subgrid_res, j::subgrid_res] = dec_array + d_dec_x * (-1/2. + 1/(2.*subgrid_res) + j/float(subgrid_res)) + d_dec_y * (-1/2. + 1/(2.*subgrid_res) + i/float(subgrid_res))
 
-    ra_coords_sub = image2array(ra_array_new)
-    dec_coords_sub = image2array(dec_array_new)
-    return ra_coords_sub, dec_coords_sub
+def _subpixel_offsets(subgrid_res):
+    """
+    centers of the subpixels in units of the pixel size relative to the pixel center
+
+    :param subgrid_res: number of subpixels per axis
+    :return: array of subgrid_res offsets
+    """
+    return -1/2. + 1/(2.*subgrid_res) + np.arange(subgrid_res)/float(subgrid_res)
+
+
+def make_adaptive_subgrid(ra_coord, dec_coord, supersampled, subgrid_res=2):
+    """
+    coordinates of a regular grid with the pixels flagged in supersampled replaced by subgrid_res x subgrid_res
+    subpixels (e.g. in the high-gradient region around a lens center, see mask_sphere()). Only the flagged pixels are
+    supersampled, such that the number of coordinates is npix + (subgrid_res**2 - 1) * number of flagged pixels.
+
+    :param ra_coord: 1d ra coordinates of a square grid
+    :param dec_coord: 1d dec coordinates of a square grid
+    :param supersampled: boolean (or 0/1) array of the pixels to be supersampled
+    :param subgrid_res: number of subpixels per axis of the supersampled pixels
+    :return: ra, dec: the pixels that are not supersampled followed by the subpixels of each supersampled pixel in
+    blocks of subgrid_res**2 (see adaptive_averaging())
+    """
+    supersampled = np.asarray(supersampled, dtype=bool)
+    d_ra_x, d_ra_y, d_dec_x, d_dec_y = _pixel_steps(array2image(ra_coord), array2image(dec_coord))
+    offset = _subpixel_offsets(subgrid_res)
+    ra_sub = ra_coord[supersampled][:, np.newaxis, np.newaxis] + d_ra_x * offset[np.newaxis, np.newaxis, :] + \
+        d_ra_y * offset[np.newaxis, :, np.newaxis]
+    dec_sub = dec_coord[supersampled][:, np.newaxis, np.newaxis] + d_dec_x * offset[np.newaxis, np.newaxis, :] + \
+        d_dec_y * offset[np.newaxis, :, np.newaxis]
+    ra = np.concatenate((ra_coord[~supersampled], ra_sub.ravel()))
+    dec = np.concatenate((dec_coord[~supersampled], dec_sub.ravel()))
+    return ra, dec
+
+
+def adaptive_averaging(values, supersampled, subgrid_res=2):
+    """
+    pixel values from the values evaluated on the coordinates of make_adaptive_subgrid(): the supersampled pixels are
+    the average over their subpixels
+
+    :param values: values at the coordinates of make_adaptive_subgrid()
+    :param supersampled: boolean (or 0/1) array of the supersampled pixels
+    :param subgrid_res: number of subpixels per axis of the supersampled pixels
+    :return: 1d array of pixel values
+    """
+    supersampled = np.asarray(supersampled, dtype=bool)
+    num_regular = len(supersampled) - np.sum(supersampled)
+    pixel_values = np.empty(len(supersampled))
+    pixel_values[~supersampled] = values[:num_regular]
+    pixel_values[supersampled] = np.mean(values[num_regular:].reshape(-1, subgrid_res**2), axis=1)
+    return pixel_values
+
+
+_grid_cache = {}
+
+
+def cached_grid(numPix, deltapix, subgrid_res=1, left_lower=False, Mpix2coord=None):
+    """
+    coordinate grid of make_grid() (or of make_grid_transformed() for a pixel-to-coordinate matrix Mpix2coord) that is
+    computed once per set of arguments. The cached arrays are returned without copy and are read-only.
+
+    :param numPix: number of pixels per axis
+    :param deltapix: pixel size (ignored if Mpix2coord is given)
+    :param subgrid_res: sub-pixel resolution
+    :param left_lower: see make_grid()
+    :param Mpix2coord: None or 2x2 matrix mapping a pixel to a coordinate
+    :return: x, y position information in two read-only 1d arrays
+    """
+    transform = None if Mpix2coord is None else tuple(np.asarray(Mpix2coord, dtype=float).ravel())
+    key = (numPix, deltapix, subgrid_res, left_lower, transform)
+    if key not in _grid_cache:
+        if len(_grid_cache) >= 32:
+            _grid_cache.clear()
+        if Mpix2coord is None:
+            x_grid, y_grid = make_grid(numPix, deltapix, subgrid_res, left_lower)
+        else:
+            x_grid, y_grid = make_grid(numPix, 1, subgrid_res, left_lower)
+            x_grid, y_grid = map_coord2pix(x_grid, y_grid, 0, 0, np.asarray(Mpix2coord, dtype=float))
+        x_grid.flags.writeable = False
+        y_grid.flags.writeable = False
+        _grid_cache[key] = (x_grid, y_grid)
+    return _grid_cache[key]
 
 
 def re_size_grid(grid, numPix):
@@ -0,0 +1,112 @@
+__author__ = 'sibirrer'
+
+import os
+import shutil
+import tempfile
+
+from astrofunc.LensingProfiles.barkana_integrals import BarkanaIntegrals
+from astrofunc.LensingProfiles.spemd_own import SPEMD
+
+import numpy as np
+import pytest
+import numpy.testing as npt
+
+
+class TestBarkanaIntegrals(object):
+    """
+    tests the tabulated integrals against the numerical integration
+    """
+    def setup(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.barkana = BarkanaIntegrals(cache_dir=self.cache_dir)
+        self.nu1 = np.array([0.01, 0.05, 0.001, 0.01, 0.5])
+        self.nu2 = np.array([0.1, 1., 3.3, 50., 2000.])
+        self.s_ = np.array([-20., -0.5, 0.8, 10., 100.])
+
+    def teardown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_integrals(self):
+        for gamma in [0.2, 0.45, 0.6, 0.75]:
+            npt.assert_allclose(self.barkana.I1(self.nu1, self.nu2, self.s_, gamma),
+                                self.barkana.I1_numeric(self.nu1, self.nu2, self.s_, gamma), rtol=2e-6)
+            npt.assert_allclose(self.barkana.I2(self.nu1, self.nu2, self.s_, gamma),
+                                self.barkana.I2_numeric(self.nu1, self.nu2, self.s_, gamma), rtol=2e-6)
+            npt.assert_allclose(self.barkana.I3(self.nu2, self.s_, gamma),
+                                self.barkana.I3_numeric(self.nu2, self.s_, gamma), rtol=2e-5)
+            npt.assert_allclose(self.barkana.I4(self.nu2, self.s_, gamma),
+                                self.barkana.I4_numeric(self.nu2, self.s_, gamma), rtol=2e-5)
+
+    def test_numeric_singularity(self):
+        # int_0^nu nu'^(-gamma) dnu' with f = 1 for s_ -> -infinity is nu^(1-gamma) / (1-gamma)
+        nu1 = np.array([1e-10, 1e-6])
+        nu2 = np.array([0.5, 2.])
+        gamma = 0.85
+        I1 = self.barkana._numeric_integral(lambda nu, s_: 1., nu1, nu2, np.zeros(2), gamma)
+        npt.assert_allclose(I1, (nu2**(1 - gamma) - nu1**(1 - gamma)) / (1 - gamma), rtol=1e-10)
+
+    def test_outside_table(self):
+        nu2 = np.array([1., 1e5])
+        s_ = np.array([0.3, 2000.])
+        I3 = self.barkana.I3(nu2, s_, 0.5)
+        npt.assert_allclose(I3, self.barkana.I3_numeric(nu2, s_, 0.5), rtol=1e-4)
+        I3 = self.barkana.I3(nu2, s_, 0.95)
+        npt.assert_almost_equal(I3, self.barkana.I3_numeric(nu2, s_, 0.95), decimal=10)
+
+    def test_cache(self):
+        self.barkana.I4(self.nu2, self.s_, 0.5)
+        file_name = os.path.join(self.cache_dir, BarkanaIntegrals._table_file % BarkanaIntegrals._table_version)
+        assert os.path.isfile(file_name)
+        barkana = BarkanaIntegrals(cache_dir=self.cache_dir)
+        npt.assert_almost_equal(barkana._table(), self.barkana._table(), decimal=12)
+        assert os.listdir(self.cache_dir) == [os.path.basename(file_name)]
+
+    def test_corrupt_cache(self):
+        file_name = os.path.join(self.cache_dir, BarkanaIntegrals._table_file % BarkanaIntegrals._table_version)
+        with open(file_name, 'wb') as f:
+            f.write(b'not a npz file')
+        tables = self.barkana._table()
+        assert tables.shape == (4, BarkanaIntegrals._num_b, BarkanaIntegrals._num_a, BarkanaIntegrals._num_gam)
+        barkana = BarkanaIntegrals(cache_dir=self.cache_dir)
+        npt.assert_almost_equal(barkana._load_table(file_name), tables, decimal=12)
+
+        np.savez(file_name, tables=tables[:, :2], grid_params=barkana._table_params())
+        assert barkana._load_table(file_name) is None
+
+
+class TestSPEMD(object):
+    """
+    tests the SPEMD with tabulated integrals against the numerical integration
+    """
+    def setup(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.spemd = SPEMD(cache_dir=self.cache_dir)
+        self.spemd_numeric = SPEMD(interpolate=False)
+
+    def teardown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_derivatives(self):
+        x = np.array([1., 0.3, -1.2, 2.])
+        y = np.array([2., -0.4, 0.5, 0.1])
+        for gamma in [1.9, 2., 2.5]:
+            kwargs = {'theta_E': 1., 'gamma': gamma, 'q': 0.8, 'phi_G': 0.3}
+            f_x, f_y = self.spemd.derivatives(x, y, **kwargs)
+            f_x_num, f_y_num = self.spemd_numeric.derivatives(x, y, **kwargs)
+            alpha = np.sqrt(f_x_num**2 + f_y_num**2)
+            npt.assert_array_less(np.sqrt((f_x - f_x_num)**2 + (f_y - f_y_num)**2), 1e-6 * alpha)
+
+    def test_hessian(self):
+        x = np.array([1., 0.3, -1.2, 2.])
+        y = np.array([2., -0.4, 0.5, 0.1])
+        for gamma in [1.9, 2., 2.5]:
+            kwargs = {'theta_E': 1., 'gamma': gamma, 'q': 0.8, 'phi_G': 0.3}
+            f_xx, f_yy, f_xy = self.spemd.hessian(x, y, **kwargs)
+            f_xx_num, f_yy_num, f_xy_num = self.spemd_numeric.hessian(x, y, **kwargs)
+            kappa = (f_xx_num + f_yy_num) / 2.
+            for value, value_num in [(f_xx, f_xx_num), (f_yy, f_yy_num), (f_xy, f_xy_num)]:
+                npt.assert_array_less(np.abs(value - value_num), 2e-4 * kappa)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -1,8 +1,12 @@
-from astrofunc.numerical_profile_integrals import ConvergenceIntegrals
+from astrofunc.numerical_profile_integrals import ConvergenceIntegrals, KappaSolver
+import astrofunc.numerical_profile_integrals as numerical_profile_integrals
 import astrofunc.util as util
 from astrofunc.LensingProfiles.sis import SIS
+from astrofunc.LensingProfiles.gaussian_kappa import GaussianKappa
+from astrofunc.LensingProfiles.interpol import Interpol_func
 import numpy as np
 import numpy.testing as npt
+import pytest
 
 
 class TestMassAngleConversion(object):
@@ -47,5 +51,84 @@ class TestMassAngleConversion(object):
         # test relative potential at two different point way inside the kappa map
         npt.assert_almost_equal(f_x[x1, y1], f_x_num[x1, y1], decimal=1)
 
+    def test_raise(self):
+        x_grid, y_grid = util.make_grid(numPix=10, deltapix=0.1)
+        with pytest.raises(ValueError):
+            self.integral.deflection_from_kappa(np.ones(90), x_grid[:90], y_grid[:90], 0.1)
+
+
+class TestKappaSolver(object):
+    """
+    tests the potential, deflection and Hessian of a Gaussian convergence, including the edges of the map
+    """
+    def setup(self):
+        self.gaussian = GaussianKappa()
+        self.kwargs = {'amp': 1., 'sigma_x': 0.5, 'sigma_y': 0.5, 'center_x': 0.1, 'center_y': -0.2}
+        self.numPix = 100
+        self.deltaPix = 0.05
+        self.x_grid, self.y_grid = util.make_grid(numPix=self.numPix, deltapix=self.deltaPix)
+        f_xx, f_yy, f_xy = self.gaussian.hessian(self.x_grid, self.y_grid, **self.kwargs)
+        self.kappa = (f_xx + f_yy) / 2.
+        self.solver = KappaSolver(self.numPix, self.deltaPix)
+
+    def test_solve(self):
+        f_, f_x, f_y, f_xx, f_yy, f_xy = self.solver.solve(self.kappa, hessian=True)
+        f_true = util.array2image(self.gaussian.function(self.x_grid, self.y_grid, **self.kwargs))
+        f_x_true, f_y_true = self.gaussian.derivatives(self.x_grid, self.y_grid, **self.kwargs)
+        f_xx_true, f_yy_true, f_xy_true = self.gaussian.hessian(self.x_grid, self.y_grid, **self.kwargs)
+        npt.assert_almost_equal(f_x, util.array2image(f_x_true), decimal=3)
+        npt.assert_almost_equal(f_y, util.array2image(f_y_true), decimal=3)
+        npt.assert_almost_equal(f_ - f_[0, 0], f_true - f_true[0, 0], decimal=3)
+        npt.assert_almost_equal(f_xx, util.array2image(f_xx_true), decimal=3)
+        npt.assert_almost_equal(f_yy, util.array2image(f_yy_true), decimal=3)
+        npt.assert_almost_equal(f_xy, util.array2image(f_xy_true), decimal=3)
+        npt.assert_almost_equal((f_xx + f_yy) / 2., util.array2image(self.kappa), decimal=12)
+
+        f_x_2, f_y_2 = self.solver.deflection(util.array2image(self.kappa))
+        npt.assert_almost_equal(f_x_2, f_x, decimal=12)
+        npt.assert_almost_equal(self.solver.potential(self.kappa), f_, decimal=12)
+        f_xx_2, f_yy_2, f_xy_2 = self.solver.hessian(self.kappa)
+        npt.assert_almost_equal(f_xy_2, f_xy, decimal=12)
+
+    def test_interpolation_maps(self):
+        integral = ConvergenceIntegrals()
+        maps = integral.interpolation_maps(self.kappa, self.x_grid, self.y_grid, self.deltaPix)
+        interp_func = Interpol_func(grid=False)
+        interp_func.do_interp(*maps)
+        x = np.array([0.3, -1.2, 2.])
+        y = np.array([-0.5, 0.4, 1.1])
+        f_xx, f_yy, f_xy = interp_func.hessian(x, y)
+        f_xx_true, f_yy_true, f_xy_true = self.gaussian.hessian(x, y, **self.kwargs)
+        npt.assert_almost_equal(f_xx, f_xx_true, decimal=2)
+        npt.assert_almost_equal(f_xy, f_xy_true, decimal=2)
+        f_x, f_y = interp_func.derivatives(x, y)
+        f_x_true, f_y_true = self.gaussian.derivatives(x, y, **self.kwargs)
+        npt.assert_almost_equal(f_x, f_x_true, decimal=3)
+        npt.assert_almost_equal(f_y, f_y_true, decimal=3)
+
+    def test_stack(self):
+        kappa = util.array2image(self.kappa)
+        stack = np.array([kappa, 2 * kappa, kappa[::-1]])
+        f_, f_x, f_y = self.solver.solve(stack)
+        for i in range(3):
+            f_i, f_x_i, f_y_i = self.solver.solve(stack[i])
+            npt.assert_almost_equal(f_x[i], f_x_i, decimal=12)
+            npt.assert_almost_equal(f_y[i], f_y_i, decimal=12)
+            npt.assert_almost_equal(f_[i], f_i, decimal=12)
+
+    def test_cache(self):
+        kernel_fft = self.solver._kernel_fft('f_x')
+        solver = KappaSolver(self.numPix, self.deltaPix, backend=self.solver._backend)
+        assert solver._kernel_fft('f_x') is kernel_fft
+        assert (self.numPix, self.deltaPix, self.solver._backend.name) in numerical_profile_integrals._kernel_spectra
+        for numPix in range(4, 6 + numerical_profile_integrals._kernel_spectra_max):
+            KappaSolver(numPix, self.deltaPix)._kernel_fft('f_x')
+            assert len(numerical_profile_integrals._kernel_spectra) <= numerical_profile_integrals._kernel_spectra_max
+
+    def test_raise(self):
+        with pytest.raises(ValueError):
+            self.solver.solve(np.ones((10, 10)))
+
+
 if __name__ == '__main__':
     pytest.main()
\ No newline at end of file
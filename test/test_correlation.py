@@ -18,6 +18,16 @@ class TestCorrelation(object):
         psd1D, psd2D = self.correlation.correlation_2D(residuals)
         assert psd1D[0] == 99
 
+    def test_binner_cache(self):
+        residuals = np.random.normal(0, 1, (16, 16))
+        psd1D, psd2D = self.correlation.correlation_2D(residuals)
+        binner = self.correlation._binner
+        psd1D_2, psd2D_2 = self.correlation.correlation_2D(residuals)
+        assert self.correlation._binner is binner
+        np.testing.assert_almost_equal(psd1D_2, psd1D, decimal=12)
+        psd1D_3, psd2D_3 = self.correlation.correlation_2D(np.ones((11, 11)))
+        assert self.correlation._binner.shape == (11, 11)
+
 
 if __name__ == '__main__':
     pytest.main()
\ No newline at end of file
@@ -0,0 +1,164 @@
+__author__ = 'sibirrer'
+
+from astrofunc.fft_convolve import PSFConvolver, FFTConvolve
+import astrofunc.fft_convolve as fft_convolve
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+import scipy.signal
+import scipy.fft
+import timeit
+
+
+class TestPSFConvolver(object):
+
+    def setup(self):
+        np.random.seed(seed=41)
+        self.image = np.random.randn(40, 31)
+        self.kernel = np.random.rand(7, 9)
+
+    def test_convolve(self):
+        for mode in ['same', 'full', 'valid']:
+            convolver = PSFConvolver(self.image.shape, self.kernel, mode=mode, workers=2)
+            image_conv = convolver.convolve(self.image)
+            image_conv_true = scipy.signal.fftconvolve(self.image, self.kernel, mode=mode)
+            npt.assert_almost_equal(image_conv, image_conv_true, decimal=10)
+            image_conv = convolver.convolve(2 * self.image)
+            npt.assert_almost_equal(image_conv, 2 * image_conv_true, decimal=10)
+
+    def test_convolve_many(self):
+        stack = np.random.randn(5, 40, 31)
+        convolver = PSFConvolver(self.image.shape, self.kernel)
+        stack_conv = convolver.convolve_many(stack)
+        stack_conv_chunk = convolver.convolve_many(stack, chunk_size=2)
+        assert stack_conv.shape == (5, 40, 31)
+        for i in range(5):
+            npt.assert_almost_equal(stack_conv[i], scipy.signal.fftconvolve(stack[i], self.kernel, mode='same'),
+                                    decimal=10)
+            npt.assert_almost_equal(stack_conv_chunk[i], stack_conv[i], decimal=12)
+
+    def test_raise(self):
+        convolver = PSFConvolver(self.image.shape, self.kernel)
+        with pytest.raises(ValueError):
+            convolver.convolve(np.ones((10, 10)))
+        with pytest.raises(ValueError):
+            PSFConvolver(self.image.shape, self.kernel, mode='other')
+        with pytest.raises(ValueError):
+            PSFConvolver((10, 5), self.kernel, mode='valid')
+        with pytest.raises(ValueError):
+            PSFConvolver(self.image.shape, self.kernel, method='other')
+        with pytest.raises(ValueError):
+            PSFConvolver(self.image.shape, self.kernel, method='separable')
+
+    def test_methods(self):
+        x = np.linspace(-3, 3, 7)
+        kernel_sep = np.outer(np.exp(-x ** 2 / 2.), np.exp(-x[1:-1] ** 2 / 3.))
+        image = np.random.randn(83, 71)
+        for method in ['fft', 'overlap_add', 'direct', 'separable']:
+            for kernel in [kernel_sep, self.kernel]:
+                if method == 'separable' and kernel is self.kernel:
+                    continue
+                for mode in ['same', 'full', 'valid']:
+                    convolver = PSFConvolver(image.shape, kernel, mode=mode, method=method)
+                    assert convolver.method == method
+                    image_conv = convolver.convolve(image)
+                    npt.assert_almost_equal(image_conv, scipy.signal.fftconvolve(image, kernel, mode=mode),
+                                            decimal=10)
+        stack = np.random.randn(3, 83, 71)
+        convolver = PSFConvolver(image.shape, kernel_sep, method='separable')
+        stack_conv = convolver.convolve_many(stack)
+        for i in range(3):
+            npt.assert_almost_equal(stack_conv[i], scipy.signal.fftconvolve(stack[i], kernel_sep, mode='same'),
+                                    decimal=10)
+
+    def test_select_method(self):
+        x = np.linspace(-2, 2, 5)
+        kernel_sep = np.outer(np.exp(-x ** 2), np.exp(-x ** 2))
+        assert fft_convolve.separable_kernel(kernel_sep) is not None
+        assert fft_convolve.separable_kernel(self.kernel) is None
+        kernel_y, kernel_x = fft_convolve.separable_kernel(kernel_sep)
+        npt.assert_almost_equal(np.outer(kernel_y, kernel_x), kernel_sep, decimal=12)
+        for num_pix in [16, 64, 512]:
+            for kernel in [kernel_sep, self.kernel, np.random.rand(41, 41)]:
+                method = fft_convolve.select_method((num_pix, num_pix), kernel)
+                assert method in fft_convolve.convolution_costs((num_pix, num_pix), kernel.shape,
+                                                                separable=kernel is kernel_sep)
+        assert fft_convolve.select_method((16, 16), kernel_sep) == 'separable'
+        assert fft_convolve.select_method((512, 512), np.random.rand(41, 41)) in ['fft', 'overlap_add']
+
+    def test_benchmark_methods(self):
+        """
+        times the convolution methods on typical cutout sizes and checks that the method chosen by select_method is
+        within a factor of 3 of the fastest one. Run with 'pytest -s' to see the timings.
+        """
+        for kernel_size in [5, 11, 21]:
+            x = np.linspace(-3, 3, kernel_size)
+            kernel = np.outer(np.exp(-x ** 2 / 2.), np.exp(-x ** 2 / 2.))
+            for num_pix in [32, 64, 128, 256]:
+                image = np.random.randn(num_pix, num_pix)
+                times = {}
+                for method in ['fft', 'overlap_add', 'direct', 'separable']:
+                    if method == 'overlap_add' and num_pix <= 2 * fft_convolve.overlap_add_block(kernel.shape)[0]:
+                        continue
+                    convolver = PSFConvolver(image.shape, kernel, method=method)
+                    times[method] = min(timeit.repeat(lambda: convolver.convolve(image), number=3, repeat=5))
+                fastest = min(times, key=times.get)
+                selected = fft_convolve.select_method(image.shape, kernel)
+                print("image %s kernel %s: fastest %s, selected %s, %s" % (num_pix, kernel_size, fastest, selected,
+                                                                         times))
+                assert times[selected] < 3 * times[fastest]
+
+
+class TestFFTConvolve(object):
+
+    def setup(self):
+        np.random.seed(seed=41)
+        self.fft_convolve = FFTConvolve()
+        self.stack = np.random.randn(4, 30, 21)
+        self.kernel = np.random.rand(5, 5)
+
+    def test_fftconvolve(self):
+        image = self.stack[0]
+        for backend in fft_convolve.available_backends() + ['auto']:
+            fft_convolve_backend = FFTConvolve(backend=backend, workers=2)
+            kernel_fft = fft_convolve_backend.fftn(image, self.kernel)
+            for mode in ['same', 'full', 'valid']:
+                image_conv = fft_convolve_backend.fftconvolve(image, self.kernel, kernel_fft, mode=mode)
+                npt.assert_almost_equal(image_conv, scipy.signal.fftconvolve(image, self.kernel, mode=mode),
+                                        decimal=10)
+
+    def test_fftconvolve_stack(self):
+        kernel_fft = self.fft_convolve.fftn(self.stack[0], self.kernel)
+        for mode in ['same', 'full', 'valid']:
+            stack_conv = self.fft_convolve.fftconvolve_stack(self.stack, self.kernel, kernel_fft, mode=mode,
+                                                             chunk_size=3)
+            for i in range(4):
+                npt.assert_almost_equal(stack_conv[i], scipy.signal.fftconvolve(self.stack[i], self.kernel, mode=mode),
+                                        decimal=10)
+
+
+class TestBackends(object):
+
+    def test_next_fast_len(self):
+        for n in range(1, 2000):
+            assert fft_convolve.next_fast_len(n) == scipy.fft.next_fast_len(n, True)
+
+    def test_get_backend(self):
+        assert fft_convolve.default_backend() == 'scipy'
+        assert fft_convolve.get_backend().name == 'scipy'
+        assert FFTConvolve()._backend((64, 64)).name == 'scipy'
+        x = np.linspace(-3, 3, 7)
+        kernel = np.outer(np.exp(-x ** 2 / 2.), np.exp(-x ** 2 / 2.))
+        assert PSFConvolver((64, 64), kernel, method='fft')._backend_fft.name == 'scipy'
+        backend = fft_convolve.get_backend('auto', shape=(64, 64))
+        assert backend.name in fft_convolve.available_backends()
+        assert fft_convolve.get_backend(backend) is backend
+        times = fft_convolve.benchmark_backends((32, 32), num_repeat=1)
+        assert 'numpy' in times
+        with pytest.raises(ValueError):
+            fft_convolve.get_backend('other')
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -2,10 +2,12 @@ __author__ = 'sibirrer'
 
 from astrofunc.LensingProfiles.gaussian import Gaussian
 from astrofunc.LensingProfiles.gaussian_kappa import GaussianKappa
+from astrofunc.LensingProfiles.multi_gaussian_kappa import MultiGaussian_kappa
 
 import numpy as np
 import numpy.testing as npt
 import pytest
+import scipy.integrate as integrate
 
 class TestGaussian(object):
     """
@@ -110,7 +112,7 @@ class TestGaussianKappa(object):
         kappa = 1./2 * (f_xx + f_yy)
         amp_3d = self.gaussian_kappa._amp2d_to_3d(amp, sigma_x, sigma_y)
         density_2d = self.gaussian_kappa.density_2d(x, y, amp_3d, sigma_x, sigma_y, center_x, center_y)
-        print kappa, density_2d
+        print(kappa, density_2d)
         npt.assert_almost_equal(kappa[1], density_2d[1], decimal=5)
         npt.assert_almost_equal(kappa[2], density_2d[2], decimal=5)
 
@@ -125,8 +127,72 @@ class TestGaussianKappa(object):
         amp_3d = self.gaussian_kappa._amp2d_to_3d(amp, sigma_x, sigma_y)
         density_2d_gauss = self.gaussian_kappa.density_2d(x, y, amp_3d, sigma_x, sigma_y, center_x, center_y)
         density_2d = self.gaussian.function(x, y, amp, sigma_x, sigma_y, center_x, center_y)
-        print density_2d_gauss, density_2d
+        print(density_2d_gauss, density_2d)
         npt.assert_almost_equal(density_2d_gauss[1], density_2d[1], decimal=5)
 
+    def test_num_integral(self):
+        r = np.array([0., 0.001, 0.05, 0.5, 1., 3., 10., 50.])
+        for c in [0.1, 1., 5.]:
+            values = self.gaussian_kappa._num_integral(r, c)
+            for i in range(len(r)):
+                integral = integrate.quad(lambda x: (1 - np.exp(-c * x**2)) / x, 0, r[i], epsabs=1e-13, epsrel=1e-13)[0]
+                npt.assert_almost_equal(values[i], integral, decimal=10)
+            value = self.gaussian_kappa._num_integral(r[4], c)
+            npt.assert_almost_equal(value, values[4], decimal=12)
+
+    def test_function(self):
+        x = np.array([0, 1, 2])
+        y = np.array([0, 2, 1])
+        values = self.gaussian_kappa.function(x, y, amp=2., sigma_x=1.5, sigma_y=1.5)
+        value = self.gaussian_kappa.function(1, 2, amp=2., sigma_x=1.5, sigma_y=1.5)
+        assert values[0] == 0
+        npt.assert_almost_equal(values[1], value, decimal=12)
+        npt.assert_almost_equal(values[2], value, decimal=12)
+
+
+class TestMultiGaussianKappa(object):
+    """
+    test the summed Gaussian convergence profiles against the individual components
+    """
+    def setup(self):
+        self.multi = MultiGaussian_kappa()
+        self.gaussian_kappa = GaussianKappa()
+        self.amp = np.array([0.5, 1., 2., 0.3])
+        self.sigma = np.array([0.1, 0.5, 1., 4.])
+
+    def test_function(self):
+        x = np.linspace(-3, 3, 20).reshape(4, 5)
+        y = np.linspace(2, -1, 20).reshape(4, 5)
+        f_ = self.multi.function(x, y, self.amp, self.sigma, center_x=0.2, center_y=-0.1)
+        f_true = np.zeros_like(x)
+        for amp, sigma in zip(self.amp, self.sigma):
+            f_true += self.gaussian_kappa.function(x, y, amp, sigma, sigma, center_x=0.2, center_y=-0.1)
+        npt.assert_almost_equal(f_, f_true, decimal=10)
+        assert np.shape(f_) == (4, 5)
+
+    def test_derivatives(self):
+        x = np.array([1., -2., 0.3])
+        y = np.array([0.5, 1., -0.4])
+        f_x, f_y = self.multi.derivatives(x, y, self.amp, self.sigma)
+        f_x_true, f_y_true = np.zeros_like(x), np.zeros_like(x)
+        for amp, sigma in zip(self.amp, self.sigma):
+            f_x_i, f_y_i = self.gaussian_kappa.derivatives(x, y, amp, sigma, sigma)
+            f_x_true += f_x_i
+            f_y_true += f_y_i
+        npt.assert_almost_equal(f_x, f_x_true, decimal=10)
+        npt.assert_almost_equal(f_y, f_y_true, decimal=10)
+
+    def test_hessian(self):
+        f_xx, f_yy, f_xy = self.multi.hessian(1., 2., self.amp, self.sigma)
+        f_xx_true, f_yy_true, f_xy_true = 0, 0, 0
+        for amp, sigma in zip(self.amp, self.sigma):
+            f_xx_i, f_yy_i, f_xy_i = self.gaussian_kappa.hessian(1., 2., amp, sigma, sigma)
+            f_xx_true += f_xx_i
+            f_yy_true += f_yy_i
+            f_xy_true += f_xy_i
+        npt.assert_almost_equal(f_xx, f_xx_true, decimal=10)
+        npt.assert_almost_equal(f_yy, f_yy_true, decimal=10)
+        npt.assert_almost_equal(f_xy, f_xy_true, decimal=10)
+
 if __name__ == '__main__':
     pytest.main()
\ No newline at end of file
@@ -1,10 +1,12 @@
 __author__ = 'sibirrer'
 import pytest
 import numpy as np
+import numpy.testing as npt
+import scipy.interpolate
 
 import astrofunc.util as util
 from astrofunc.LensingProfiles.sis import SIS
-from astrofunc.LensingProfiles.interpol import Interpol_func
+from astrofunc.LensingProfiles.interpol import Interpol_func, Interpol_func_scaled, Interpol_stacked
 
 class TestInterpol(object):
 
@@ -80,6 +82,106 @@ class TestInterpol(object):
         alpha_x, alpha_y = interp_func.derivatives(x, y, **kwargs_interp)
         assert alpha_x == 0.31622776601683794
 
+    def test_scattered(self):
+        numPix = 51
+        deltaPix = 0.1
+        x_grid_interp, y_grid_interp = util.make_grid(numPix, deltaPix)
+        sis = SIS()
+        kwargs_SIS = {'theta_E': 1., 'center_x': 0.5, 'center_y': -0.5}
+        f_sis = sis.function(x_grid_interp, y_grid_interp, **kwargs_SIS)
+        f_x_sis, f_y_sis = sis.derivatives(x_grid_interp, y_grid_interp, **kwargs_SIS)
+        f_xx_sis, f_yy_sis, f_xy_sis = sis.hessian(x_grid_interp, y_grid_interp, **kwargs_SIS)
+        x_axes, y_axes = util.get_axes(x_grid_interp, y_grid_interp)
+        interp_func = Interpol_func(grid=False)
+        interp_func.do_interp(x_axes, y_axes, util.array2image(f_sis), util.array2image(f_x_sis), util.array2image(f_y_sis), util.array2image(f_xx_sis), util.array2image(f_yy_sis), util.array2image(f_xy_sis))
+        x = np.array([0.03, -1.27, 2.2, 3., -4., 0.5])
+        y = np.array([0.11, 0.8, -2.33, 0.2, -3.1, -0.5])
+        f_ = interp_func.function(x, y)
+        f_x, f_y = interp_func.derivatives(x, y)
+        f_xx, f_yy, f_xy = interp_func.hessian(x, y)
+        for value, f_map in zip([f_, f_x, f_y, f_xx, f_yy, f_xy], [f_sis, f_x_sis, f_y_sis, f_xx_sis, f_yy_sis, f_xy_sis]):
+            spline = scipy.interpolate.RectBivariateSpline(x_axes, y_axes, util.array2image(f_map), kx=1, ky=1, s=0)
+            npt.assert_almost_equal(value, spline(y, x, grid=False), decimal=12)
+        values = interp_func.all_maps(x, y)
+        for value, value_true in zip(values, [f_, f_x, f_y, f_xx, f_yy, f_xy]):
+            npt.assert_almost_equal(value, value_true, decimal=12)
+
+    def test_update_maps(self):
+        x_axes = np.linspace(-1, 1, 11)
+        x_grid, y_grid = np.meshgrid(x_axes, x_axes)
+        f_x = util.array2image(x_grid.flatten() + 2 * y_grid.flatten())
+        f_y = util.array2image(x_grid.flatten() * y_grid.flatten())
+        interp_func = Interpol_func_scaled(grid=False)
+        kwargs_interp = {'grid_interp_x': x_axes, 'grid_interp_y': x_axes, 'f_x': f_x, 'f_y': f_y}
+        alpha_x, alpha_y = interp_func.derivatives(np.array([0.5]), np.array([0.25]), scale_factor=2, **kwargs_interp)
+        npt.assert_almost_equal(alpha_x, 2 * (0.5 + 2 * 0.25), decimal=10)
+        kwargs_interp['f_x'] = 2 * f_x
+        alpha_x, alpha_y = interp_func.derivatives(np.array([0.5]), np.array([0.25]), scale_factor=2, **kwargs_interp)
+        npt.assert_almost_equal(alpha_x, 4 * (0.5 + 2 * 0.25), decimal=10)
+        interp_func.update_maps(x_axes, x_axes, f_x=f_y, f_y=f_x)
+        alpha_x, alpha_y = interp_func.derivatives(np.array([0.5]), np.array([0.25]), scale_factor=1)
+        npt.assert_almost_equal(alpha_y, 0.5 + 2 * 0.25, decimal=10)
+
+    def test_mixed_subsets(self):
+        x_axes = np.linspace(-1, 1, 11)
+        x_grid, y_grid = np.meshgrid(x_axes, x_axes)
+        f_ = util.array2image(x_grid.flatten()**2 + y_grid.flatten())
+        f_x = util.array2image(2 * x_grid.flatten())
+        f_y = util.array2image(np.ones(len(x_axes)**2))
+        interp_func = Interpol_func(grid=False)
+        x, y = np.array([0.5, -0.3]), np.array([0.25, 0.7])
+        alpha_x, alpha_y = interp_func.derivatives(x, y, x_axes, x_axes, f_x=f_x, f_y=f_y)
+        f = interp_func.function(x, y, x_axes, x_axes, f_=f_)
+        npt.assert_almost_equal(f, interp_func.function(x, y), decimal=12)
+        alpha_x_new, alpha_y_new = interp_func.derivatives(x, y)
+        npt.assert_almost_equal(alpha_x_new, alpha_x, decimal=12)
+        npt.assert_almost_equal(alpha_y_new, alpha_y, decimal=12)
+        npt.assert_almost_equal(alpha_x, 2 * x, decimal=12)
+
+        # equal maps passed as new arrays do not rebuild the stack
+        maps = interp_func._interpolator._maps
+        interp_func.derivatives(x, y, x_axes, x_axes, f_x=f_x.copy(), f_y=f_y.copy())
+        assert interp_func._interpolator._maps is maps
+        alpha_x_new, _ = interp_func.derivatives(x, y, x_axes, x_axes, f_x=2 * f_x, f_y=f_y)
+        npt.assert_almost_equal(alpha_x_new, 4 * x, decimal=12)
+        npt.assert_almost_equal(interp_func.function(x, y), f, decimal=12)
+
+
+class TestInterpolStacked(object):
+
+    def setup(self):
+        self.grid_0 = np.linspace(-1, 2, 16)
+        self.grid_1 = np.linspace(0, 1, 11) ** 2
+        u_0, u_1 = np.meshgrid(self.grid_0, self.grid_1, indexing='ij')
+        self.maps = {'a': u_0**3 - 2 * u_0 * u_1**2, 'b': u_1 + 3 * u_0, 'c': np.sin(u_0) * u_1}
+
+    def test_bicubic(self):
+        interp = Interpol_stacked(self.grid_0, self.grid_1, order=3, **self.maps)
+        u_0 = np.array([-0.93, 0.1, 1.96, 0.5])
+        u_1 = np.array([0.03, 0.51, 0.99, 0.2])
+        a, b = interp.interpolate(u_0, u_1, ['a', 'b'])
+        npt.assert_almost_equal(a, u_0**3 - 2 * u_0 * u_1**2, decimal=10)
+        npt.assert_almost_equal(b, u_1 + 3 * u_0, decimal=10)
+
+    def test_grid(self):
+        for order in [1, 3]:
+            interp = Interpol_stacked(self.grid_0, self.grid_1, order=order, **self.maps)
+            axes_0 = np.linspace(-1.5, 2.5, 7)
+            axes_1 = np.linspace(-0.1, 1.1, 5)
+            images = interp.interpolate_grid(axes_0, axes_1, ['c', 'a'])
+            u_0, u_1 = np.meshgrid(axes_0, axes_1, indexing='ij')
+            values = interp.interpolate(u_0, u_1, ['c', 'a'])
+            npt.assert_almost_equal(images[0], values[0], decimal=12)
+            npt.assert_almost_equal(images[1], values[1], decimal=12)
+            assert np.shape(images[0]) == (7, 5)
+
+    def test_raise(self):
+        interp = Interpol_stacked(self.grid_0, self.grid_1, **self.maps)
+        with pytest.raises(ValueError):
+            interp.interpolate(0, 0, ['d'])
+        with pytest.raises(ValueError):
+            Interpol_stacked(self.grid_0, self.grid_1, order=2, **self.maps)
+
 
 if __name__ == '__main__':
     pytest.main("-k TestSourceModel")
\ No newline at end of file
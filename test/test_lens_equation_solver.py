@@ -0,0 +1,86 @@
+__author__ = 'sibirrer'
+
+from astrofunc.lens_equation_solver import LensEquationSolver
+from astrofunc.LensingProfiles.sis import SIS
+from astrofunc.LensingProfiles.spep import SPEP
+from astrofunc.LensingProfiles.external_shear import ExternalShear
+from astrofunc.LensingProfiles.multi_component import MultiComponentLens
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+
+class CountingModel(object):
+    """
+    lens model counting the number of evaluated coordinates
+    """
+    def __init__(self, lensModel):
+        self.lensModel = lensModel
+        self.num_eval = 0
+
+    def derivatives(self, x, y, **kwargs):
+        self.num_eval += np.size(x)
+        return self.lensModel.derivatives(x, y, **kwargs)
+
+    def hessian(self, x, y, **kwargs):
+        self.num_eval += np.size(x)
+        return self.lensModel.hessian(x, y, **kwargs)
+
+
+class TestLensEquationSolver(object):
+
+    def setup(self):
+        self.sourcePos_x, self.sourcePos_y = 0.03, 0.02
+
+    def _check_images(self, lensModel, kwargs, x, y, precision):
+        f_x, f_y = lensModel.derivatives(x, y, **kwargs)
+        npt.assert_almost_equal(x - f_x, self.sourcePos_x, decimal=precision)
+        npt.assert_almost_equal(y - f_y, self.sourcePos_y, decimal=precision)
+
+    def test_sis(self):
+        sis = SIS()
+        kwargs = {'theta_E': 1.}
+        solver = LensEquationSolver(sis)
+        beta = np.sqrt(self.sourcePos_x**2 + self.sourcePos_y**2)
+        for method in ['newton', 'subgrid']:
+            x, y = solver.image_position(self.sourcePos_x, self.sourcePos_y, kwargs, method=method)
+            assert len(x) == 2
+            r = np.sort(np.sqrt(x**2 + y**2))
+            npt.assert_almost_equal(r, [1 - beta, 1 + beta], decimal=6)
+            self._check_images(sis, kwargs, x, y, precision=7)
+
+    def test_quad(self):
+        for lensModel, kwargs in [(SPEP(), {'theta_E': 1., 'gamma': 2., 'q': 0.8, 'phi_G': 0.3}),
+                                  (MultiComponentLens(), {'component_list': [
+                                      (SIS(), {'theta_E': 1., 'center_x': 0, 'center_y': 0}),
+                                      (ExternalShear(), {'e1': 0.05, 'e2': -0.03})]})]:
+            solver = LensEquationSolver(lensModel)
+            x, y = solver.image_position(self.sourcePos_x, self.sourcePos_y, kwargs, method='newton')
+            x_sub, y_sub = solver.image_position(self.sourcePos_x, self.sourcePos_y, kwargs, method='subgrid')
+            assert len(x) == 4
+            assert len(x_sub) == 4
+            self._check_images(lensModel, kwargs, x, y, precision=7)
+            self._check_images(lensModel, kwargs, x_sub, y_sub, precision=7)
+            npt.assert_almost_equal(np.sort(x_sub), np.sort(x), decimal=5)
+            npt.assert_almost_equal(np.sort(y_sub), np.sort(y), decimal=5)
+
+    def test_num_evaluations(self):
+        lensModel = CountingModel(SPEP())
+        kwargs = {'theta_E': 1., 'gamma': 2., 'q': 0.8, 'phi_G': 0.3}
+        solver = LensEquationSolver(lensModel)
+        x, y = solver.image_position(self.sourcePos_x, self.sourcePos_y, kwargs, numPix=100, deltapix=0.05,
+                                     precision_limit=1e-10)
+        assert len(x) == 4
+        self._check_images(SPEP(), kwargs, x, y, precision=10)
+        # a uniform grid of 5 arcsec at the equivalent precision needs orders of magnitude more evaluations
+        assert lensModel.num_eval < 2 * 100**2
+
+    def test_raise(self):
+        solver = LensEquationSolver(SIS())
+        with pytest.raises(ValueError):
+            solver.image_position(0, 0, {'theta_E': 1.}, method='no_method')
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,76 @@
+__author__ = 'sibirrer'
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from astrofunc.LensingProfiles.multi_component import MultiComponentLens
+from astrofunc.LensingProfiles.nfw import NFW
+from astrofunc.LensingProfiles.sis import SIS
+from astrofunc.LensingProfiles.spep import SPEP
+from astrofunc.LensingProfiles.gaussian_kappa import GaussianKappa
+from astrofunc.LensingProfiles.external_shear import ExternalShear
+
+
+class TestMultiComponentLens(object):
+    """
+    tests the summed evaluation of several lens profiles
+    """
+    def setup(self):
+        self.multi = MultiComponentLens()
+        self.component_list = [(NFW(), {'Rs': 5., 'theta_Rs': 1., 'center_x': 0.1, 'center_y': -0.2}),
+                               (SIS(), {'theta_E': 1., 'center_x': 0.1, 'center_y': -0.2}),
+                               (SPEP(), {'theta_E': 1.2, 'gamma': 1.9, 'q': 0.8, 'phi_G': 0.3, 'center_x': 0.5,
+                                         'center_y': 0.5}),
+                               (GaussianKappa(), {'amp': 1., 'sigma_x': 1., 'sigma_y': 1.}),
+                               (ExternalShear(), {'e1': 0.05, 'e2': -0.03})]
+        self.x = np.array([1., 2., -1.5, 0.3])
+        self.y = np.array([2., -1., 0.7, 0.4])
+
+    def test_derivatives(self):
+        f_x, f_y = self.multi.derivatives(self.x, self.y, self.component_list)
+        f_x_true, f_y_true = np.zeros_like(self.x), np.zeros_like(self.x)
+        for profile, kwargs in self.component_list:
+            f_x_i, f_y_i = profile.derivatives(self.x, self.y, **kwargs)
+            f_x_true += f_x_i
+            f_y_true += f_y_i
+        npt.assert_almost_equal(f_x, f_x_true, decimal=10)
+        npt.assert_almost_equal(f_y, f_y_true, decimal=10)
+
+    def test_hessian(self):
+        f_xx, f_yy, f_xy = self.multi.hessian(self.x, self.y, self.component_list)
+        f_xx_true, f_yy_true, f_xy_true = np.zeros_like(self.x), np.zeros_like(self.x), np.zeros_like(self.x)
+        for profile, kwargs in self.component_list:
+            f_xx_i, f_yy_i, f_xy_i = profile.hessian(self.x, self.y, **kwargs)
+            f_xx_true += f_xx_i
+            f_yy_true += f_yy_i
+            f_xy_true += f_xy_i
+        npt.assert_almost_equal(f_xx, f_xx_true, decimal=10)
+        npt.assert_almost_equal(f_yy, f_yy_true, decimal=10)
+        npt.assert_almost_equal(f_xy, f_xy_true, decimal=10)
+
+    def test_function(self):
+        component_list = self.component_list[:3] + self.component_list[4:]
+        f_ = self.multi.function(self.x, self.y, component_list)
+        f_true = np.zeros_like(self.x)
+        for profile, kwargs in component_list:
+            f_true += profile.function(self.x, self.y, **kwargs)
+        npt.assert_almost_equal(f_, f_true, decimal=10)
+
+    def test_scalar(self):
+        component_list = [self.component_list[1], self.component_list[4]]
+        f_x, f_y = self.multi.derivatives(1., 2., component_list)
+        f_x_sis, f_y_sis = SIS().derivatives(1., 2., **component_list[0][1])
+        f_x_shear, f_y_shear = ExternalShear().derivatives(1., 2., **component_list[1][1])
+        assert isinstance(f_x, float)
+        npt.assert_almost_equal(f_x, f_x_sis + f_x_shear, decimal=10)
+        npt.assert_almost_equal(f_y, f_y_sis + f_y_shear, decimal=10)
+
+    def test_kwargs_unchanged(self):
+        self.multi.derivatives(self.x, self.y, self.component_list)
+        assert self.component_list[0][1]['center_x'] == 0.1
+        assert self.component_list[2][1]['center_y'] == 0.5
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -87,6 +87,36 @@ class TestNFW(object):
         npt.assert_almost_equal(values[1][1], 0.30577812878681554, decimal=5)
         npt.assert_almost_equal(values[2][1], -0.13205836172334798, decimal=5)
 
+    def test_radial_functions(self):
+        X = np.array([0.01, 0.5, 1 - 1e-6, 1., 1 + 1e-6, 1.5, 10.])
+        X_in = X.copy()
+        F = self.nfw._F(X)
+        g = self.nfw._g(X)
+        h = self.nfw._h(X)
+        npt.assert_equal(X, X_in)
+        for i, x in enumerate(X):
+            if x < 1:
+                arc = np.arccosh(1. / x) / np.sqrt(1 - x**2)
+                h_true = np.log(x / 2.)**2 - np.arccosh(1. / x)**2
+            elif x > 1:
+                arc = np.arccos(1. / x) / np.sqrt(x**2 - 1)
+                h_true = np.log(x / 2.)**2 + np.arccos(1. / x)**2
+            else:
+                arc = 1.
+                h_true = np.log(x / 2.)**2
+            npt.assert_almost_equal(g[i], np.log(x / 2.) + arc, decimal=8)
+            npt.assert_almost_equal(h[i], h_true, decimal=8)
+            if abs(x - 1) > 1e-3:
+                npt.assert_almost_equal(F[i], (1 - arc) / (x**2 - 1), decimal=8)
+        npt.assert_almost_equal(F[2:5], [1. / 3, 1. / 3, 1. / 3], decimal=6)
+        npt.assert_almost_equal(self.nfw._F(1), 1. / 3, decimal=10)
+
+        x = np.array([0., 1., 2.])
+        y = np.array([0., 0., 1.])
+        self.nfw.hessian(x, y, Rs=1., theta_Rs=1.)
+        self.nfw.derivatives(x, y, Rs=1., theta_Rs=1.)
+        npt.assert_equal(x, [0., 1., 2.])
+
 
 class TestMassAngleConversion(object):
     """
@@ -0,0 +1,126 @@
+__author__ = 'sibirrer'
+
+from astrofunc.LensingProfiles.nfw import NFW
+from astrofunc.LensingProfiles.nfw_population import NFWPopulation
+import astrofunc.util as util
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+
+class TestNFWPopulation(object):
+    """
+    tests the population of NFW halos against the sum of single NFW profiles
+    """
+    def setup(self):
+        np.random.seed(seed=42)
+        num = 50
+        self.Rs = np.random.uniform(0.05, 0.2, num)
+        self.theta_Rs = np.random.uniform(0.001, 0.01, num)
+        self.center_x = np.random.uniform(-1, 1, num)
+        self.center_y = np.random.uniform(-1, 1, num)
+        self.x, self.y = util.make_grid(numPix=20, deltapix=0.1)
+        self.nfw = NFW()
+        self.population = NFWPopulation()
+
+    def _sum_single(self, x, y):
+        f_x, f_y = np.zeros_like(x), np.zeros_like(x)
+        f_xx, f_yy, f_xy = np.zeros_like(x), np.zeros_like(x), np.zeros_like(x)
+        for i in range(len(self.Rs)):
+            kwargs = {'Rs': self.Rs[i], 'theta_Rs': self.theta_Rs[i], 'center_x': self.center_x[i],
+                      'center_y': self.center_y[i]}
+            f_x_i, f_y_i = self.nfw.derivatives(x, y, **kwargs)
+            f_xx_i, f_yy_i, f_xy_i = self.nfw.hessian(x, y, **kwargs)
+            f_x += f_x_i
+            f_y += f_y_i
+            f_xx += f_xx_i
+            f_yy += f_yy_i
+            f_xy += f_xy_i
+        return f_x, f_y, f_xx, f_yy, f_xy
+
+    def test_derivatives(self):
+        f_x, f_y, _, _, _ = self._sum_single(self.x, self.y)
+        f_x_pop, f_y_pop = self.population.derivatives(self.x, self.y, self.Rs, self.theta_Rs, self.center_x,
+                                                       self.center_y)
+        npt.assert_almost_equal(f_x_pop, f_x, decimal=10)
+        npt.assert_almost_equal(f_y_pop, f_y, decimal=10)
+
+        population = NFWPopulation(max_memory=10**4)
+        f_x_chunk, f_y_chunk = population.derivatives(self.x, self.y, self.Rs, self.theta_Rs, self.center_x,
+                                                      self.center_y)
+        npt.assert_almost_equal(f_x_chunk, f_x_pop, decimal=12)
+        npt.assert_almost_equal(f_y_chunk, f_y_pop, decimal=12)
+
+    def test_hessian(self):
+        _, _, f_xx, f_yy, f_xy = self._sum_single(self.x, self.y)
+        f_xx_pop, f_yy_pop, f_xy_pop = self.population.hessian(self.x, self.y, self.Rs, self.theta_Rs,
+                                                               self.center_x, self.center_y)
+        npt.assert_almost_equal(f_xx_pop, f_xx, decimal=10)
+        npt.assert_almost_equal(f_yy_pop, f_yy, decimal=10)
+        npt.assert_almost_equal(f_xy_pop, f_xy, decimal=10)
+
+    def test_truncation(self):
+        # a truncation radius beyond the grid recovers the full profiles, up to the multipole expansion of the point
+        # masses
+        population = NFWPopulation(truncation=1000)
+        f_x, f_y = self.population.derivatives(self.x, self.y, self.Rs, self.theta_Rs, self.center_x, self.center_y)
+        f_x_t, f_y_t = population.derivatives(self.x, self.y, self.Rs, self.theta_Rs, self.center_x, self.center_y)
+        npt.assert_almost_equal(f_x_t, f_x, decimal=8)
+        npt.assert_almost_equal(f_y_t, f_y, decimal=8)
+
+        # a single halo acts as a point mass of the enclosed projected mass outside the truncation radius
+        Rs, theta_Rs, truncation = 0.2, 0.01, 3.
+        population = NFWPopulation(truncation=truncation, max_memory=10**4)
+        x = np.array([0.1, 0.3, 0.59, 0.61, 1., 3.])
+        y = np.zeros_like(x)
+        f_x_t, f_y_t = population.derivatives(x, y, [Rs], [theta_Rs], [0.], [0.])
+        f_xx_t, f_yy_t, f_xy_t = population.hessian(x, y, [Rs], [theta_Rs], [0.], [0.])
+        f_x, f_y = self.nfw.derivatives(x, y, Rs, theta_Rs)
+        f_xx, f_yy, f_xy = self.nfw.hessian(x, y, Rs, theta_Rs)
+        inside = x < truncation * Rs
+        npt.assert_almost_equal(f_x_t[inside], f_x[inside], decimal=10)
+        npt.assert_almost_equal(f_xx_t[inside], f_xx[inside], decimal=10)
+        alpha_trunc = self.nfw.derivatives(truncation * Rs, 0, Rs, theta_Rs)[0]
+        npt.assert_almost_equal(f_x_t[~inside], alpha_trunc * truncation * Rs / x[~inside], decimal=10)
+        npt.assert_almost_equal(f_xx_t[~inside], -alpha_trunc * truncation * Rs / x[~inside]**2, decimal=10)
+        npt.assert_almost_equal(f_xx_t + f_yy_t, np.where(inside, f_xx + f_yy, 0), decimal=10)
+
+    def test_point_masses(self):
+        num = 2000
+        center_x = np.random.uniform(-1, 1, num)
+        center_y = np.random.uniform(-1, 1, num)
+        theta_E2 = np.random.uniform(0, 0.001, num)
+        x, y = util.make_grid(numPix=50, deltapix=0.05)
+        population = NFWPopulation(truncation=1., max_memory=10**6)
+        f_x, f_y = population._point_masses(x, y, center_x, center_y, theta_E2, hessian=False)
+        f_xx, f_yy, f_xy = population._point_masses(x, y, center_x, center_y, theta_E2, hessian=True)
+        f_x_true, f_y_true = np.zeros_like(x), np.zeros_like(x)
+        f_xx_true, f_yy_true, f_xy_true = np.zeros_like(x), np.zeros_like(x), np.zeros_like(x)
+        for i in range(num):
+            x_, y_ = x - center_x[i], y - center_y[i]
+            a_x, a_y = population._point_mass(x_, y_, theta_E2[i], hessian=False)
+            a_xx, a_yy, a_xy = population._point_mass(x_, y_, theta_E2[i], hessian=True)
+            f_x_true += a_x
+            f_y_true += a_y
+            f_xx_true += a_xx
+            f_yy_true += a_yy
+            f_xy_true += a_xy
+        npt.assert_allclose(f_x, f_x_true, rtol=1e-7, atol=1e-9)
+        npt.assert_allclose(f_y, f_y_true, rtol=1e-7, atol=1e-9)
+        npt.assert_allclose(f_xx, f_xx_true, rtol=1e-6, atol=1e-7)
+        npt.assert_allclose(f_yy, f_yy_true, rtol=1e-6, atol=1e-7)
+        npt.assert_allclose(f_xy, f_xy_true, rtol=1e-6, atol=1e-7)
+
+    def test_shape(self):
+        x = self.x.reshape(20, 20)
+        y = self.y.reshape(20, 20)
+        f_x, f_y = self.population.derivatives(x, y, self.Rs, self.theta_Rs, self.center_x, self.center_y)
+        assert f_x.shape == (20, 20)
+        f_x_1d, f_y_1d = self.population.derivatives(self.x, self.y, self.Rs, self.theta_Rs, self.center_x,
+                                                     self.center_y)
+        npt.assert_almost_equal(f_x.ravel(), f_x_1d, decimal=12)
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -1,6 +1,7 @@
 __author__ = 'sibirrer'
 
 import pytest
+import numpy as np
 import numpy.testing as npt
 
 from astrofunc.numeric_lens_differentials import NumericLens
@@ -145,5 +146,88 @@ class TestNumerics(object):
         from astrofunc.LensingProfiles.hernquist_ellipse import Hernquist_Ellipse as Model
         self.assert_differentials(Model, kwargs)
 
+    def test_central(self):
+        from astrofunc.LensingProfiles.nfw_ellipse import NFW_ELLIPSE
+
+        class CountingModel(NFW_ELLIPSE):
+            num_calls = 0
+
+            def derivatives(self, x, y, **kwargs):
+                self.num_calls += 1
+                return NFW_ELLIPSE.derivatives(self, x, y, **kwargs)
+
+        lensModel = CountingModel()
+        kwargs = {'theta_Rs': 1., 'Rs': 2., 'q': 0.8, 'phi_G': 0.5}
+        x = np.array([[1., -0.5], [0.3, 2.]])
+        y = np.array([[2., 0.7], [-0.2, 0.1]])
+        f_xx, f_yy, f_xy = lensModel.hessian(x, y, **kwargs)
+        for method, diff, decimal in [('forward', 1e-8, 5), ('central', 1e-5, 8)]:
+            lensModelNum = NumericLens(lensModel, diff=diff, method=method)
+            lensModel.num_calls = 0
+            f_xx_num, f_yy_num, f_xy_num = lensModelNum.hessian(x, y, kwargs)
+            assert lensModel.num_calls == 1
+            assert f_xx_num.shape == (2, 2)
+            npt.assert_almost_equal(f_xx_num, f_xx, decimal=decimal)
+            npt.assert_almost_equal(f_yy_num, f_yy, decimal=decimal)
+            npt.assert_almost_equal(f_xy_num, f_xy, decimal=decimal)
+            kappa, gamma1, gamma2, mag = lensModelNum.lens_quantities(x, y, kwargs)
+            npt.assert_almost_equal(kappa, lensModelNum.kappa(x, y, kwargs), decimal=12)
+            npt.assert_almost_equal(gamma1, lensModelNum.gamma(x, y, kwargs)[0], decimal=12)
+            npt.assert_almost_equal(gamma2, f_xy_num, decimal=12)
+            npt.assert_almost_equal(mag, lensModelNum.magnification(x, y, kwargs), decimal=12)
+        f_x, f_y = lensModel.derivatives(1., 2., **kwargs)
+        f_x_num, f_y_num = NumericLens(lensModel, diff=1e-5, method='central').derivatives(1., 2., kwargs)
+        npt.assert_almost_equal(f_x_num, f_x, decimal=8)
+        npt.assert_almost_equal(f_y_num, f_y, decimal=8)
+        with pytest.raises(ValueError):
+            NumericLens(lensModel, diff=1e-5, method='other')
+
+    def test_hessian_ellipse(self):
+        """
+        compares the analytic Hessian of the pseudo-elliptical profiles with central differences of their deflections
+        """
+        from astrofunc.LensingProfiles.nfw_ellipse import NFW_ELLIPSE
+        from astrofunc.LensingProfiles.sersic_ellipse import SersicEllipse
+        from astrofunc.LensingProfiles.hernquist_ellipse import Hernquist_Ellipse
+        from astrofunc.LensingProfiles.p_jaffe_ellipse import PJaffe_Ellipse
+        # the spherical Sersic Hessian itself agrees with its deflections only to about 1e-4
+        model_list = [(NFW_ELLIPSE(), {'theta_Rs': 1., 'Rs': 2.}, 6),
+                      (SersicEllipse(), {'n_sersic': 2., 'r_eff': 0.5, 'k_eff': 0.3}, 4),
+                      (Hernquist_Ellipse(), {'sigma0': 1., 'Rs': 1.5}, 6),
+                      (PJaffe_Ellipse(), {'sigma0': 1., 'Ra': 0.2, 'Rs': 2.}, 6)]
+        x = np.array([1., -0.5, 0.3, 2., -1.5])
+        y = np.array([2., 0.7, -0.2, 0.1, -1.])
+        diff = 1e-5
+        for lensModel, kwargs, decimal in model_list:
+            for q, phi_G in [(0.8, 0.), (0.7, 1.), (0.9, -2.3)]:
+                kwargs_e = dict(kwargs, q=q, phi_G=phi_G, center_x=0.1, center_y=-0.2)
+                f_xx, f_yy, f_xy = lensModel.hessian(x, y, **kwargs_e)
+                f_x_dx, f_y_dx = lensModel.derivatives(x + diff, y, **kwargs_e)
+                f_x_mdx, f_y_mdx = lensModel.derivatives(x - diff, y, **kwargs_e)
+                f_x_dy, f_y_dy = lensModel.derivatives(x, y + diff, **kwargs_e)
+                f_x_mdy, f_y_mdy = lensModel.derivatives(x, y - diff, **kwargs_e)
+                npt.assert_almost_equal(f_xx, (f_x_dx - f_x_mdx) / (2 * diff), decimal=decimal)
+                npt.assert_almost_equal(f_yy, (f_y_dy - f_y_mdy) / (2 * diff), decimal=decimal)
+                npt.assert_almost_equal(f_xy, (f_x_dy - f_x_mdy) / (2 * diff), decimal=decimal)
+                npt.assert_almost_equal(f_xy, (f_y_dx - f_y_mdx) / (2 * diff), decimal=decimal)
+
+    def test_hernquist_hessian_at_rs(self):
+        from astrofunc.LensingProfiles.hernquist import Hernquist
+        lensModel = Hernquist()
+        sigma0, Rs = 1., 1.5
+        # at r = Rs: kappa = 4/15 sigma0 and alpha = 2/3 sigma0 Rs
+        for X in [1. - 1e-8, 1., 1. + 1e-8]:
+            f_xx, f_yy, f_xy = lensModel.hessian(np.array([X * Rs]), np.array([0.]), sigma0, Rs)
+            npt.assert_almost_equal(f_xx, -2. / 15 * sigma0, decimal=7)
+            npt.assert_almost_equal(f_yy, 2. / 3 * sigma0, decimal=7)
+            npt.assert_almost_equal(f_xy, 0, decimal=7)
+        x = Rs * np.array([0.98, 0.995, 1.005, 1.02])
+        f_xx, f_yy, f_xy = lensModel.hessian(x, 0, sigma0, Rs)
+        diff = 1e-5
+        f_x_dx, _ = lensModel.derivatives(x + diff, np.zeros(4), sigma0, Rs)
+        f_x_mdx, _ = lensModel.derivatives(x - diff, np.zeros(4), sigma0, Rs)
+        npt.assert_almost_equal(f_xx, (f_x_dx - f_x_mdx) / (2 * diff), decimal=7)
+
+
 if __name__ == '__main__':
     pytest.main("-k TestLensModel")
\ No newline at end of file
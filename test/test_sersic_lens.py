@@ -39,6 +39,21 @@ class TestSersic(object):
         npt.assert_almost_equal(values[1], 1.3318743892966658, decimal=10)
         npt.assert_almost_equal(values[2], 1.584299393114988, decimal=10)
 
+    def test_function_fast(self):
+        """
+        test the vectorized potential against the mpmath reference
+        """
+        sersic_fast = Sersic(fast_potential=True)
+        x = np.array([0, 0.01, 0.5, 1, 2, 5, 20, 100])
+        y = np.array([0, 0, 0.3, 1, 1, 2, 5, 10])
+        for n_sersic in [0.5, 1., 2., 4., 6., 8.]:
+            for r_eff in [0.3, 1., 3.]:
+                values = self.sersic.function(x, y, n_sersic, r_eff, k_eff=0.2)
+                values_fast = sersic_fast.function(x, y, n_sersic, r_eff, k_eff=0.2)
+                npt.assert_allclose(values_fast, values, rtol=1e-10, atol=1e-14)
+        values_fast = sersic_fast.function(1, 2, 2., 1., 0.2)
+        npt.assert_almost_equal(values_fast, 1.0272982586319199, decimal=10)
+
     def test_derivatives(self):
         x = np.array([1])
         y = np.array([2])
@@ -23,14 +23,14 @@ class TestPolarShapelets(object):
         beta = 1.
         coeffs = (1., 1.)
         values = self.cartShapelets.function(x, y, coeffs, beta)
-        assert values[0] == 0.11180585426466891
+        npt.assert_almost_equal(values[0], 0.11180585426466891, decimal=12)
 
         x = 1.
         y = 2.
         beta = 1.
         coeffs = (1., 1.)
         values = self.cartShapelets.function(x, y, coeffs, beta)
-        assert values == 0.11180585426466891
+        npt.assert_almost_equal(values, 0.11180585426466891, decimal=12)
 
         x = np.array([0])
         y = np.array([0])
@@ -41,16 +41,28 @@ class TestPolarShapelets(object):
 
         coeffs = (1, 1., 0, 0, 1, 1)
         values = self.cartShapelets.function(x, y, coeffs, beta)
-        assert values[0] == 0.16524730314632363
+        npt.assert_almost_equal(values[0], 0.16524730314632363, decimal=12)
 
         coeffs = (1, 1., 0, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0)
         values = self.cartShapelets.function(x, y, coeffs, beta)
-        assert values[0] == 0.16524730314632363
+        npt.assert_almost_equal(values[0], 0.16524730314632363, decimal=12)
 
         coeffs = (0., 0., 0, 0, 0., 0., 0, 0, 0, 0, 0, 0, 0, 0, 0)
         values = self.cartShapelets.function(x, y, coeffs, beta)
         assert values[0] == 0
 
+    def test_function_2d(self):
+        x, y = np.meshgrid(np.linspace(-1, 1, 4), np.linspace(-0.5, 1.5, 3))
+        coeffs = (1, 1., 0.5, -0.3, 1, 0.2)
+        beta = 0.8
+        values = self.cartShapelets.function(x, y, coeffs, beta)
+        assert values.shape == (3, 4)
+        npt.assert_almost_equal(values.ravel(), self.cartShapelets.function(x.ravel(), y.ravel(), coeffs, beta),
+                                decimal=12)
+        phi = self.cartShapelets.phi_n(2, x)
+        assert phi.shape == (3, 4)
+        npt.assert_almost_equal(phi.ravel(), self.cartShapelets.phi_n(2, x.ravel()), decimal=12)
+
     def test_derivatives(self):
         """
 
@@ -73,6 +85,77 @@ class TestPolarShapelets(object):
         f_x3, f_y3 = self.cartShapelets.derivatives(x3, y3, **kwargs_lens1)
         assert f_x1 == f_x3[0]
 
+    def test_polar_function(self):
+        x = np.array([1., 0.3, -0.5, 0.])
+        y = np.array([2., -0.4, 0.1, 0.])
+        coeffs = [1., 0.5, -0.3, 0.2, 0.1, -0.4, 0.6, 0.2, 0.3]
+        beta = 0.8
+        values = self.polarShapelets.function(x, y, coeffs, beta, center_x=0.1, center_y=0.2)
+        r, phi = np.sqrt((x - 0.1)**2 + (y - 0.2)**2), np.arctan2(y - 0.2, x - 0.1)
+        shapelets = self.polarShapelets._createShapelet(coeffs)
+        values_loop = np.zeros(len(x), dtype=complex)
+        for nl in range(len(shapelets)):
+            for nr in range(len(shapelets)):
+                values_loop += shapelets[nl][nr] * self.polarShapelets._chi_lr(r, phi, nl, nr, beta)
+        npt.assert_almost_equal(values, values_loop.real, decimal=12)
+
+        value = self.polarShapelets.function(x[0], y[0], coeffs, beta, center_x=0.1, center_y=0.2)
+        npt.assert_almost_equal(value, values[0], decimal=12)
+        assert np.shape(value) == ()
+
+    def test_polar_derivatives(self):
+        x = np.array([1., 0.3, -0.5])
+        y = np.array([2., -0.4, 0.1])
+        coeffs = [1., 0.5, -0.3, 0.2, 0.1, -0.4, 0.6, 0.2, 0.3]
+        kwargs = {'coeffs': coeffs, 'beta': 0.8, 'center_x': 0.1, 'center_y': 0.2}
+        diff = 1e-6
+        f_x, f_y = self.polarShapelets.derivatives(x, y, **kwargs)
+        f_dx = self.polarShapelets.function(x + diff, y, **kwargs)
+        f = self.polarShapelets.function(x, y, **kwargs)
+        npt.assert_almost_equal(f_x, (f_dx - f) / diff, decimal=5)
+
+    def test_kappa_shapelets(self):
+        coeffs = [1., 0.5, -0.3, 0.2, 0.1, -0.4, 0.6, 0.2, 0.3]
+        beta = 0.8
+        shapelets = self.polarShapelets._createShapelet(coeffs)
+        output = np.zeros((len(shapelets)+1, len(shapelets)+1), 'complex')
+        for nl in range(0, len(shapelets)):
+            for nr in range(0, len(shapelets)):
+                a_lr = shapelets[nl][nr]
+                if nl > 0:
+                    output[nl-1][nr+1] += a_lr*np.sqrt(nl*(nr+1))/2
+                    if nr > 0:
+                        output[nl-1][nr-1] += a_lr*np.sqrt(nl*nr)/2
+                output[nl+1][nr+1] += a_lr*np.sqrt((nl+1)*(nr+1))/2
+                if nr > 0:
+                    output[nl+1][nr-1] += a_lr*np.sqrt((nl+1)*nr)/2
+        kappa_shapelets = self.polarShapelets._kappaShapelets(shapelets, beta)
+        npt.assert_almost_equal(kappa_shapelets, output/beta**2, decimal=12)
+
+        with pytest.raises(ValueError):
+            self.polarShapelets._transform_matrix('no_kind', 3)
+
+    def test_polar_cache(self):
+        x = np.array([1., 0.3, -0.5])
+        y = np.array([2., -0.4, 0.1])
+        coeffs = [1., 0.5, -0.3, 0.2, 0.1, -0.4]
+        f_xx, f_yy, f_xy = self.polarShapelets.hessian(x, y, coeffs, beta=1.)
+        radial = self.polarShapelets._radial
+        f_x, f_y = self.polarShapelets.derivatives(x, y, coeffs, beta=1.)
+        assert self.polarShapelets._radial is radial
+        f_x_new, f_y_new = PolarShapelets().derivatives(x, y, coeffs, beta=1.)
+        npt.assert_almost_equal(f_x, f_x_new, decimal=12)
+        f_x_shift, f_y_shift = self.polarShapelets.derivatives(x + 0.1, y, coeffs, beta=1.)
+        assert self.polarShapelets._radial is not radial
+        npt.assert_almost_equal(f_x_shift, PolarShapelets().derivatives(x + 0.1, y, coeffs, beta=1.)[0], decimal=12)
+        assert len(self.polarShapelets._radial) == 5 * 6 // 2
+
+        polarShapelets = PolarShapelets(max_memory=0)
+        f_xx_new, f_yy_new, f_xy_new = polarShapelets.hessian(x, y, coeffs, beta=1.)
+        assert polarShapelets._radial is None
+        npt.assert_almost_equal(f_xx_new, f_xx, decimal=12)
+        npt.assert_almost_equal(f_xy_new, f_xy, decimal=12)
+
     #TODO test hessian
 
 
@@ -2,7 +2,9 @@ import astrofunc.util as util
 import numpy as np
 import numpy.testing as npt
 import pytest
-from astrofunc.LightProfiles.shapelets import Shapelets, ShapeletSet
+from astrofunc.LightProfiles.shapelets import Shapelets, ShapeletSet, hermite_functions
+import numpy.polynomial.hermite as hermite
+import math
 
 
 class TestShapelet(object):
@@ -41,5 +43,90 @@ class TestShapelet(object):
         for i in range(len(amp)):
             npt.assert_almost_equal(amp_out[i], amp[i], decimal=4)
 
+    def test_design_matrix(self):
+        n_max = 4
+        beta = 0.5
+        num_param = int((n_max+1)*(n_max+2)/2)
+        B = self.shapeletSet.design_matrix(self.x, self.y, n_max, beta, center_x=0.1, center_y=-0.1)
+        assert B.shape == (num_param, len(self.x))
+        n1, n2 = 0, 0
+        for i in range(num_param):
+            base = self.shapelets.phi_n(n1, (self.x-0.1)/beta) * self.shapelets.phi_n(n2, (self.y+0.1)/beta)
+            npt.assert_almost_equal(B[i], base, decimal=12)
+            if n1 == 0:
+                n1 = n2 + 1
+                n2 = 0
+            else:
+                n1 -= 1
+                n2 += 1
+
+        amp = np.linspace(-1, 1, num_param)
+        output = self.shapeletSet.function(self.x, self.y, amp, n_max, beta, center_x=0.1, center_y=-0.1)
+        npt.assert_almost_equal(output, amp.dot(B), decimal=12)
+        output_split = self.shapeletSet.function_split(self.x, self.y, amp, n_max, beta, center_x=0.1, center_y=-0.1)
+        npt.assert_almost_equal(np.sum(output_split, axis=0), output, decimal=12)
+
+    def test_chunks_float32(self):
+        n_max = 3
+        beta = 0.5
+        amp = np.arange(10)
+        shapeletSet_chunk = ShapeletSet(max_memory=10**3)
+        assert len(shapeletSet_chunk._chunks(len(self.x), n_max)) > 1
+        output = self.shapeletSet.function(self.x, self.y, amp, n_max, beta)
+        output_chunk = shapeletSet_chunk.function(self.x, self.y, amp, n_max, beta)
+        npt.assert_almost_equal(output_chunk, output, decimal=12)
+        param = self.shapeletSet.decomposition(output, self.x, self.y, n_max, beta, 0.1)
+        param_chunk = shapeletSet_chunk.decomposition(output, self.x, self.y, n_max, beta, 0.1)
+        npt.assert_almost_equal(param_chunk, param, decimal=12)
+
+        shapeletSet_32 = ShapeletSet(dtype=np.float32)
+        output_32 = shapeletSet_32.function(self.x, self.y, amp, n_max, beta)
+        assert output_32.dtype == np.float32
+        npt.assert_allclose(output_32, output, rtol=1e-5, atol=1e-5)
+
+    def test_grid(self):
+        n_max = 5
+        beta = 0.3
+        deltaPix = 0.1
+        amp = np.linspace(1, 2, 21)
+        x_axes, y_axes = util.get_axes(self.x, self.y)
+        image = self.shapeletSet.function_grid(x_axes, y_axes, amp, n_max, beta, center_x=0.05, center_y=0.1)
+        output = self.shapeletSet.function(self.x, self.y, amp, n_max, beta, center_x=0.05, center_y=0.1)
+        npt.assert_almost_equal(image, util.array2image(output), decimal=12)
+
+        param = self.shapeletSet.decomposition_grid(image, x_axes, y_axes, n_max, beta, deltaPix, center_x=0.05,
+                                                    center_y=0.1)
+        param_array = self.shapeletSet.decomposition(output, self.x, self.y, n_max, beta, deltaPix, center_x=0.05,
+                                                     center_y=0.1)
+        npt.assert_almost_equal(param, param_array, decimal=12)
+
+    def test_get_shapelet_set(self):
+        num_order = 3
+        beta = 2.
+        numPix = 11
+        kernel_list = self.shapelets.get_shapelet_set(num_order, beta, numPix)
+        assert len(kernel_list) == 10
+        x, y = util.make_grid(numPix, deltapix=1)
+        B = self.shapeletSet.design_matrix(x, y, num_order, beta)
+        for i, kernel in enumerate(kernel_list):
+            assert kernel.shape == (numPix, numPix)
+            npt.assert_almost_equal(kernel, util.array2image(B[i]), decimal=12)
+
+    def test_hermite_functions(self):
+        x = np.linspace(-5, 5, 51)
+        n_order = 20
+        phi = hermite_functions(x, n_order)
+        for n in range(n_order+1):
+            n_array = np.zeros(n+1)
+            n_array[n] = 1
+            prefactor = 1./np.sqrt(2**n*np.sqrt(np.pi)*math.factorial(n))
+            phi_n = hermite.hermval(x, n_array) * prefactor * np.exp(-x**2/2.)
+            npt.assert_almost_equal(phi[n], phi_n, decimal=12)
+        assert hermite_functions(0.5, 3).shape == (4,)
+        x_2d = x[:50].reshape(5, 10)
+        phi_2d = hermite_functions(x_2d, n_order)
+        assert phi_2d.shape == (n_order+1, 5, 10)
+        npt.assert_almost_equal(phi_2d.reshape(n_order+1, 50), phi[:, :50], decimal=12)
+
 if __name__ == '__main__':
     pytest.main()
\ No newline at end of file
@@ -269,7 +269,7 @@ def test_add_layer2image_odd_odd():
     x_pos = 20
     y_pos = 55
     added = Util.add_layer2image(grid2d, x_pos, y_pos, kernel, order=0)
-    print added[50:61, 15:26]
+    print(added[50:61, 15:26])
     assert added[55, 20] == 1
 
     x_pos = 20
@@ -282,7 +282,7 @@ def test_cutout_source():
     grid2d = np.zeros((20, 20))
     grid2d[7:9, 7:9] = 1
     kernel = Util.cutout_source(x_pos=7.5, y_pos=7.5, image=grid2d, kernelsize=5, shift=False)
-    print kernel
+    print(kernel)
     assert kernel[2, 2] == 1
 
 
@@ -304,7 +304,7 @@ def test_cutout_psf():
     image = Util.add_layer2image(image, x_pos, y_pos, kernel, order=1)
     print(image)
     kernel_new = Util.cutout_source(x_pos=x_pos, y_pos=y_pos, image=image, kernelsize=kernel_size)
-    print kernel_new, kernel
+    print(kernel_new, kernel)
     npt.assert_almost_equal(kernel_new[2, 2], kernel[2, 2], decimal=2)
 
 
@@ -346,7 +346,7 @@ def test_shift_long_dist():
     input_kernel = interp.shift(kernel, [-shift_y, -shift_x], order=1)
     old_style_kernel = interp.shift(input_kernel, [shift_y, shift_x], order=1)
     shifted_new = Util.de_shift_kernel(input_kernel, shift_x, shift_y)
-    print shifted_new - old_style_kernel
+    print(shifted_new - old_style_kernel)
     assert kernel[3, 2] == shifted_new[3, 2]
     assert np.max(old_style_kernel - shifted_new) < 0.01
 
@@ -360,7 +360,7 @@ def test_pixel_kernel():
     assert pixel_kernel[4, 4] == kernel[4, 4]
 
     pixel_kernel = Util.pixel_kernel(point_source_kernel=kernel, subgrid_res=11)
-    print pixel_kernel
+    print(pixel_kernel)
     npt.assert_almost_equal(pixel_kernel[4, 4], 0.3976, decimal=3)
 
 
@@ -449,24 +449,24 @@ def test_rotateImage():
 
     angle = 360./2
     im_rot = Util.rotateImage(img, angle)
-    print img
-    print im_rot
+    print(img)
+    print(im_rot)
     npt.assert_almost_equal(im_rot[1, 2], 0., decimal=10)
     npt.assert_almost_equal(im_rot[2, 2], 1., decimal=10)
     npt.assert_almost_equal(im_rot[3, 2], 0.5, decimal=10)
 
     angle = 360./4
     im_rot = Util.rotateImage(img, angle)
-    print img
-    print im_rot
+    print(img)
+    print(im_rot)
     npt.assert_almost_equal(im_rot[1, 2], 0., decimal=10)
     npt.assert_almost_equal(im_rot[2, 2], 1., decimal=10)
     npt.assert_almost_equal(im_rot[2, 1], 0.5, decimal=10)
 
     angle = 360./8
     im_rot = Util.rotateImage(img, angle)
-    print img
-    print im_rot
+    print(img)
+    print(im_rot)
     npt.assert_almost_equal(im_rot[1, 2], 0.23931518624017051, decimal=10)
     npt.assert_almost_equal(im_rot[2, 2], 1., decimal=10)
     npt.assert_almost_equal(im_rot[2, 1], 0.23931518624017073, decimal=10)
@@ -483,6 +483,95 @@ def test_neighborSelect():
     assert values[0] == 0
 
 
+def test_neighborSelect_grid():
+    # non-square grid with one minimum in the interior and one on the boundary
+    nx, ny = 20, 30
+    a = np.ones(nx * ny)
+    a[5 * ny + 10] = 0
+    a[7] = -1
+    x = np.arange(nx * ny) % ny
+    y = np.arange(nx * ny) // ny
+    x_mins, y_mins, values = Util.neighborSelect(a, x, y, nx=nx, ny=ny)
+    assert len(values) == 1
+    assert x_mins[0] == 10
+    assert y_mins[0] == 5
+    assert values[0] == 0
+
+    # a neighbor outside the footprint does not prevent the selection
+    a[3 * ny + 8] = -2
+    x_mins, y_mins, values = Util.neighborSelect(a, x, y, nx=nx, ny=ny)
+    assert len(values) == 2
+    footprint = np.ones((5, 5), dtype=bool)
+    x_mins, y_mins, values = Util.neighborSelect(a, x, y, nx=nx, ny=ny, footprint=footprint)
+    assert len(values) == 1
+    assert values[0] == -2
+    assert Util.neighbor_footprint().sum() == 24
+
+
+def test_half_light_radius():
+    x, y = Util.make_grid(numPix=200, deltapix=0.02)
+    sigma = 0.3
+    light = np.exp(-(x**2 + y**2) / (2 * sigma**2))
+    light[0] = -1
+    r_half = Util.half_light_radius(light, x, y)
+    npt.assert_almost_equal(r_half, sigma * np.sqrt(2 * np.log(2)), decimal=2)
+    assert light[0] == -1
+
+    I_r, r = Util.radial_profile(light, x, y, n=50)
+    assert len(I_r) == 50
+    npt.assert_almost_equal(r[-1], np.max(np.sqrt(x**2 + y**2)), decimal=10)
+    npt.assert_almost_equal(np.sum(I_r), np.sum(light), decimal=8)
+    R = np.sqrt(x**2 + y**2)
+    npt.assert_almost_equal(I_r[10], np.sum(light[(R > r[9]) & (R <= r[10])]), decimal=8)
+
+    # pixels on the edge of an annulus are counted inside, as with the masks of get_mask()
+    for numPix, n in [(21, 10), (21, 100), (40, 20), (101, 50)]:
+        x, y = Util.make_grid(numPix=numPix, deltapix=0.1)
+        light = np.exp(-(x**2 + y**2))
+        I_r, r = Util.radial_profile(light, x, y, n=n)
+        I_r_mask = np.zeros(n)
+        flux_enclosed = 0
+        for i, r_i in enumerate(r):
+            mask = 1. - Util.get_mask(0, 0, r_i, x, y)
+            I_r_mask[i] = np.sum(Util.array2image(light) * mask) - flux_enclosed
+            flux_enclosed += I_r_mask[i]
+        npt.assert_almost_equal(I_r, I_r_mask, decimal=10)
+    x, y = Util.make_grid(numPix=21, deltapix=0.1)
+    I_r, r = Util.radial_profile(np.ones(21**2), x, y, n=10)
+    assert I_r[0] == 9
+
+    for numPix in [60, 61, 100]:
+        x, y = Util.make_grid(numPix=numPix, deltapix=0.1)
+        I_r, r = Util.radial_profile(np.ones(numPix**2), x, y)
+        npt.assert_almost_equal(np.sum(I_r), numPix**2, decimal=8)
+
+
+def test_azimuthal_binner():
+    np.random.seed(42)
+    image = np.random.rand(20, 20)
+    y, x = np.indices(image.shape)
+    r_int = np.hypot(x - 9.5, y - 9.5).astype(int)
+    prof = Util.azimuthalAverage(image)
+    assert len(prof) == r_int.max() - 1
+    for i in range(1, r_int.max()):
+        npt.assert_almost_equal(prof[i-1], np.mean(image[r_int == i]), decimal=12)
+
+    binner = Util.AzimuthalBinner((20, 20))
+    images = np.random.rand(3, 2, 20, 20)
+    prof_stack = binner.average(images)
+    assert prof_stack.shape == (3, 2, len(prof))
+    npt.assert_almost_equal(prof_stack[2, 1], Util.azimuthalAverage(images[2, 1]), decimal=12)
+    with pytest.raises(ValueError):
+        binner.average(np.ones((10, 10)))
+
+    image = np.random.rand(12, 17)
+    y, x = np.indices(image.shape)
+    r_int = np.hypot(x - 8., y - 5.5).astype(int)
+    prof = Util.AzimuthalBinner(image.shape).average(image)
+    for i in range(1, r_int.max()):
+        npt.assert_almost_equal(prof[i-1], np.mean(image[r_int == i]), decimal=12)
+
+
 def test_averaging2():
     grid = np.ones((100, 100))
     grid_smoothed = Util.averaging2(grid, numGrid=100, numPix=50)
@@ -515,6 +604,40 @@ def test_make_subgrid():
     assert x_sub_grid_new[0] == -50.375
 
 
+def test_adaptive_subgrid():
+    numPix = 20
+    subgrid_res = 3
+    x_grid, y_grid = Util.make_grid(numPix, deltapix=0.1)
+    supersampled = Util.mask_sphere(x_grid, y_grid, 0, 0, 0.5)
+    x_sub, y_sub = Util.make_adaptive_subgrid(x_grid, y_grid, supersampled, subgrid_res=subgrid_res)
+    assert len(x_sub) == numPix**2 + (subgrid_res**2 - 1) * np.sum(supersampled)
+
+    # the supersampled pixels are averaged as on the full subgrid
+    x_full, y_full = Util.make_subgrid(x_grid, y_grid, subgrid_res=subgrid_res)
+    values_full = Util.averaging(Util.array2image(np.exp(-x_full**2 - y_full**2)), numGrid=numPix*subgrid_res,
+                                 numPix=numPix)
+    values = Util.adaptive_averaging(np.exp(-x_sub**2 - y_sub**2), supersampled, subgrid_res=subgrid_res)
+    npt.assert_almost_equal(values[supersampled == 1], Util.image2array(values_full)[supersampled == 1], decimal=12)
+    npt.assert_almost_equal(values[supersampled == 0], np.exp(-x_grid**2 - y_grid**2)[supersampled == 0],
+                            decimal=12)
+
+
+def test_cached_grid():
+    x_grid, y_grid = Util.cached_grid(numPix=10, deltapix=0.1, subgrid_res=2)
+    x_grid_2, y_grid_2 = Util.cached_grid(numPix=10, deltapix=0.1, subgrid_res=2)
+    assert x_grid is x_grid_2
+    assert not x_grid.flags.writeable
+    x_ref, y_ref = Util.make_grid(numPix=10, deltapix=0.1, subgrid_res=2)
+    npt.assert_almost_equal(x_grid, x_ref, decimal=12)
+    npt.assert_almost_equal(y_grid, y_ref, decimal=12)
+
+    Mpix2coord = np.array([[0.05, 0.01], [-0.02, 0.04]])
+    x_grid, y_grid = Util.cached_grid(numPix=10, deltapix=0.1, Mpix2coord=Mpix2coord)
+    x_ref, y_ref = Util.make_grid_transformed(10, Mpix2coord)
+    npt.assert_almost_equal(x_grid, x_ref, decimal=12)
+    npt.assert_almost_equal(y_grid, y_ref, decimal=12)
+
+
 def test_re_size2():
     kwargs = {'numPix': 50}
     grid = np.ones((100, 100))